@@ -0,0 +1,148 @@
+"""
+Benchmark do custo de importação (cold start) do motor.
+
+Cada módulo é importado em um processo Python novo, várias vezes, e o tempo da importação é
+medido dentro do processo (sem a partida do interpretador). Também informa quais dependências
+pesadas (openai, fpdf, numpy...) a importação carregou: os módulos do motor só devem carregá-las
+quando são usadas, então qualquer uma delas na importação é uma regressão.
+
+Uso:
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --modulos monitorai.toon monitorai.pipeline --repeticoes 10
+    python benchmarks/bench_import.py --detalhe monitorai.batch
+    python benchmarks/bench_import.py --limite-ms 150 --json benchmarks/historico_import.jsonl
+
+Com --limite-ms, termina com código 1 se algum módulo passar do limite ou carregar uma
+dependência pesada na importação (útil na integração contínua). Com --json, cada execução
+acrescenta uma linha com data, commit e resultados.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEPENDENCIAS_PESADAS = ("openai", "httpx", "fpdf", "pydub", "numpy", "pandas", "streamlit")
+
+MODULOS_PADRAO = (
+    "monitorai", "monitorai.toon", "monitorai.prompts", "monitorai.prescreen", "monitorai.repair",
+    "monitorai.models", "monitorai.metrics", "monitorai.cache", "monitorai.store", "monitorai.report",
+    "monitorai.pipeline", "monitorai.chunking", "monitorai.preprocess", "monitorai.jobs", "monitorai.cascade",
+    "monitorai.windows", "monitorai.packing", "monitorai.offline", "monitorai.aio", "monitorai.batch",
+    "monitorai.export", "monitorai.util", "monitorai.analytics",
+)
+
+# Módulos que existem para usar uma dependência pesada (só o tempo é acompanhado)
+PESADOS_POR_NATUREZA = {"monitorai.analytics": ("numpy", "pandas")}
+
+# Referência: o custo de cada dependência pesada sozinha
+REFERENCIAS = ("openai", "fpdf", "numpy", "pandas")
+
+_MEDICAO = """
+import importlib, json, sys, time
+inicio = time.perf_counter()
+importlib.import_module({modulo!r})
+ms = (time.perf_counter() - inicio) * 1000
+print(json.dumps({{"ms": ms, "pesadas": [d for d in {pesadas!r} if d in sys.modules]}}))
+"""
+
+
+def measure(module, repeat=5):
+    """
+    Importa `module` em `repeat` processos novos. Retorna {"mediana_ms", "min_ms", "pesadas"}
+    """
+    tempos, pesadas = [], set()
+    for _ in range(repeat):
+        saida = subprocess.run([sys.executable, "-c", _MEDICAO.format(modulo=module, pesadas=DEPENDENCIAS_PESADAS)],
+                               cwd=RAIZ, capture_output=True, text=True, check=True).stdout
+        resultado = json.loads(saida.strip().splitlines()[-1])
+        tempos.append(resultado["ms"])
+        pesadas.update(resultado["pesadas"])
+    return {"mediana_ms": round(statistics.median(tempos), 1), "min_ms": round(min(tempos), 1),
+            "pesadas": sorted(pesadas)}
+
+
+def import_profile(module, top=15):
+    """
+    Módulos que mais pesam na importação de `module` (tempo próprio, via `python -X importtime`)
+    """
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=RAIZ, capture_output=True, text=True, check=True).stderr
+    linhas = []
+    for linha in stderr.splitlines():
+        if not linha.startswith("import time:") or "self [us]" in linha:
+            continue
+        proprio, acumulado, nome = (campo.strip() for campo in linha[len("import time:"):].split("|"))
+        linhas.append((int(proprio), int(acumulado), nome))
+    return sorted(linhas, reverse=True)[:top]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do tempo de importação do motor")
+    parser.add_argument("--modulos", nargs="+", default=list(MODULOS_PADRAO))
+    parser.add_argument("--repeticoes", type=int, default=5, help="Processos novos por módulo")
+    parser.add_argument("--sem-referencia", action="store_true",
+                        help="Não medir as dependências pesadas isoladas")
+    parser.add_argument("--detalhe", default=None, metavar="MODULO",
+                        help="Mostra os módulos que mais pesam na importação deste módulo e sai")
+    parser.add_argument("--limite-ms", type=float, default=None,
+                        help="Falha se algum módulo passar deste tempo ou carregar dependência pesada")
+    parser.add_argument("--json", default=None, help="Acrescenta os resultados neste arquivo JSONL")
+    args = parser.parse_args(argv)
+
+    if args.detalhe:
+        print(f"{'próprio (ms)':>13}{'acumulado (ms)':>16}  módulo")
+        for proprio, acumulado, nome in import_profile(args.detalhe):
+            print(f"{proprio / 1000:>13.1f}{acumulado / 1000:>16.1f}  {nome}")
+        return 0
+
+    resultados, falhas = [], []
+    print(f"{'módulo':<24}{'mediana (ms)':>14}{'mín (ms)':>10}  dependências pesadas")
+    for module in args.modulos:
+        medida = measure(module, args.repeticoes)
+        resultados.append({"modulo": module, **medida})
+        inesperadas = [d for d in medida["pesadas"] if d not in PESADOS_POR_NATUREZA.get(module, ())]
+        print(f"{module:<24}{medida['mediana_ms']:>14}{medida['min_ms']:>10}  {', '.join(medida['pesadas']) or '-'}")
+        if args.limite_ms is not None:
+            if inesperadas:
+                falhas.append(f"{module} carrega {', '.join(inesperadas)} na importação")
+            if medida["mediana_ms"] > args.limite_ms and module not in PESADOS_POR_NATUREZA:
+                falhas.append(f"{module}: {medida['mediana_ms']} ms > {args.limite_ms} ms")
+
+    if not args.sem_referencia:
+        print("\nReferência (dependência sozinha):")
+        for dependencia in REFERENCIAS:
+            try:
+                medida = measure(dependencia, args.repeticoes)
+            except subprocess.CalledProcessError:
+                print(f"{dependencia:<24}{'não instalada':>14}")
+                continue
+            resultados.append({"modulo": dependencia, "referencia": True, **medida})
+            print(f"{dependencia:<24}{medida['mediana_ms']:>14}{medida['min_ms']:>10}")
+
+    if args.json:
+        registro = {"data": datetime.now().isoformat(timespec="seconds"), "commit": _git_commit(),
+                    "python": sys.version.split()[0], "resultados": resultados}
+        with open(args.json, "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+    for falha in falhas:
+        print(f"FALHA: {falha}", file=sys.stderr)
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+Micro-benchmark do modelo tipado de resultados (`monitorai.models`).
+
+Para um lote de análises sintéticas, compara a memória ocupada por dicionários e por
+`Analysis` (com `__slots__`) e o tempo e o tamanho de gravar/ler o lote inteiro em JSON de
+dicionários (como no cache), em JSON lido de volta como `Analysis` e no formato binário
+(`dump_many`/`load_many`). Antes de medir, confere que as três serializações devolvem a mesma
+análise (`check_roundtrip`).
+
+Uso:
+    python benchmarks/bench_models.py
+    python benchmarks/bench_models.py --tamanhos 1000 10000 --repeticoes 5
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_toon_parser import synthetic_response  # noqa: E402
+from monitorai.models import Analysis, dump_many, load_many  # noqa: E402
+from monitorai.toon import parse_toon_response  # noqa: E402
+
+
+def _memory(build):
+    """
+    Bytes alocados (e mantidos) por `build()`
+    """
+    tracemalloc.start()
+    objeto = build()
+    atual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objeto
+    return atual
+
+
+def _best(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        inicio = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - inicio)
+    return best
+
+
+def check_roundtrip(rng):
+    """
+    Confere que TOON, JSON e binário devolvem a mesma análise, inclusive com campos None
+    (inteiros e booleanos None voltam do TOON como None, textos None como ""). Levanta
+    AssertionError na primeira divergência
+    """
+    completa = Analysis.from_toon(synthetic_response(rng))
+    com_nulos = Analysis.from_toon(synthetic_response(rng))
+    com_nulos.checklist[0].item = None
+    com_nulos.checklist[1].pontos = None
+    com_nulos.criterios_eliminatorios[0].ocorreu = None
+    com_nulos.uso_script.justificativa = None
+    com_nulos.pontuacao_total = None
+    for analysis in (completa, com_nulos):
+        assert Analysis.from_json(analysis.to_json()) == analysis, "JSON"
+        assert Analysis.from_bytes(analysis.to_bytes()) == analysis, "binário"
+        lida = Analysis.from_toon(analysis.to_toon())
+        assert len(lida.checklist) == len(analysis.checklist), "TOON: linhas do checklist rejeitadas"
+        esperado = analysis.to_dict()
+        if analysis.uso_script.justificativa is None:
+            esperado["uso_script"]["justificativa"] = ""
+        assert lida.to_dict() == esperado, "TOON"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do modelo tipado de análises")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[1000, 10000],
+                        help="Quantidade de análises em cada lote")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    check_roundtrip(random.Random(7))
+    print(f"{'análises':>9}{'formato':>13}{'KB/análise':>12}{'grava/s':>11}{'lê/s':>11}{'MB':>8}")
+    for size in args.tamanhos:
+        rng = random.Random(42)
+        # Textos distintos por análise, para a medida de memória não contar strings compartilhadas
+        textos = [synthetic_response(rng) for _ in range(size)]
+        dicts = [parse_toon_response(text) for text in textos]
+        modelos = [Analysis.from_dict(d) for d in dicts]
+
+        mem_dict = _memory(lambda: [parse_toon_response(text) for text in textos]) / size / 1024
+        mem_modelo = _memory(lambda: [Analysis.from_toon(text) for text in textos]) / size / 1024
+
+        dados_json = json.dumps(dicts, ensure_ascii=False).encode("utf-8")
+        grava_json = _best(lambda: json.dumps(dicts, ensure_ascii=False).encode("utf-8"), args.repeticoes)
+        le_json = _best(lambda: json.loads(dados_json), args.repeticoes)
+
+        dados_modelo = json.dumps([m.to_dict() for m in modelos], ensure_ascii=False).encode("utf-8")
+        grava_modelo = _best(lambda: json.dumps([m.to_dict() for m in modelos], ensure_ascii=False).encode("utf-8"),
+                             args.repeticoes)
+        le_modelo = _best(lambda: [Analysis.from_dict(d) for d in json.loads(dados_modelo)], args.repeticoes)
+
+        dados_bin = dump_many(modelos)
+        grava_bin = _best(lambda: dump_many(modelos), args.repeticoes)
+        le_bin = _best(lambda: list(load_many(dados_bin)), args.repeticoes)
+
+        for nome, memoria, grava, le, dados in (("dict/json", mem_dict, grava_json, le_json, dados_json),
+                                                ("modelo/json", mem_modelo, grava_modelo, le_modelo, dados_modelo),
+                                                ("binário", mem_modelo, grava_bin, le_bin, dados_bin)):
+            print(f"{size:>9}{nome:>13}{memoria:>12.2f}{size / grava:>11.0f}{size / le:>11.0f}"
+                  f"{len(dados) / 1e6:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
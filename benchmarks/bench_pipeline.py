@@ -0,0 +1,229 @@
+"""
+Benchmark de ponta a ponta do pipeline (transcrição -> análise -> parser -> PDF) contra o
+servidor simulado da OpenAI (monitorai/fakeserver.py), sem custo e sem rede.
+
+Para cada nível de concorrência, analisa `--chamadas` gravações e informa a latência por
+ligação (p50/p95/p99), a vazão (ligações/s), os erros, os 429/5xx injetados pelo servidor,
+os tokens de entrada por ligação e quanto deles veio do cache de prompt simulado. A transcrição
+simulada tem os scripts que a pré-triagem decide; `--sem-pretriagem` mede sem ela, para comparar
+os tokens de entrada.
+
+Modos:
+    sync       batch.run_batch (threads + cliente síncrono, como o modo batch)
+    async      aio.run_batch_async (cliente assíncrono com pool de conexões)
+    streaming  chat em streaming + ToonStreamParser, como a interface (também mede o 1º token)
+    agrupado   packing.run_batch_packed (várias ligações por requisição, até --agrupar-tokens)
+
+Uso:
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --modo async --concorrencias 8 32 128 --chamadas 200 \\
+        --latencia-chat 2 --erros-429 0.05 --json benchmarks/historico_pipeline.jsonl
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from monitorai.fakeserver import FakeOpenAIServer  # noqa: E402
+from monitorai.metrics import AnalysisTrace  # noqa: E402
+from monitorai.prompts import MODELO_GPT, TEMPERATURA  # noqa: E402
+
+
+def percentile(values, p):
+    """
+    Percentil `p` (0-100) por interpolação linear entre os pontos ordenados
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    inferior = int(k)
+    superior = min(inferior + 1, len(values) - 1)
+    return values[inferior] + (values[superior] - values[inferior]) * (k - inferior)
+
+
+def make_audio(tamanho_kb):
+    """
+    Arquivo .mp3 de conteúdo aleatório (o servidor simulado não decodifica o áudio)
+    """
+    fd, path = tempfile.mkstemp(suffix=".mp3")
+    with os.fdopen(fd, "wb") as f:
+        f.write(os.urandom(tamanho_kb * 1024))
+    return path
+
+
+def run_sync(server, audio_path, chamadas, concorrencia, pdf_dir, tentativas, prescreen=True):
+    from monitorai.batch import run_batch
+    from monitorai.pipeline import make_client
+
+    client = make_client("teste", base_url=server.base_url).with_options(max_retries=tentativas)
+    recordings = [(f"ligacao_{i:05d}", audio_path) for i in range(chamadas)]
+    registros = list(run_batch(client, recordings, workers=concorrencia, pdf_dir=pdf_dir, prescreen=prescreen))
+    return [(r["duracao_s"], r["status"] == "ok", None) for r in registros]
+
+
+def run_packed(server, audio_path, chamadas, concorrencia, pdf_dir, tentativas, token_budget, prescreen=True):
+    from monitorai.packing import run_batch_packed
+    from monitorai.pipeline import make_client
+
+    client = make_client("teste", base_url=server.base_url).with_options(max_retries=tentativas)
+    recordings = [(f"ligacao_{i:05d}", audio_path) for i in range(chamadas)]
+    registros = list(run_batch_packed(client, recordings, workers=concorrencia, token_budget=token_budget,
+                                      pdf_dir=pdf_dir, prescreen=prescreen))
+    return [(r["duracao_s"], r["status"] == "ok", None) for r in registros]
+
+
+def run_async(server, audio_path, chamadas, concorrencia, pdf_dir, tentativas, prescreen=True):
+    import asyncio
+
+    from monitorai.aio import LIMITES_PADRAO, AsyncAnalyzer, run_batch_async
+
+    # Sem limitador de RPM/TPM: o objetivo é medir o pipeline, não o orçamento da organização
+    limits = {model: {} for model in LIMITES_PADRAO}
+    recordings = [(f"ligacao_{i:05d}", audio_path) for i in range(chamadas)]
+
+    async def consume():
+        registros = []
+        async with AsyncAnalyzer(api_key="teste", base_url=server.base_url, max_connections=concorrencia,
+                                 limits=limits, max_retries=tentativas, base_delay=0.1) as analyzer:
+            async for r in run_batch_async(analyzer, recordings, concurrency=concorrencia, pdf_dir=pdf_dir,
+                                           prescreen=prescreen):
+                registros.append((r["duracao_s"], r["status"] == "ok", None))
+        return registros
+
+    return asyncio.run(consume())
+
+
+def run_streaming(server, audio_path, chamadas, concorrencia, pdf_dir, tentativas, prescreen=True):
+    from monitorai.pipeline import make_client, run_prescreen, stream_transcript_analysis, transcribe_audio
+    from monitorai.prescreen import merge_prescreen
+    from monitorai.report import create_pdf
+    from monitorai.toon import ToonStreamParser
+
+    client = make_client("teste", base_url=server.base_url).with_options(max_retries=tentativas)
+
+    def one(i):
+        inicio = time.perf_counter()
+        trace = AnalysisTrace(f"ligacao_{i:05d}")
+        try:
+            transcript_text = transcribe_audio(client, audio_path, trace=trace)
+            decisions = run_prescreen(transcript_text, trace) if prescreen else None
+            parser = ToonStreamParser()
+            for delta in stream_transcript_analysis(client, transcript_text, MODELO_GPT, TEMPERATURA, trace=trace,
+                                                    prescreen=decisions):
+                parser.feed(delta)
+            parser.close()
+            with open(os.path.join(pdf_dir, f"ligacao_{i:05d}.pdf"), "wb") as f:
+                f.write(create_pdf(merge_prescreen(parser.result, decisions), transcript_text, MODELO_GPT))
+            ok = True
+        except Exception:
+            ok = False
+        return time.perf_counter() - inicio, ok, trace.extras.get("chat_primeiro_token_s")
+
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        return list(executor.map(one, range(chamadas)))
+
+
+MODOS = {"sync": run_sync, "async": run_async, "streaming": run_streaming, "agrupado": run_packed}
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de ponta a ponta do pipeline contra o servidor simulado")
+    parser.add_argument("--modo", choices=sorted(MODOS), nargs="+", default=["sync"])
+    parser.add_argument("--concorrencias", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--chamadas", type=int, default=40, help="Ligações analisadas em cada nível de concorrência")
+    parser.add_argument("--audio-kb", type=int, default=256, help="Tamanho do arquivo de áudio enviado")
+    parser.add_argument("--latencia-transcricao", type=float, default=0.5)
+    parser.add_argument("--latencia-chat", type=float, default=1.0)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--intervalo-trechos", type=float, default=0.005)
+    parser.add_argument("--erros-429", type=float, default=0.0)
+    parser.add_argument("--erros-5xx", type=float, default=0.0)
+    parser.add_argument("--truncadas", type=float, default=0.0, help="Proporção de respostas do chat cortadas (exercita o reparo)")
+    parser.add_argument("--retry-after", type=float, default=0.2)
+    parser.add_argument("--tentativas", type=int, default=3, help="Novas tentativas por requisição com erro transitório")
+    parser.add_argument("--agrupar-tokens", type=int, default=16000, help="Orçamento de tokens por requisição no modo agrupado")
+    parser.add_argument("--sem-pretriagem", action="store_true",
+                        help="Analisa sem a pré-triagem (para comparar os tokens por ligação)")
+    parser.add_argument("--json", default=None, help="Acrescenta os resultados neste arquivo JSONL")
+    args = parser.parse_args(argv)
+
+    server = FakeOpenAIServer(
+        latency={"transcricao": args.latencia_transcricao, "chat": args.latencia_chat},
+        jitter=args.jitter, chunk_interval=args.intervalo_trechos,
+        rate_429=args.erros_429, rate_5xx=args.erros_5xx, retry_after=args.retry_after, seed=42,
+        rate_truncated=args.truncadas,
+    ).start()
+    audio_path = make_audio(args.audio_kb)
+    pdf_dir = tempfile.mkdtemp(prefix="bench_pdf_")
+
+    resultados = []
+    print(f"{'modo':<10}{'conc':>5}{'ok':>6}{'erros':>6}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}"
+          f"{'lig/s':>8}{'429':>6}{'5xx':>6}{'1º tok':>8}{'tok/lig':>9}{'cache':>7}")
+    try:
+        for modo in args.modo:
+            for concorrencia in args.concorrencias:
+                antes = dict(server.stats)
+                inicio = time.perf_counter()
+                extras = (args.agrupar_tokens,) if modo == "agrupado" else ()
+                medidas = MODOS[modo](server, audio_path, args.chamadas, concorrencia, pdf_dir, args.tentativas,
+                                      *extras, prescreen=not args.sem_pretriagem)
+                total = time.perf_counter() - inicio
+
+                latencias = [duracao for duracao, ok, _ in medidas if ok]
+                primeiros = [ttft for _, ok, ttft in medidas if ok and ttft is not None]
+                linha = {
+                    "modo": modo,
+                    "concorrencia": concorrencia,
+                    "ok": len(latencias),
+                    "erros": len(medidas) - len(latencias),
+                    "p50_s": round(percentile(latencias, 50) or 0, 3),
+                    "p95_s": round(percentile(latencias, 95) or 0, 3),
+                    "p99_s": round(percentile(latencias, 99) or 0, 3),
+                    "ligacoes_s": round(len(latencias) / total, 2),
+                    "erros_429": server.stats["erros_429"] - antes["erros_429"],
+                    "erros_5xx": server.stats["erros_5xx"] - antes["erros_5xx"],
+                }
+                entrada = server.stats["tokens_entrada"] - antes["tokens_entrada"]
+                em_cache = server.stats["tokens_cache"] - antes["tokens_cache"]
+                linha["tokens_entrada_por_ligacao"] = round(entrada / max(len(medidas), 1))
+                linha["pct_tokens_cache"] = round(100 * em_cache / entrada, 1) if entrada else 0.0
+                if primeiros:
+                    linha["p50_primeiro_token_s"] = round(percentile(primeiros, 50), 3)
+                resultados.append(linha)
+                primeiro = f"{linha['p50_primeiro_token_s']:.3f}" if primeiros else "-"
+                print(f"{modo:<10}{concorrencia:>5}{linha['ok']:>6}{linha['erros']:>6}{linha['p50_s']:>8.3f}"
+                      f"{linha['p95_s']:>8.3f}{linha['p99_s']:>8.3f}{linha['ligacoes_s']:>8.2f}"
+                      f"{linha['erros_429']:>6}{linha['erros_5xx']:>6}{primeiro:>8}"
+                      f"{linha['tokens_entrada_por_ligacao']:>9}{linha['pct_tokens_cache']:>6.1f}%")
+    finally:
+        server.stop()
+        os.remove(audio_path)
+        shutil.rmtree(pdf_dir, ignore_errors=True)
+
+    if args.json:
+        registro = {"data": datetime.now().isoformat(timespec="seconds"), "commit": _git_commit(),
+                    "python": sys.version.split()[0], "parametros": vars(args), "resultados": resultados}
+        with open(args.json, "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
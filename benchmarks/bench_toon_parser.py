@@ -0,0 +1,238 @@
+"""
+Micro-benchmark do parser TOON.
+
+Mede a vazão de `parse_toon_response` (respostas/s e MB/s) sobre corpora sintéticos e
+"fuzzed" de tamanho crescente, comparando com a implementação original caractere a
+caractere (mantida aqui apenas como referência).
+
+Uso:
+    python benchmarks/bench_toon_parser.py
+    python benchmarks/bench_toon_parser.py --tamanhos 100 1000 10000 --json benchmarks/historico.jsonl
+
+Com --json, cada execução acrescenta uma linha com data, commit e resultados, para acompanhar
+a vazão do parser ao longo do tempo.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from monitorai.toon import parse_toon_line, parse_toon_response  # noqa: E402
+
+PALAVRAS = ("cliente", "atendente", "placa", "telefone", "cpf", "vistoria", "franquia", "link",
+            "whatsapp", "prestador", "confirmou", "solicitou", "não", "informou", "garantia",
+            "seguradora", "endereço", "perfeito", "certo", "obrigada")
+
+
+# Implementação original (antes do tokenizer de passada única), usada como referência
+def legacy_parse_toon_line(line):
+    values = []
+    current_value = ""
+    in_quotes = False
+    for char in line:
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == ',' and not in_quotes:
+            values.append(current_value.strip())
+            current_value = ""
+        else:
+            current_value += char
+    if current_value:
+        values.append(current_value.strip())
+    return values
+
+
+def legacy_parse_toon_response(text):
+    lines = text.strip().split('\n')
+    result = {}
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        if not line:
+            i += 1
+            continue
+        if line.startswith('status_final[') or line.startswith('uso_script['):
+            section = line.split('[', 1)[0]
+            i += 1
+            fields = [f.strip() for f in lines[i].split(',')]
+            i += 1
+            result[section] = dict(zip(fields, legacy_parse_toon_line(lines[i])))
+        elif line.startswith('checklist[') or line.startswith('criterios_eliminatorios['):
+            section = line.split('[', 1)[0]
+            i += 1
+            fields = [f.strip() for f in lines[i].split(',')]
+            i += 1
+            items = []
+            while i < len(lines) and lines[i].strip() and not lines[i].strip().endswith('['):
+                values = legacy_parse_toon_line(lines[i])
+                if len(values) == len(fields):
+                    item_dict = dict(zip(fields, values))
+                    if 'item' in item_dict:
+                        item_dict['item'] = int(item_dict['item'])
+                    if 'pontos' in item_dict:
+                        item_dict['pontos'] = int(item_dict['pontos'])
+                    if 'ocorreu' in item_dict:
+                        item_dict['ocorreu'] = item_dict['ocorreu'].lower() in ['true', 'sim', 'yes', '1']
+                    items.append(item_dict)
+                i += 1
+            result[section] = items
+            continue
+        elif line.startswith('pontuacao_total'):
+            i += 1
+            result['pontuacao_total'] = int(lines[i].strip())
+        elif line.startswith('resumo_geral'):
+            i += 1
+            resumo_lines = []
+            while i < len(lines) and not lines[i].strip().endswith('[') and not lines[i].strip().startswith('pontuacao_total'):
+                resumo_lines.append(lines[i].strip())
+                i += 1
+            result['resumo_geral'] = ' '.join(resumo_lines)
+            continue
+        i += 1
+    return result
+
+
+def _frase(rng, min_palavras=4, max_palavras=30, virgulas=True):
+    palavras = [rng.choice(PALAVRAS) for _ in range(rng.randint(min_palavras, max_palavras))]
+    texto = " ".join(palavras)
+    if virgulas and rng.random() < 0.5:
+        return f'"{texto.replace(" ", ", ", 2)}"'
+    return texto
+
+
+def synthetic_response(rng):
+    """
+    Resposta TOON válida, no formato pedido pelo prompt, com justificativas de tamanho variável
+    """
+    linhas = ["status_final[3]", "satisfacao, risco, desfecho",
+              f"{rng.choice(['Satisfeito', 'Insatisfeito'])}, {rng.choice(['Baixo', 'Médio', 'Alto'])}, {_frase(rng, 2, 6)}",
+              "", "checklist[12]", "item, criterio, pontos, resposta, justificativa"]
+    total = 0
+    for item in range(1, 13):
+        pontos = rng.choice([2, 3, 4, 5, 6, 10, 15])
+        resposta = rng.choice(["sim", "não"])
+        total += pontos if resposta == "sim" else 0
+        linhas.append(f"{item}, {_frase(rng, 5, 20, False)}?, {pontos}, {resposta}, {_frase(rng)}")
+    linhas += ["", "criterios_eliminatorios[7]", "criterio, ocorreu, justificativa"]
+    for _ in range(7):
+        linhas.append(f"{_frase(rng, 5, 15, False)}?, {rng.choice(['true', 'false'])}, {_frase(rng)}")
+    linhas += ["", "uso_script[2]", "status, justificativa",
+               f"{rng.choice(['completo', 'parcial', 'não utilizado'])}, {_frase(rng)}",
+               "", "pontuacao_total", str(total), "", "resumo_geral"]
+    linhas += [_frase(rng, 10, 40, False) for _ in range(rng.randint(1, 4))]
+    return "\n".join(linhas)
+
+
+def fuzz_response(rng, text):
+    """
+    Aplica mutações típicas de respostas reais do modelo: linhas removidas, aspas e vírgulas
+    extras, espaços, quebras de linha CRLF e texto truncado
+    """
+    linhas = text.split("\n")
+    for _ in range(rng.randint(1, 6)):
+        mutacao = rng.randrange(6)
+        pos = rng.randrange(len(linhas))
+        if mutacao == 0 and len(linhas) > 1:
+            del linhas[pos]
+        elif mutacao == 1:
+            linhas[pos] = linhas[pos] + rng.choice([',', '"', ', ""', ' \\"x\\"'])
+        elif mutacao == 2:
+            linhas[pos] = "   " + linhas[pos] + "  "
+        elif mutacao == 3:
+            linhas.insert(pos, "")
+        elif mutacao == 4:
+            linhas[pos] = linhas[pos] + "\r"
+        else:
+            linhas = linhas[:max(1, pos)]
+    return "\n".join(linhas)
+
+
+def build_corpus(kind, size, seed=42):
+    rng = random.Random(seed)
+    corpus = [synthetic_response(rng) for _ in range(size)]
+    if kind == "fuzz":
+        corpus = [fuzz_response(rng, text) for text in corpus]
+    return corpus
+
+
+def bench(parse, corpus, repeat=3):
+    """
+    Retorna (melhor tempo em segundos, número de respostas que levantaram exceção)
+    """
+    best = float("inf")
+    erros = 0
+    for _ in range(repeat):
+        erros = 0
+        inicio = time.perf_counter()
+        for text in corpus:
+            try:
+                parse(text)
+            except (ValueError, IndexError):
+                erros += 1
+        best = min(best, time.perf_counter() - inicio)
+    return best, erros
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do parser TOON")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[100, 1000, 10000],
+                        help="Quantidade de respostas em cada corpus")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--sem-referencia", action="store_true",
+                        help="Não medir a implementação original (mais rápido)")
+    parser.add_argument("--json", default=None, help="Acrescenta os resultados neste arquivo JSONL")
+    args = parser.parse_args(argv)
+
+    resultados = []
+    print(f"{'corpus':<8}{'respostas':>10}{'MB':>8}{'parser':>10}{'resp/s':>12}{'MB/s':>9}{'erros':>7}{'ganho':>8}")
+    for kind in ("sintetico", "fuzz"):
+        for size in args.tamanhos:
+            corpus = build_corpus(kind, size)
+            mb = sum(len(text.encode("utf-8")) for text in corpus) / 1e6
+            tempo, erros = bench(parse_toon_response, corpus, args.repeticoes)
+            linha = {"corpus": kind, "respostas": size, "mb": round(mb, 3),
+                     "resp_s": round(size / tempo, 1), "mb_s": round(mb / tempo, 2), "erros": erros}
+            ganho = ""
+            if not args.sem_referencia:
+                tempo_ref, _ = bench(legacy_parse_toon_response, corpus, args.repeticoes)
+                linha["resp_s_referencia"] = round(size / tempo_ref, 1)
+                linha["ganho"] = round(tempo_ref / tempo, 2)
+                ganho = f"{linha['ganho']}x"
+            resultados.append(linha)
+            print(f"{kind:<8}{size:>10}{mb:>8.2f}{'atual':>10}{linha['resp_s']:>12}{linha['mb_s']:>9}{erros:>7}{ganho:>8}")
+
+    # Vazão do tokenizer de linha isolado (linhas com e sem aspas)
+    rng = random.Random(7)
+    linhas = [f"{i}, {_frase(rng, 5, 20, False)}?, 10, sim, {_frase(rng)}" for i in range(20000)]
+    tempo, _ = bench(lambda line: parse_toon_line(line), linhas, args.repeticoes)
+    linha = {"corpus": "linhas", "respostas": len(linhas), "linhas_s": round(len(linhas) / tempo, 1)}
+    if not args.sem_referencia:
+        tempo_ref, _ = bench(legacy_parse_toon_line, linhas, args.repeticoes)
+        linha["ganho"] = round(tempo_ref / tempo, 2)
+    resultados.append(linha)
+    print(f"parse_toon_line: {linha['linhas_s']} linhas/s" + (f" ({linha['ganho']}x)" if "ganho" in linha else ""))
+
+    if args.json:
+        registro = {"data": datetime.now().isoformat(timespec="seconds"), "commit": _git_commit(),
+                    "python": sys.version.split()[0], "resultados": resultados}
+        with open(args.json, "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
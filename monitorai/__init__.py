@@ -0,0 +1,63 @@
+"""
+MonitorAI - motor de análise de ligações (transcrição, análise TOON, parser e relatório PDF)
+reutilizável fora da interface Streamlit.
+
+Importar o pacote não tem efeitos colaterais (nada de Streamlit, segredos, cliente da OpenAI
+ou fpdf) e não carrega os submódulos: os nomes abaixo são resolvidos no primeiro acesso, e
+as dependências pesadas só são importadas por quem as usa (ex.: `make_client`, `create_pdf`).
+
+    from monitorai import build_messages, parse_toon_response
+    from monitorai import make_client, transcribe_audio, run_analysis, create_pdf
+
+O custo de importação de cada módulo é acompanhado em benchmarks/bench_import.py.
+"""
+
+import importlib
+
+# Nome público -> submódulo que o define
+_EXPORTS = {
+    # Transcrição e pipeline
+    "make_client": "pipeline",
+    "transcribe_audio": "pipeline",
+    "run_analysis": "pipeline",
+    "analyze_call": "pipeline",
+    "MODELO_WHISPER": "pipeline",
+    # Prompt
+    "build_prompt": "prompts",
+    "build_messages": "prompts",
+    "MODELO_GPT": "prompts",
+    "TEMPERATURA": "prompts",
+    "PROMPT_VERSION": "prompts",
+    # Parser TOON e modelo tipado
+    "parse_toon_response": "toon",
+    "ToonStreamParser": "toon",
+    "Analysis": "models",
+    # Pré-triagem e reparo
+    "prescreen_transcript": "prescreen",
+    "merge_prescreen": "prescreen",
+    "missing_parts": "repair",
+    # Relatório
+    "create_pdf": "report",
+    "write_report": "report",
+    # Histórico, caches e métricas
+    "ResultStore": "store",
+    "TranscriptCache": "cache",
+    "AnalysisCache": "cache",
+    "AnalysisTrace": "metrics",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    # Acessos seguintes não passam mais por aqui
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,317 @@
+"""
+Camada assíncrona sobre a API da OpenAI para muitas análises simultâneas.
+
+- um único pool de conexões HTTP compartilhado por todas as requisições;
+- novas tentativas com backoff exponencial e jitter para 429, 5xx, timeouts e falhas de conexão
+  (respeitando o cabeçalho Retry-After quando enviado); 429 por cota esgotada
+  (`insufficient_quota`) falha na hora, porque esperar não resolve;
+- limitador por modelo com orçamento de requisições por minuto (RPM) e tokens por minuto (TPM),
+  para que a concorrência não estoure o limite da organização.
+"""
+
+import asyncio
+import os
+import random
+import time
+
+from .chunking import transcript_segments
+from .metrics import AnalysisTrace
+from .pipeline import MODELO_WHISPER, PARAMETROS_WHISPER, _stage, advance_steps, analysis_steps
+from .prompts import MODELO_GPT, TEMPERATURA
+from .report import create_pdf
+
+# Limites padrão por modelo (ajuste para o tier da organização). None = sem limite
+LIMITES_PADRAO = {
+    "whisper-1": {"rpm": 50, "tpm": None},
+    "gpt-4o": {"rpm": 500, "tpm": 30000},
+    "gpt-4o-mini": {"rpm": 500, "tpm": 200000},
+}
+
+# Tokens reservados para a resposta TOON ao estimar o consumo de uma análise
+TOKENS_RESPOSTA_ESTIMADOS = 1500
+
+# Código do erro 429 quando acabou a cota da organização: nova tentativa não adianta
+CODIGO_COTA_ESGOTADA = "insufficient_quota"
+
+
+def estimate_tokens(messages):
+    """
+    Estimativa conservadora (≈3 caracteres por token em português) dos tokens de uma requisição
+    """
+    chars = sum(len(message["content"]) for message in messages)
+    return chars // 3 + TOKENS_RESPOSTA_ESTIMADOS
+
+
+class TokenBucket:
+    """
+    Balde de fichas reabastecido continuamente a `per_minute` fichas por minuto
+    """
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, delta):
+        """
+        Corrige o saldo depois da requisição (ex.: consumo real maior ou menor que o estimado)
+        """
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class RateLimiter:
+    """
+    Limites de RPM e TPM por modelo
+    """
+
+    def __init__(self, limits=None):
+        self.limits = {**LIMITES_PADRAO, **(limits or {})}
+        self._buckets = {}
+
+    def _bucket(self, model, kind):
+        key = (model, kind)
+        if key not in self._buckets:
+            per_minute = self.limits.get(model, {}).get(kind)
+            self._buckets[key] = TokenBucket(per_minute) if per_minute else None
+        return self._buckets[key]
+
+    async def acquire(self, model, tokens=0):
+        rpm = self._bucket(model, "rpm")
+        if rpm is not None:
+            await rpm.acquire(1)
+        tpm = self._bucket(model, "tpm")
+        if tpm is not None and tokens:
+            await tpm.acquire(tokens)
+
+    def settle(self, model, estimated, actual):
+        tpm = self._bucket(model, "tpm")
+        if tpm is not None and actual is not None:
+            tpm.adjust(actual - estimated)
+
+    def refund(self, model, estimated):
+        """
+        Devolve os tokens reservados por uma tentativa que falhou
+        """
+        self.settle(model, estimated, 0)
+
+
+def _quota_exhausted(error):
+    # 429 de cota esgotada (plano/créditos), e não de limite de taxa
+    return getattr(error, "code", None) == CODIGO_COTA_ESGOTADA
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class AsyncAnalyzer:
+    """
+    Cliente assíncrono compartilhado: transcrição, análise TOON e pipeline completo
+    """
+
+    def __init__(self, api_key=None, base_url=None, max_connections=32, limits=None,
+                 max_retries=6, base_delay=1.0, max_delay=60.0):
+        import httpx
+        from openai import AsyncOpenAI
+
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(300.0, connect=10.0),
+        )
+        # As novas tentativas são feitas aqui (com o limitador), não dentro do SDK
+        self.client = AsyncOpenAI(
+            api_key=api_key or os.environ.get("OPENAI_API_KEY"),
+            base_url=base_url,
+            http_client=self.http_client,
+            max_retries=0,
+        )
+        self.limiter = RateLimiter(limits)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+
+    async def aclose(self):
+        await self.client.close()
+        await self.http_client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def _call(self, model, tokens, request):
+        """
+        Executa `request()` respeitando o limitador e refazendo em erros transitórios. Cada
+        tentativa reserva `tokens` do TPM; uma tentativa que falha os devolve antes da próxima
+        """
+        import openai
+
+        transitorios = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError,
+                        openai.InternalServerError)
+        attempt = 0
+        while True:
+            await self.limiter.acquire(model, tokens)
+            try:
+                return await request()
+            except transitorios as e:
+                self.limiter.refund(model, tokens)
+                if attempt >= self.max_retries or _quota_exhausted(e):
+                    raise
+                # Backoff exponencial com "full jitter"; Retry-After do servidor tem prioridade
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(delay)
+
+    async def transcribe(self, audio_path, model=MODELO_WHISPER, cache=None, trace=None):
+        with _stage(trace, "upload"):
+            audio_bytes = await asyncio.to_thread(_read_bytes, audio_path)
+
+        if cache is not None:
+            key = cache.key_for(audio_bytes, model, PARAMETROS_WHISPER)
+            cached = await asyncio.to_thread(cache.get, key)
+            if trace is not None:
+                trace.cache["transcricao"] = cached is not None
+            if cached is not None:
+                if trace is not None:
+                    trace.record_audio(model, cached.get("duracao"))
+                return cached["text"]
+
+        with _stage(trace, "whisper"):
+            transcript = await self._call(model, 0, lambda: self.client.audio.transcriptions.create(
+                model=model,
+                file=(os.path.basename(audio_path), audio_bytes),
+                **PARAMETROS_WHISPER
+            ))
+        duration = getattr(transcript, "duration", None)
+        if trace is not None:
+            trace.record_audio(model, duration)
+
+        if cache is not None:
+            await asyncio.to_thread(cache.set, key, {"text": transcript.text, "model": model, "duracao": duration,
+                                                     "segmentos": transcript_segments(transcript)})
+        return transcript.text
+
+    async def _chat(self, model, messages, temperature, trace, stage):
+        estimated = estimate_tokens(messages)
+        with _stage(trace, stage):
+            response = await self._call(model, estimated, lambda: self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature
+            ))
+        if response.usage is not None:
+            self.limiter.settle(model, estimated, response.usage.total_tokens)
+        if trace is not None:
+            trace.record_usage(model, response.usage)
+        return response.choices[0].message.content.strip()
+
+    async def analyze(self, transcript_text, model=MODELO_GPT, temperature=TEMPERATURA, cache=None, trace=None,
+                      prescreen=True, repair=True):
+        """
+        Retorna (resposta_toon, analise), consultando o cache de análises se informado.
+        Mesmo fluxo de `pipeline.run_analysis` (`pipeline.analysis_steps`): os passos locais
+        (pré-triagem, cache, parser, reparo) rodam em uma thread e só as requisições são aguardadas aqui
+        """
+        steps = analysis_steps(transcript_text, model, temperature, cache, trace, prescreen, repair)
+        pedido, saida = await asyncio.to_thread(advance_steps, steps)
+        while pedido is not None:
+            stage, messages = pedido
+            text = await self._chat(model, messages, temperature, trace, stage)
+            pedido, saida = await asyncio.to_thread(advance_steps, steps, text)
+        return saida
+
+    async def analyze_call(self, audio_path, model=MODELO_GPT, pdf_path=None, transcript_cache=None,
+                           analysis_cache=None, trace=None, prescreen=True):
+        """
+        Equivalente assíncrono de `pipeline.analyze_call` (o PDF é gerado em uma thread)
+        """
+        transcript_text = await self.transcribe(audio_path, cache=transcript_cache, trace=trace)
+        result, analysis = await self.analyze(transcript_text, model, cache=analysis_cache, trace=trace,
+                                              prescreen=prescreen)
+
+        if pdf_path:
+            with _stage(trace, "pdf"):
+                await asyncio.to_thread(_write_pdf, pdf_path, analysis, transcript_text, model)
+
+        return {
+            "transcricao": transcript_text,
+            "resposta_toon": result,
+            "analise": analysis,
+            "pdf": pdf_path,
+        }
+
+
+def _read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _write_pdf(pdf_path, analysis, transcript_text, model):
+    with open(pdf_path, "wb") as pdf_file:
+        pdf_file.write(create_pdf(analysis, transcript_text, model))
+
+
+async def run_batch_async(analyzer, recordings, concurrency=16, model=MODELO_GPT, pdf_dir=None,
+                          metrics_file=None, **options):
+    """
+    Versão assíncrona de `batch.run_batch`: até `concurrency` análises em andamento ao mesmo
+    tempo (o ritmo real é dado pelo limitador de RPM/TPM). Gera os registros à medida que terminam
+    """
+    from .batch import finish_record, record_output
+
+    if pdf_dir:
+        os.makedirs(pdf_dir, exist_ok=True)
+
+    async def process(call_id, audio_path, metadata):
+        inicio = time.perf_counter()
+        record = {"id": call_id, "arquivo": audio_path, "modelo": model, **(metadata or {})}
+        trace = AnalysisTrace(call_id)
+        try:
+            pdf_path = os.path.join(pdf_dir, f"{call_id}.pdf") if pdf_dir else None
+            output = await analyzer.analyze_call(audio_path, model=model, pdf_path=pdf_path, trace=trace,
+                                                 **options)
+            record_output(record, output)
+        except Exception as e:
+            record.update({"status": "erro", "erro": f"{type(e).__name__}: {e}"})
+        return finish_record(record, trace, inicio, metrics_file)
+
+    pending = set()
+    for call_id, path, *metadata in recordings:
+        pending.add(asyncio.ensure_future(process(call_id, path, metadata[0] if metadata else None)))
+        if len(pending) >= concurrency:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            yield task.result()
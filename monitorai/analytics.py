@@ -0,0 +1,212 @@
+"""
+Agregados do histórico de análises para o painel de supervisão.
+
+O histórico é carregado uma vez em arrays colunares (pandas/NumPy): uma linha por análise,
+uma por item do checklist e uma por critério eliminatório violado. Cada linha de item e de
+critério guarda a posição da sua análise, então os filtros viram uma máscara booleana sobre
+as análises e todos os agregados são contagens vetorizadas (`np.bincount`), sem laços por linha.
+"""
+
+import numpy as np
+import pandas as pd
+
+PONTUACAO_MAXIMA = 81
+SEM_AGENTE = "(sem agente)"
+
+_SQL_ANALISES = """
+SELECT a.id, a.criado_em, a.agente, a.risco, a.pontuacao_total, a.violou_eliminatorio
+FROM analises a {where} ORDER BY a.id
+"""
+_SQL_CHECKLIST = """
+SELECT c.analise_id, c.item, lower(trim(c.resposta)) IN ('sim', 'yes', 'true', '1') AS passou
+FROM checklist c JOIN analises a ON a.id = c.analise_id {where}
+"""
+_SQL_ELIMINATORIOS = """
+SELECT e.analise_id, e.criterio
+FROM eliminatorios e JOIN analises a ON a.id = e.analise_id
+WHERE e.ocorreu = 1 {and_where}
+"""
+
+
+def load_columns(store, since=None, until=None):
+    """
+    Carrega o histórico (opcionalmente limitado por data) em três DataFrames colunares:
+    `analises`, `checklist` e `eliminatorios`. As duas últimas têm a coluna `pos`, posição
+    da análise correspondente em `analises`
+    """
+    where, params = store._filters(since, until, None, None, None, None, None, None)
+    where = [f"a.{clause}" for clause in where]
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    and_where = "".join(f" AND {clause}" for clause in where)
+
+    with store._lock:
+        analises = pd.read_sql_query(_SQL_ANALISES.format(where=where_sql), store.conn, params=params)
+        checklist = pd.read_sql_query(_SQL_CHECKLIST.format(where=where_sql), store.conn, params=params)
+        eliminatorios = pd.read_sql_query(_SQL_ELIMINATORIOS.format(and_where=and_where), store.conn,
+                                          params=params)
+
+    analises["criado_em"] = pd.to_datetime(analises["criado_em"], format="ISO8601")
+    analises["agente"] = analises["agente"].fillna(SEM_AGENTE).astype("category")
+    analises["risco"] = analises["risco"].fillna("N/A").astype("category")
+    analises["pontuacao_total"] = analises["pontuacao_total"].astype("float32")
+    analises["violou_eliminatorio"] = analises["violou_eliminatorio"].astype(bool)
+
+    ids = analises["id"].to_numpy()
+    checklist = pd.DataFrame({
+        "pos": np.searchsorted(ids, checklist["analise_id"].to_numpy()).astype(np.int32),
+        "item": checklist["item"].fillna(0).astype(np.int16),
+        "passou": checklist["passou"].astype(bool),
+    })
+    eliminatorios = pd.DataFrame({
+        "pos": np.searchsorted(ids, eliminatorios["analise_id"].to_numpy()).astype(np.int32),
+        "criterio": eliminatorios["criterio"].fillna("").str.strip().astype("category"),
+    })
+    return {"analises": analises, "checklist": checklist, "eliminatorios": eliminatorios}
+
+
+def filter_mask(data, since=None, until=None, agents=None, risks=None, min_score=None, max_score=None):
+    """
+    Máscara booleana sobre `data["analises"]` com os filtros informados
+    """
+    analises = data["analises"]
+    mask = np.ones(len(analises), dtype=bool)
+    if since is not None:
+        mask &= (analises["criado_em"] >= pd.Timestamp(since)).to_numpy()
+    if until is not None:
+        mask &= (analises["criado_em"] < pd.Timestamp(until)).to_numpy()
+    if agents:
+        mask &= analises["agente"].isin(agents).to_numpy()
+    if risks:
+        mask &= analises["risco"].isin(risks).to_numpy()
+    scores = analises["pontuacao_total"].to_numpy()
+    if min_score is not None:
+        mask &= scores >= min_score
+    if max_score is not None:
+        mask &= scores <= max_score
+    return mask
+
+
+def _rate(numerator, denominator):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / np.maximum(denominator, 1), np.nan)
+
+
+def agent_summary(data, mask):
+    """
+    Por agente: ligações, pontuação média (e em % do máximo), taxa de aprovação dos itens do
+    checklist e taxa de ligações com critério eliminatório violado
+    """
+    analises, checklist = data["analises"], data["checklist"]
+    codes = analises["agente"].cat.codes.to_numpy()
+    n = len(analises["agente"].cat.categories)
+    scores = analises["pontuacao_total"].to_numpy()
+    validos = mask & ~np.isnan(scores)
+
+    ligacoes = np.bincount(codes[mask], minlength=n)
+    soma = np.bincount(codes[validos], weights=scores[validos], minlength=n)
+    com_nota = np.bincount(codes[validos], minlength=n)
+    violacoes = np.bincount(codes[mask], weights=analises["violou_eliminatorio"].to_numpy()[mask], minlength=n)
+
+    linhas = mask[checklist["pos"].to_numpy()]
+    item_codes = codes[checklist["pos"].to_numpy()[linhas]]
+    avaliados = np.bincount(item_codes, minlength=n)
+    aprovados = np.bincount(item_codes, weights=checklist["passou"].to_numpy()[linhas], minlength=n)
+
+    media = _rate(soma, com_nota)
+    summary = pd.DataFrame({
+        "agente": analises["agente"].cat.categories,
+        "ligacoes": ligacoes,
+        "pontuacao_media": media,
+        "pct_maximo": media / PONTUACAO_MAXIMA * 100,
+        "aprovacao_itens": _rate(aprovados, avaliados),
+        "taxa_eliminatorio": _rate(violacoes, ligacoes),
+    })
+    return summary[summary["ligacoes"] > 0].sort_values("pontuacao_media", ascending=False, ignore_index=True)
+
+
+def item_pass_rates(data, mask):
+    """
+    Por item do checklist: quantas vezes foi avaliado, aprovado e a taxa de aprovação
+    """
+    checklist = data["checklist"]
+    linhas = mask[checklist["pos"].to_numpy()]
+    items = checklist["item"].to_numpy()[linhas]
+    passou = checklist["passou"].to_numpy()[linhas]
+    n = int(items.max()) + 1 if len(items) else 0
+    avaliados = np.bincount(items, minlength=n)
+    aprovados = np.bincount(items, weights=passou, minlength=n)
+    presentes = np.nonzero(avaliados)[0]
+    return pd.DataFrame({
+        "item": presentes,
+        "avaliacoes": avaliados[presentes],
+        "aprovacoes": aprovados[presentes].astype(np.int64),
+        "taxa_aprovacao": aprovados[presentes] / avaliados[presentes],
+    })
+
+
+def agent_item_matrix(data, mask):
+    """
+    Taxa de aprovação de cada item (colunas) por agente (linhas)
+    """
+    analises, checklist = data["analises"], data["checklist"]
+    linhas = mask[checklist["pos"].to_numpy()]
+    codes = analises["agente"].cat.codes.to_numpy()[checklist["pos"].to_numpy()[linhas]]
+    items = checklist["item"].to_numpy()[linhas].astype(np.int64)
+    passou = checklist["passou"].to_numpy()[linhas]
+    n_agents = len(analises["agente"].cat.categories)
+    n_items = int(items.max()) + 1 if len(items) else 1
+
+    chave = codes.astype(np.int64) * n_items + items
+    avaliados = np.bincount(chave, minlength=n_agents * n_items).reshape(n_agents, n_items)
+    aprovados = np.bincount(chave, weights=passou, minlength=n_agents * n_items).reshape(n_agents, n_items)
+
+    agentes = avaliados.sum(axis=1) > 0
+    colunas = np.nonzero(avaliados.sum(axis=0))[0]
+    return pd.DataFrame(_rate(aprovados, avaliados)[np.ix_(agentes, colunas)],
+                        index=analises["agente"].cat.categories[agentes], columns=colunas)
+
+
+def score_distribution(data, mask, bin_width=5):
+    """
+    Histograma das pontuações de 0 a PONTUACAO_MAXIMA em faixas de `bin_width` pontos
+    """
+    scores = data["analises"]["pontuacao_total"].to_numpy()[mask]
+    scores = scores[~np.isnan(scores)]
+    edges = np.arange(0, PONTUACAO_MAXIMA + bin_width, bin_width)
+    edges[-1] = PONTUACAO_MAXIMA + 1
+    counts, _ = np.histogram(np.clip(scores, 0, PONTUACAO_MAXIMA), bins=edges)
+    return pd.DataFrame({
+        "faixa": [f"{int(a)}–{int(min(b - 1, PONTUACAO_MAXIMA))}" for a, b in zip(edges[:-1], edges[1:])],
+        "ligacoes": counts,
+    })
+
+
+def eliminatory_frequency(data, mask):
+    """
+    Quantas ligações violaram cada critério eliminatório e a proporção sobre as ligações filtradas
+    """
+    eliminatorios = data["eliminatorios"]
+    linhas = mask[eliminatorios["pos"].to_numpy()]
+    categorias = eliminatorios["criterio"].cat.categories
+    ocorrencias = np.bincount(eliminatorios["criterio"].cat.codes.to_numpy()[linhas], minlength=len(categorias))
+    total = int(mask.sum())
+    frequencia = pd.DataFrame({
+        "criterio": categorias,
+        "ocorrencias": ocorrencias,
+        "taxa": ocorrencias / total if total else np.zeros(len(categorias)),
+    })
+    return frequencia[frequencia["ocorrencias"] > 0].sort_values("ocorrencias", ascending=False, ignore_index=True)
+
+
+def overview(data, mask):
+    """
+    Números gerais das ligações filtradas
+    """
+    analises = data["analises"]
+    scores = analises["pontuacao_total"].to_numpy()[mask]
+    total = int(mask.sum())
+    return {
+        "ligacoes": total,
+        "pontuacao_media": float(np.nanmean(scores)) if total and not np.isnan(scores).all() else None,
+        "taxa_eliminatorio": float(analises["violou_eliminatorio"].to_numpy()[mask].mean()) if total else None,
+    }
@@ -0,0 +1,313 @@
+"""
+Modo batch (sem interface): analisa um diretório ou manifesto de gravações em paralelo
+e grava um resultado JSONL por ligação à medida que cada uma termina.
+
+Uso:
+    python -m monitorai.batch gravacoes/ --saida resultados.jsonl --workers 8 --pdf-dir relatorios/
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .cache import AnalysisCache, TranscriptCache
+from .cascade import NIVEIS_PADRAO, Cascade, load_rules
+from .metrics import METRICS_FILE, AnalysisTrace, record_trace, serve_prometheus
+from .pipeline import analyze_call, make_client
+from .prompts import MODELO_GPT
+from .store import ResultStore
+
+EXTENSOES_AUDIO = (".mp3",)
+
+
+def discover_recordings(source):
+    """
+    Lista as gravações a analisar como pares (id, caminho).
+
+    `source` pode ser um diretório (todos os .mp3, recursivamente) ou um manifesto:
+    um .txt com um caminho por linha ou um .jsonl com objetos {"id": ..., "path": ...}.
+    Caminhos relativos do manifesto são resolvidos a partir da pasta do manifesto.
+    Entradas .jsonl com "agente" viram triplas (id, caminho, {"agente": ...}), e o agente
+    é copiado para o registro de saída.
+    """
+    if os.path.isdir(source):
+        recordings = []
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if name.lower().endswith(EXTENSOES_AUDIO):
+                    path = os.path.join(root, name)
+                    recordings.append((os.path.splitext(name)[0], path))
+        return sorted(recordings, key=lambda r: r[1])
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    recordings = []
+    with open(source, encoding="utf-8") as manifest:
+        for line in manifest:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                entry = json.loads(line)
+                path = entry["path"]
+                call_id = entry.get("id") or os.path.splitext(os.path.basename(path))[0]
+                if entry.get("agente"):
+                    recordings.append((str(call_id), os.path.join(base_dir, path), {"agente": entry["agente"]}))
+                    continue
+            else:
+                path = line
+                call_id = os.path.splitext(os.path.basename(path))[0]
+            recordings.append((str(call_id), os.path.join(base_dir, path)))
+    return recordings
+
+
+def record_output(record, output):
+    """
+    Preenche o registro JSONL com o resultado de `analyze_call`
+    """
+    analysis = output["analise"]
+    record.update({
+        "status": "ok",
+        "pontuacao_total": analysis.get("pontuacao_total"),
+        "analise": analysis,
+        "transcricao": output["transcricao"],
+        "segmentos": output.get("segmentos") or [],
+        "resposta_toon": output["resposta_toon"],
+        "pdf": output["pdf"],
+    })
+    # Na cascata, o modelo que de fato produziu a análise
+    if output.get("modelo"):
+        record["modelo"] = output["modelo"]
+    return record
+
+
+def finish_record(record, trace, inicio, metrics_file=None):
+    """
+    Fecha o registro: duração total e métricas (no registro, no agregado do processo e em `metrics_file`)
+    """
+    record["duracao_s"] = round(time.perf_counter() - inicio, 3)
+    trace.extras["status"] = record["status"]
+    record_trace(trace, path=metrics_file)
+    record["metricas"] = trace.to_dict()
+    return record
+
+
+def process_recording(client, call_id, audio_path, model=MODELO_GPT, pdf_dir=None, metrics_file=None,
+                      metadata=None, **options):
+    """
+    Analisa uma gravação e devolve o registro JSONL correspondente (nunca levanta exceção).
+    `metadata` (ex.: agente) é copiado para o registro. Demais opções (caches, transcrição
+    em trechos...) são repassadas para `analyze_call`
+    """
+    inicio = time.perf_counter()
+    record = {"id": call_id, "arquivo": audio_path, "modelo": model, **(metadata or {})}
+    trace = AnalysisTrace(call_id)
+    try:
+        pdf_path = os.path.join(pdf_dir, f"{call_id}.pdf") if pdf_dir else None
+        output = analyze_call(client, audio_path, model=model, pdf_path=pdf_path, trace=trace, **options)
+        record_output(record, output)
+    except Exception as e:
+        record.update({"status": "erro", "erro": f"{type(e).__name__}: {e}"})
+    return finish_record(record, trace, inicio, metrics_file)
+
+
+def run_batch(client, recordings, workers=4, **options):
+    """
+    Processa as gravações em um pool limitado de `workers` threads e gera os registros
+    na ordem em que terminam. No máximo `2 * workers` tarefas ficam pendentes por vez,
+    então manifestos grandes não são carregados inteiros na fila do executor.
+    As opções são as de `process_recording` (model, pdf_dir, metrics_file, transcript_cache...)
+    """
+    pdf_dir = options.get("pdf_dir")
+    if pdf_dir:
+        os.makedirs(pdf_dir, exist_ok=True)
+
+    pending = set()
+    recordings = iter(recordings)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for call_id, path, *metadata in recordings:
+            pending.add(executor.submit(process_recording, client, call_id, path,
+                                        metadata=metadata[0] if metadata else None, **options))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m monitorai.batch",
+        description="Analisa em lote gravações de atendimento e grava os resultados em JSONL."
+    )
+    parser.add_argument("origem", help="Diretório com .mp3 ou manifesto (.txt/.jsonl)")
+    parser.add_argument("--saida", default="-", help="Arquivo JSONL de saída ('-' para stdout)")
+    parser.add_argument("--workers", type=int, default=4, help="Número de análises simultâneas")
+    parser.add_argument("--modelo", default=MODELO_GPT, help="Modelo usado na análise")
+    parser.add_argument("--pdf-dir", default=None, help="Diretório para gravar os relatórios PDF")
+    parser.add_argument("--cache-dir", default=None, help="Diretório do cache de transcrições")
+    parser.add_argument("--cache-max-mb", type=int, default=100, help="Tamanho máximo do cache de transcrições (MB)")
+    parser.add_argument("--cache-analises-dir", default=None, help="Diretório do cache de análises")
+    parser.add_argument("--sem-cache", action="store_true", help="Não usar os caches de transcrições e análises")
+    parser.add_argument("--trecho-s", type=float, default=None,
+                        help="Divide gravações longas em trechos deste tamanho (s) transcritos em paralelo")
+    parser.add_argument("--preprocessar", action="store_true",
+                        help="Converte para mono/16 kHz, comprime silêncios e recodifica o áudio antes do Whisper")
+    parser.add_argument("--sem-pretriagem", action="store_true",
+                        help="Envia todos os itens ao LLM (sem decidir localmente os itens de script)")
+    parser.add_argument("--janelas", action="store_true",
+                        help="Avalia abertura e encerramento só nos trechos da ligação em que acontecem, "
+                             "e o tempo de atendimento (item 1) pelos segmentos da transcrição, quando isso reduz "
+                             "os tokens de entrada estimados (ver monitorai.windows)")
+    parser.add_argument("--agrupar-tokens", type=int, default=None,
+                        help="Avalia ligações curtas juntas, em requisições de até N tokens estimados (ver monitorai.packing)")
+    parser.add_argument("--assincrono", action="store_true",
+                        help="Usa o cliente assíncrono com limitador de RPM/TPM (--workers vira a concorrência máxima)")
+    parser.add_argument("--rpm", type=int, default=None, help="Limite de requisições por minuto do modelo de análise")
+    parser.add_argument("--tpm", type=int, default=None, help="Limite de tokens por minuto do modelo de análise")
+    parser.add_argument("--cascata", nargs="*", default=None, metavar="MODELO",
+                        help="Analisa primeiro com um modelo mais barato e só escalona os casos limítrofes "
+                             f"(níveis padrão: {' '.join(NIVEIS_PADRAO)}; ver monitorai.cascade)")
+    parser.add_argument("--cascata-regras", default=None,
+                        help="Arquivo JSON com as regras de escalonamento e os limiares por modelo")
+    parser.add_argument("--cascata-auditoria", type=float, default=0.0,
+                        help="Fração das ligações não escalonadas também analisadas pelo último nível "
+                             "(mede a concordância)")
+    parser.add_argument("--offline", action="store_true",
+                        help="Analisa pela API de batch do provedor: mais barato, com resultado em até 24h "
+                             "(ver monitorai.offline)")
+    parser.add_argument("--offline-dir", default="monitorai_offline",
+                        help="Diretório do estado do modo offline (a execução com o mesmo diretório retoma os lotes pendentes)")
+    parser.add_argument("--offline-intervalo", type=float, default=60,
+                        help="Intervalo entre as consultas ao status do lote (s)")
+    parser.add_argument("--offline-rodadas", type=int, default=3,
+                        help="Rodadas de lote, contando as de reenvio das linhas com erro ou incompletas")
+    parser.add_argument("--db", default=None,
+                        help="Também grava cada análise concluída neste banco SQLite (ver monitorai.store)")
+    parser.add_argument("--metricas-jsonl", default=METRICS_FILE, help="Arquivo JSONL com as métricas de cada análise")
+    parser.add_argument("--metricas-porta", type=int, default=None,
+                        help="Expõe as métricas no formato Prometheus em http://0.0.0.0:PORTA/metrics")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    if args.offline and (args.assincrono or args.agrupar_tokens or args.cascata is not None or args.janelas):
+        parser.error("--offline ainda não é suportado com --assincrono, --agrupar-tokens, --cascata ou --janelas")
+    if args.janelas and (args.assincrono or args.agrupar_tokens or args.cascata is not None):
+        parser.error("--janelas ainda não é suportado com --assincrono, --agrupar-tokens ou --cascata")
+    cascade = None
+    if args.cascata is not None:
+        if args.assincrono or args.agrupar_tokens:
+            parser.error("--cascata ainda não é suportada com --assincrono ou --agrupar-tokens")
+        try:
+            rules = load_rules(args.cascata_regras) if args.cascata_regras else None
+        except (OSError, ValueError) as e:
+            parser.error(f"--cascata-regras: {e}")
+        cascade = Cascade(args.cascata or NIVEIS_PADRAO, rules, audit_rate=args.cascata_auditoria)
+
+    recordings = discover_recordings(args.origem)
+    if args.metricas_porta:
+        serve_prometheus(args.metricas_porta)
+    transcript_cache = analysis_cache = None
+    if not args.sem_cache:
+        transcript_cache = TranscriptCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024)
+        analysis_cache = AnalysisCache(args.cache_analises_dir)
+        removidas = analysis_cache.purge_stale()
+        if removidas:
+            print(f"{removidas} análises em cache de outra versão do prompt foram removidas", file=sys.stderr)
+
+    options = dict(model=args.modelo, pdf_dir=args.pdf_dir, transcript_cache=transcript_cache,
+                   analysis_cache=analysis_cache, metrics_file=args.metricas_jsonl,
+                   prescreen=not args.sem_pretriagem)
+
+    store = ResultStore(args.db) if args.db else None
+    out = sys.stdout if args.saida == "-" else open(args.saida, "a", encoding="utf-8")
+    contagem = {"total": 0, "erros": 0}
+
+    def write_record(record):
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        if store is not None:
+            store.save_record(record)
+        contagem["total"] += 1
+        if record["status"] != "ok":
+            contagem["erros"] += 1
+        print(f"[{contagem['total']}/{len(recordings)}] {record['id']}: {record['status']} ({record['duracao_s']}s)",
+              file=sys.stderr)
+
+    try:
+        if args.assincrono:
+            if args.trecho_s or args.preprocessar or args.agrupar_tokens:
+                parser.error("--trecho-s, --preprocessar e --agrupar-tokens ainda não são suportados com --assincrono")
+            _run_async(recordings, args, options, write_record)
+        elif args.offline:
+            from .offline import run_batch_offline
+
+            def progress(evento):
+                if "rodada" in evento:
+                    print(f"Rodada {evento['rodada']}: {evento['ligacoes']} ligações em {len(evento['lotes'])} lote(s) "
+                          f"({', '.join(evento['lotes'])})", file=sys.stderr)
+                else:
+                    print(f"Lote {evento['lote']}: {evento['status']} ({evento['concluidas']} concluídas, "
+                          f"{evento['falhas']} com erro de {evento['total']})", file=sys.stderr)
+
+            for record in run_batch_offline(make_client(), recordings, args.offline_dir, workers=args.workers,
+                                            chunk_seconds=args.trecho_s, preprocess=args.preprocessar,
+                                            poll_interval=args.offline_intervalo, max_rounds=args.offline_rodadas,
+                                            progress=progress, **options):
+                write_record(record)
+        elif args.agrupar_tokens:
+            from .packing import run_batch_packed
+
+            for record in run_batch_packed(make_client(), recordings, workers=args.workers,
+                                           token_budget=args.agrupar_tokens, chunk_seconds=args.trecho_s,
+                                           preprocess=args.preprocessar, **options):
+                write_record(record)
+        else:
+            client = make_client()
+            for record in run_batch(client, recordings, workers=args.workers, chunk_seconds=args.trecho_s,
+                                    preprocess=args.preprocessar, cascade=cascade, windows=args.janelas, **options):
+                write_record(record)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if store is not None:
+            store.close()
+
+    if transcript_cache is not None:
+        print(f"Cache de transcrições: {transcript_cache.stats()}", file=sys.stderr)
+        print(f"Cache de análises: {analysis_cache.stats()}", file=sys.stderr)
+    if cascade is not None:
+        print(f"Cascata: {json.dumps(cascade.stats.summary(), ensure_ascii=False)}", file=sys.stderr)
+
+    return 1 if contagem["erros"] else 0
+
+
+def _run_async(recordings, args, options, write_record):
+    import asyncio
+
+    from .aio import LIMITES_PADRAO, AsyncAnalyzer, run_batch_async
+
+    limits = {args.modelo: dict(LIMITES_PADRAO.get(args.modelo, {}))}
+    if args.rpm:
+        limits[args.modelo]["rpm"] = args.rpm
+    if args.tpm:
+        limits[args.modelo]["tpm"] = args.tpm
+
+    async def consume():
+        async with AsyncAnalyzer(limits=limits, max_connections=max(args.workers, 8)) as analyzer:
+            async for record in run_batch_async(analyzer, recordings, concurrency=args.workers, **options):
+                write_record(record)
+        print(f"Novas tentativas por erro transitório: {analyzer.retries}", file=sys.stderr)
+
+    asyncio.run(consume())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+"""
+Caches em disco endereçados por conteúdo (hash SHA-256) com despejo LRU limitado por tamanho.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_CACHE_DIR = os.environ.get("MONITORAI_CACHE_DIR", ".monitorai_cache")
+
+# Áudios enviados pela interface sem uso há mais deste tempo (s) são apagados na limpeza
+RETENCAO_UPLOADS_S = 2 * 3600
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_key(*parts):
+    """
+    Gera uma chave estável a partir de partes serializáveis em JSON
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hash_bytes(payload.encode("utf-8"))
+
+
+class DiskCache:
+    """
+    Cache chave -> valor JSON com um arquivo por entrada.
+
+    O tempo de modificação do arquivo marca o último uso (atualizado a cada acerto), e ao
+    ultrapassar `max_bytes` as entradas menos usadas recentemente são removidas.
+    Seguro para uso por várias threads do mesmo processo; entre processos a escrita é atômica
+    (arquivo temporário + rename) e o pior caso é recalcular uma entrada.
+    """
+
+    def __init__(self, directory, max_bytes=100 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._total_bytes = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += len(data) - old_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def delete(self, key):
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return False
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes -= size
+        return True
+
+    def clear(self):
+        for path, _, _ in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "bytes": self._total_bytes if self._total_bytes is not None else self._scan_size(),
+                "max_bytes": self.max_bytes,
+            }
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        # Chamado com o lock adquirido: remove as entradas mais antigas até ficar abaixo de 90% do limite
+        target = self.max_bytes * 0.9
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+        self._total_bytes = total
+
+
+class TranscriptCache(DiskCache):
+    """
+    Cache de transcrições do Whisper, endereçado pelo hash do áudio e pelos parâmetros
+    da transcrição (modelo, idioma, formato...)
+    """
+
+    def __init__(self, directory=None, max_bytes=100 * 1024 * 1024):
+        super().__init__(directory or os.path.join(DEFAULT_CACHE_DIR, "transcricoes"), max_bytes)
+
+    def key_for(self, audio_bytes, model, params=None):
+        return hash_key("transcricao", hash_bytes(audio_bytes), model, params or {})
+
+
+class AnalysisCache(DiskCache):
+    """
+    Cache das análises do GPT (resposta bruta TOON + dicionário parseado), endereçado por
+    (hash da transcrição, versão do prompt, impressão digital da rubrica, modelo, temperatura).
+
+    Entradas geradas com outra versão de prompt nunca são lidas; `purge_stale()` as remove do disco.
+    """
+
+    def __init__(self, directory=None, max_bytes=200 * 1024 * 1024, prompt_version=None):
+        from .prompts import PROMPT_VERSION, rubric_fingerprint
+
+        super().__init__(directory or os.path.join(DEFAULT_CACHE_DIR, "analises"), max_bytes)
+        self.prompt_version = f"{prompt_version or PROMPT_VERSION}:{rubric_fingerprint(prompt_version)}"
+
+    def key_for(self, transcript_text, model, temperature, variant=None):
+        parts = ["analise", hash_bytes(transcript_text.encode("utf-8")), self.prompt_version, model, temperature]
+        # `variant` distingue prompts reduzidos (ex.: itens decididos pela pré-triagem)
+        if variant is not None:
+            parts.append(variant)
+        return hash_key(*parts)
+
+    def get_analysis(self, transcript_text, model, temperature, variant=None):
+        """
+        Retorna (resposta_toon, analise) em cache ou None
+        """
+        entry = self.get(self.key_for(transcript_text, model, temperature, variant))
+        if entry is None:
+            return None
+        return entry["resposta_toon"], entry["analise"]
+
+    def set_analysis(self, transcript_text, model, temperature, result, analysis, variant=None):
+        self.set(self.key_for(transcript_text, model, temperature, variant), {
+            "prompt_version": self.prompt_version,
+            "modelo": model,
+            "temperatura": temperature,
+            "resposta_toon": result,
+            "analise": analysis,
+        })
+
+    def purge_stale(self):
+        """
+        Remove as análises geradas com outra versão do prompt/rubrica. Retorna quantas foram removidas
+        """
+        removed = 0
+        for path, _, _ in list(self._entries()):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    version = json.load(f).get("prompt_version")
+            except (OSError, ValueError):
+                version = None
+            if version != self.prompt_version:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        with self._lock:
+            self._total_bytes = None
+        return removed
+
+
+class UploadStore:
+    """
+    Áudios enviados pela interface, gravados uma única vez por conteúdo (hash no nome do arquivo).
+
+    Reenviar o mesmo áudio, ou um rerun do Streamlit, reaproveita o arquivo (o mtime marca o
+    último uso). `cleanup()` apaga os arquivos sem uso há mais de `max_age` segundos e roda no
+    máximo a cada `cleanup_interval` segundos, a partir de `save` ou de quem chamar
+    """
+
+    def __init__(self, directory=None, max_age=RETENCAO_UPLOADS_S, cleanup_interval=600):
+        self.directory = directory or os.path.join(DEFAULT_CACHE_DIR, "uploads")
+        self.max_age = max_age
+        self.cleanup_interval = cleanup_interval
+        self._last_cleanup = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def save(self, data, suffix=".mp3"):
+        """
+        Grava o áudio se ainda não existe. Retorna (hash, caminho)
+        """
+        digest = hash_bytes(data)
+        path = os.path.join(self.directory, digest + suffix)
+        try:
+            os.utime(path)
+        except OSError:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        self.cleanup()
+        return digest, path
+
+    def cleanup(self, force=False):
+        """
+        Apaga os áudios (e temporários de gravações interrompidas) sem uso há mais de `max_age`.
+        Retorna quantos arquivos foram removidos
+        """
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_cleanup < self.cleanup_interval:
+                return 0
+            self._last_cleanup = now
+        removed = 0
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < now - self.max_age:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
@@ -0,0 +1,248 @@
+"""
+Cascata de modelos: um modelo mais barato e rápido faz a análise primeiro, e a ligação só é
+reenviada ao modelo completo quando o resultado é limítrofe.
+
+Motivos de escalonamento (cada um pode ser desligado nas regras):
+- `pontuacao_limitrofe`: pontuação a menos de `margem` pontos do `corte` de aprovação;
+- `eliminatorio`: algum critério eliminatório ocorreu;
+- `incompleta`: a resposta não parseou ou veio incompleta (o primeiro nível não faz reparo);
+- `contradicao`: respostas que se contradizem (pontuação diferente da soma dos itens "sim",
+  item 11 contra `uso_script`, critério eliminatório com risco baixo).
+
+As regras têm valores padrão (`REGRAS_PADRAO`) e ajustes por modelo (`LIMIARES_POR_MODELO`);
+`Cascade(rules=...)` aceita um dicionário no mesmo formato, ex. lido de um JSON:
+    {"padrao": {"corte": 57, "margem": 8}, "gpt-4o-mini": {"margem": 12, "contradicao": false}}
+
+`CascadeStats` acumula, por nível, ligações, latência e custo, os motivos de escalonamento e a
+concordância entre os níveis (veredito e itens do checklist) nas ligações avaliadas pelos dois.
+"""
+
+import json
+import random
+import threading
+import time
+
+from .metrics import AnalysisTrace, estimate_cost
+from .models import Analysis
+from .pipeline import run_analysis
+from .prompts import MODELO_GPT, TEMPERATURA, checklist_items
+from .repair import missing_parts
+from .toon import EVENTO_REINICIO
+
+MODELO_RAPIDO = "gpt-4o-mini"
+NIVEIS_PADRAO = (MODELO_RAPIDO, MODELO_GPT)
+
+MOTIVOS = ("pontuacao_limitrofe", "eliminatorio", "incompleta", "contradicao")
+
+# Pontuação de corte (aprovação, de 81) e a distância dela considerada limítrofe; ajuste
+# conforme a política da equipe de qualidade
+REGRAS_PADRAO = {
+    "corte": 57,
+    "margem": 8,
+    "pontuacao_limitrofe": True,
+    "eliminatorio": True,
+    "incompleta": True,
+    "contradicao": True,
+}
+
+# Ajustes por modelo do primeiro nível (sobrepõem REGRAS_PADRAO)
+LIMIARES_POR_MODELO = {
+    MODELO_RAPIDO: {"margem": 10},
+}
+
+# Item do checklist que corresponde ao script de encerramento (`uso_script`)
+ITEM_ENCERRAMENTO = 11
+
+
+def _contradictions(analysis):
+    """
+    Pares de respostas incompatíveis na mesma análise (lista de descrições)
+    """
+    encontradas = []
+    itens = {item.item: item for item in analysis.checklist or ()}
+    if len(itens) == len(checklist_items()) and analysis.pontuacao_total is not None:
+        soma = sum(item.pontos or 0 for item in itens.values() if item.passou)
+        if soma != analysis.pontuacao_total:
+            encontradas.append(f"pontuacao_total {analysis.pontuacao_total} != soma dos itens {soma}")
+    encerramento = itens.get(ITEM_ENCERRAMENTO)
+    status = ((analysis.uso_script and analysis.uso_script.status) or "").lower()
+    if encerramento is not None and status:
+        if encerramento.passou and status == "não utilizado" or not encerramento.passou and status == "completo":
+            encontradas.append(f"item {ITEM_ENCERRAMENTO} \"{encerramento.resposta}\" com uso_script \"{status}\"")
+    risco = ((analysis.status_final and analysis.status_final.risco) or "").lower()
+    if analysis.violou_eliminatorio and risco == "baixo":
+        encontradas.append("critério eliminatório com risco baixo")
+    return encontradas
+
+
+def _verdict(analysis, corte):
+    return (analysis.pontuacao_total or 0) >= corte and not analysis.violou_eliminatorio
+
+
+class CascadeStats:
+    """
+    Agregados da cascata (thread-safe): por nível, ligações, latência e custo; motivos de
+    escalonamento; concordância de veredito e de itens entre os níveis
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.niveis = {}
+        self.escalonadas = 0
+        self.motivos = {}
+        self.comparadas = 0
+        self.veredito_igual = 0
+        self.itens_comparados = 0
+        self.itens_iguais = 0
+
+    def observe_tier(self, model, seconds, cost):
+        with self._lock:
+            nivel = self.niveis.setdefault(model, {"ligacoes": 0, "latencia_s": 0.0, "custo_usd": 0.0})
+            nivel["ligacoes"] += 1
+            nivel["latencia_s"] += seconds
+            nivel["custo_usd"] += cost
+
+    def observe_escalation(self, reasons):
+        with self._lock:
+            self.escalonadas += 1
+            for motivo in reasons:
+                self.motivos[motivo] = self.motivos.get(motivo, 0) + 1
+
+    def observe_agreement(self, first, final, corte):
+        respostas = {item.item: item.passou for item in first.checklist or ()}
+        comparaveis = [item for item in final.checklist or () if item.item in respostas]
+        with self._lock:
+            self.comparadas += 1
+            self.veredito_igual += _verdict(first, corte) == _verdict(final, corte)
+            self.itens_comparados += len(comparaveis)
+            self.itens_iguais += sum(respostas[item.item] == item.passou for item in comparaveis)
+
+    def summary(self):
+        with self._lock:
+            return {
+                "niveis": {
+                    model: {
+                        "ligacoes": nivel["ligacoes"],
+                        "latencia_media_s": round(nivel["latencia_s"] / nivel["ligacoes"], 3),
+                        "custo_usd": round(nivel["custo_usd"], 6),
+                        "custo_medio_usd": round(nivel["custo_usd"] / nivel["ligacoes"], 6),
+                    }
+                    for model, nivel in self.niveis.items()
+                },
+                "escalonadas": self.escalonadas,
+                "motivos": dict(self.motivos),
+                "comparadas": self.comparadas,
+                "concordancia_veredito": round(self.veredito_igual / self.comparadas, 4) if self.comparadas else None,
+                "concordancia_itens": (round(self.itens_iguais / self.itens_comparados, 4)
+                                       if self.itens_comparados else None),
+            }
+
+
+class Cascade:
+    """
+    Análise em níveis: `tiers` em ordem crescente de custo. Cada nível, exceto o último, só
+    repassa a ligação adiante se `escalation_reasons` encontrar algum motivo. Com `audit_rate`,
+    essa fração das ligações não escalonadas também vai ao último nível, só para medir a
+    concordância (o resultado usado continua o do primeiro nível)
+    """
+
+    def __init__(self, tiers=NIVEIS_PADRAO, rules=None, audit_rate=0.0, stats=None):
+        self.tiers = tuple(tiers)
+        self.rules = rules or {}
+        self.audit_rate = audit_rate
+        self.stats = stats or CascadeStats()
+
+    def rules_for(self, model):
+        return {**REGRAS_PADRAO, **self.rules.get("padrao", {}), **LIMIARES_POR_MODELO.get(model, {}),
+                **self.rules.get(model, {})}
+
+    def escalation_reasons(self, analysis, model):
+        """
+        Motivos (em MOTIVOS) para repassar a análise do `model` ao próximo nível
+        """
+        regras = self.rules_for(model)
+        try:
+            parsed = Analysis.from_dict(analysis)
+        except (TypeError, ValueError):
+            return ["incompleta"] if regras["incompleta"] else []
+        motivos = []
+        if regras["pontuacao_limitrofe"] and parsed.pontuacao_total is not None \
+                and abs(parsed.pontuacao_total - regras["corte"]) <= regras["margem"]:
+            motivos.append("pontuacao_limitrofe")
+        if regras["eliminatorio"] and parsed.violou_eliminatorio:
+            motivos.append("eliminatorio")
+        if regras["incompleta"] and missing_parts(analysis):
+            motivos.append("incompleta")
+        if regras["contradicao"] and _contradictions(parsed):
+            motivos.append("contradicao")
+        return motivos
+
+    def _run_tier(self, client, transcript_text, model, temperature, cache, trace, prescreen, last, on_event=None):
+        inicio = time.perf_counter()
+        antes = dict(trace.uso.get(model, {}))
+        # Só o último nível repara respostas incompletas; nos outros, a resposta incompleta é escalonada
+        result, analysis = run_analysis(client, transcript_text, model, temperature, cache=cache, trace=trace,
+                                        prescreen=prescreen, repair=last, on_event=on_event)
+        uso = {tipo: total - antes.get(tipo, 0) for tipo, total in trace.uso.get(model, {}).items()}
+        custo = estimate_cost(model, uso.get("prompt_tokens", 0), uso.get("completion_tokens", 0),
+                              uso.get("cached_tokens", 0))
+        self.stats.observe_tier(model, time.perf_counter() - inicio, custo)
+        return result, analysis
+
+    def run(self, client, transcript_text, temperature=TEMPERATURA, cache=None, trace=None, prescreen=True,
+            on_event=None):
+        """
+        Como `run_analysis`, mas percorrendo os níveis. Retorna (resposta_toon, analise, modelo_usado);
+        em `trace.extras["cascata"]` ficam o modelo usado e, por nível, a pontuação e os motivos
+        de escalonamento. Com `on_event`, cada nível é feito em streaming; antes de um nível
+        escalonado vai o evento (EVENTO_REINICIO, modelo), e as seções do nível anterior deixam de valer
+        """
+        trace = trace if trace is not None else AnalysisTrace()
+        percurso = []
+        primeira = None
+        for nivel, model in enumerate(self.tiers):
+            last = nivel == len(self.tiers) - 1
+            if on_event is not None and nivel:
+                on_event(EVENTO_REINICIO, model)
+            result, analysis = self._run_tier(client, transcript_text, model, temperature, cache, trace, prescreen,
+                                              last, on_event)
+            usado = model
+            if primeira is None:
+                primeira = analysis
+            motivos = [] if last else self.escalation_reasons(analysis, model)
+            percurso.append({"modelo": model, "pontuacao": analysis.get("pontuacao_total"), "motivos": motivos})
+            if not motivos:
+                break
+            self.stats.observe_escalation(motivos)
+
+        if len(percurso) > 1:
+            self._compare(primeira, analysis)
+        elif len(self.tiers) > 1 and self.audit_rate and random.random() < self.audit_rate:
+            # Auditoria: o último nível também analisa, só para medir a concordância
+            _, referencia = self._run_tier(client, transcript_text, self.tiers[-1], temperature, cache, trace,
+                                           prescreen, True)
+            percurso.append({"modelo": self.tiers[-1], "pontuacao": referencia.get("pontuacao_total"),
+                             "motivos": [], "auditoria": True})
+            self._compare(primeira, referencia)
+        trace.extras["cascata"] = {"modelo": usado, "niveis": percurso}
+        return result, analysis, usado
+
+    def _compare(self, first, final):
+        try:
+            self.stats.observe_agreement(Analysis.from_dict(first), Analysis.from_dict(final),
+                                         self.rules_for(self.tiers[0])["corte"])
+        except (TypeError, ValueError):
+            pass
+
+
+def load_rules(path):
+    """
+    Lê as regras de escalonamento de um arquivo JSON (formato em `Cascade`)
+    """
+    with open(path, encoding="utf-8") as f:
+        rules = json.load(f)
+    for model, regras in rules.items():
+        desconhecidas = set(regras) - set(REGRAS_PADRAO)
+        if desconhecidas:
+            raise ValueError(f"Regras desconhecidas para {model}: {', '.join(sorted(desconhecidas))}")
+    return rules
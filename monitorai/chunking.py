@@ -0,0 +1,150 @@
+"""
+Transcrição em paralelo de gravações longas: o áudio é dividido em trechos nos silêncios
+(com sobreposição), os trechos são transcritos simultaneamente e os textos são costurados
+removendo as palavras repetidas na sobreposição.
+
+Requer `pydub` e o `ffmpeg` instalado no sistema (packages.txt).
+"""
+
+import difflib
+import io
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# Limite de upload da API de transcrição é 25 MB; acima disso o áudio é sempre dividido
+LIMITE_UPLOAD_BYTES = 24 * 1024 * 1024
+
+DURACAO_TRECHO_S = 120
+SOBREPOSICAO_S = 2.0
+SILENCIO_MINIMO_MS = 400
+# Silêncio = trecho abaixo do volume médio do áudio menos este valor (dB)
+MARGEM_SILENCIO_DB = 16
+TAXA_EXPORTACAO = "64k"
+
+_NORMALIZE_RE = re.compile(r"[^\w]+")
+
+
+def load_audio(audio_path):
+    try:
+        from pydub import AudioSegment
+    except ImportError as e:
+        raise RuntimeError(
+            "A transcrição em trechos requer o pacote pydub e o ffmpeg instalados"
+        ) from e
+    return AudioSegment.from_file(audio_path)
+
+
+def plan_chunks(audio, chunk_seconds=DURACAO_TRECHO_S, overlap_seconds=SOBREPOSICAO_S,
+                min_silence_ms=SILENCIO_MINIMO_MS):
+    """
+    Retorna os intervalos (inicio_ms, fim_ms) de cada trecho.
+
+    Cada corte é feito no meio do silêncio mais próximo (antes) do tamanho alvo, desde que
+    o trecho tenha pelo menos metade do tamanho alvo; sem silêncio adequado, o corte é seco.
+    Cada trecho começa `overlap_seconds` antes do corte anterior, para que palavras cortadas
+    apareçam inteiras em um dos lados.
+    """
+    from pydub.silence import detect_silence
+
+    total_ms = len(audio)
+    alvo_ms = int(chunk_seconds * 1000)
+    overlap_ms = int(overlap_seconds * 1000)
+    if total_ms <= alvo_ms:
+        return [(0, total_ms)]
+
+    silence_thresh = audio.dBFS - MARGEM_SILENCIO_DB
+    silencios = detect_silence(audio, min_silence_len=min_silence_ms, silence_thresh=silence_thresh,
+                               seek_step=10)
+    cortes_possiveis = [(inicio + fim) // 2 for inicio, fim in silencios]
+
+    spans = []
+    inicio = 0
+    while inicio < total_ms:
+        ideal = inicio + alvo_ms
+        if ideal >= total_ms:
+            fim = total_ms
+        else:
+            candidatos = [c for c in cortes_possiveis if inicio + alvo_ms // 2 <= c <= ideal]
+            fim = candidatos[-1] if candidatos else ideal
+        spans.append((max(0, inicio - overlap_ms) if spans else 0, fim))
+        inicio = fim
+    return spans
+
+
+def _normalize(word):
+    return _NORMALIZE_RE.sub("", word.lower())
+
+
+def stitch_transcripts(texts, max_overlap_words=40):
+    """
+    Junta os textos dos trechos, removendo do início de cada trecho as palavras que repetem
+    o fim do anterior (a região de sobreposição). A comparação ignora caixa e pontuação e
+    tolera pequenas diferenças de transcrição entre os dois lados
+    """
+    words = []
+    for text in texts:
+        new_words = text.split()
+        if not words:
+            words = new_words
+            continue
+        if not new_words:
+            continue
+
+        tail = [_normalize(w) for w in words[-max_overlap_words:]]
+        head = [_normalize(w) for w in new_words[:max_overlap_words]]
+        matcher = difflib.SequenceMatcher(None, tail, head, autojunk=False)
+        a, b, size = matcher.find_longest_match(0, len(tail), 0, len(head))
+        minimo = min(3, len(tail), len(head))
+        exato = a + size == len(tail) and b == 0 and size >= 2
+        # A repetição precisa estar no fim do texto anterior e no começo do novo
+        if size > 0 and (size >= minimo or exato) and len(tail) - (a + size) <= 3 and b <= 3:
+            words = words[:len(words) - len(tail) + a + size] + new_words[b + size:]
+        else:
+            words = words + new_words
+    return " ".join(words)
+
+
+def transcript_segments(transcript, offset_s=0.0):
+    """
+    Segmentos com tempo de uma resposta `verbose_json` do Whisper, como
+    [{"inicio": s, "fim": s, "texto": ...}], deslocados de `offset_s` segundos
+    """
+    segmentos = []
+    for segment in getattr(transcript, "segments", None) or []:
+        campos = segment if isinstance(segment, dict) else vars(segment)
+        texto = (campos.get("text") or "").strip()
+        if texto:
+            segmentos.append({"inicio": round(campos["start"] + offset_s, 2), "fim": round(campos["end"] + offset_s, 2),
+                              "texto": texto})
+    return segmentos
+
+
+def transcribe_chunked(client, audio_path, model, chunk_seconds=DURACAO_TRECHO_S,
+                       overlap_seconds=SOBREPOSICAO_S, workers=4, params=None):
+    """
+    Transcreve o áudio em trechos simultâneos. Retorna (texto, duracao_segundos, num_trechos, segmentos);
+    os tempos dos segmentos são da gravação inteira, e os que começam na sobreposição com o
+    trecho anterior ficam de fora
+    """
+    audio = load_audio(audio_path)
+    spans = plan_chunks(audio, chunk_seconds, overlap_seconds)
+
+    def transcribe_span(index_span):
+        index, (inicio, fim) = index_span
+        buffer = io.BytesIO()
+        audio[inicio:fim].export(buffer, format="mp3", bitrate=TAXA_EXPORTACAO)
+        transcript = client.audio.transcriptions.create(
+            model=model,
+            file=(f"trecho_{index:03d}.mp3", buffer.getvalue()),
+            **(params or {})
+        )
+        return transcript
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(spans)))) as executor:
+        transcripts = list(executor.map(transcribe_span, enumerate(spans)))
+
+    segmentos = []
+    for index, ((inicio, _), transcript) in enumerate(zip(spans, transcripts)):
+        corte = spans[index - 1][1] / 1000 if index else 0.0
+        segmentos.extend(s for s in transcript_segments(transcript, inicio / 1000) if s["inicio"] >= corte)
+    return stitch_transcripts([t.text for t in transcripts]), len(audio) / 1000, len(spans), segmentos
@@ -0,0 +1,249 @@
+"""
+Exportação em lote dos relatórios: os PDFs de várias análises do histórico são gerados em um
+pool de processos e gravados, um a um e assim que ficam prontos, direto em um arquivo ZIP em
+disco, mais um CSV com a pontuação e os critérios eliminatórios de cada análise.
+
+A exportação pode ser retomada: a cada `checkpoint` relatórios o ZIP é fechado (diretório
+central gravado) e o final do arquivo é copiado para `<saida>.checkpoint`. Se a execução for
+interrompida, a próxima restaura o ZIP até o último checkpoint e gera só os relatórios que faltam.
+
+Uso:
+    python -m monitorai.export semana.zip --db monitorai.db --desde 2026-10-01 --ate 2026-10-08 --workers 4
+"""
+
+import argparse
+import csv
+import multiprocessing
+import os
+import re
+import struct
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .report import create_pdf
+from .store import ResultStore
+from .util import write_atomic
+
+CHECKPOINT_PADRAO = 20
+
+CAMPOS_CSV = ("id", "call_id", "arquivo", "criado_em", "agente", "modelo", "risco", "pontuacao_total",
+              "violou_eliminatorio", "criterios_violados", "relatorio")
+
+_NOME_RE = re.compile(r"^relatorio_(\d+)\.pdf$")
+_OFFSET = struct.Struct("<Q")
+
+
+def report_name(analise_id):
+    return f"relatorio_{analise_id:06d}.pdf"
+
+
+def _render(analise_id, analysis, transcript_text, model):
+    # Executado no processo do pool
+    inicio = time.perf_counter()
+    pdf_bytes = create_pdf(analysis, transcript_text, model)
+    return analise_id, pdf_bytes, time.perf_counter() - inicio
+
+
+class ReportArchive:
+    """
+    ZIP de saída com checkpoints: `add` grava a entrada direto no arquivo e `checkpoint`
+    fecha o ZIP e guarda o diretório central em `<path>.checkpoint` para uma retomada
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.checkpoint_path = path + ".checkpoint"
+        self._restore()
+        self._zip = zipfile.ZipFile(path, "a", zipfile.ZIP_STORED)
+        self.names = set(self._zip.namelist())
+        if not os.path.exists(self.checkpoint_path):
+            self.checkpoint()
+
+    def _restore(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            zipfile.ZipFile(self.path).close()
+            return
+        except zipfile.BadZipFile:
+            pass
+        if not os.path.exists(self.checkpoint_path):
+            raise RuntimeError(f"{self.path} não é um ZIP válido e não há checkpoint para restaurá-lo")
+        with open(self.checkpoint_path, "rb") as f:
+            data = f.read()
+        (offset,) = _OFFSET.unpack_from(data)
+        # Descarta o que foi gravado depois do checkpoint e recoloca o diretório central salvo
+        with open(self.path, "r+b") as f:
+            f.truncate(offset)
+            f.seek(offset)
+            f.write(data[_OFFSET.size:])
+
+    def done_ids(self):
+        return {int(match.group(1)) for match in map(_NOME_RE.match, self.names) if match}
+
+    def add(self, name, data):
+        self._zip.writestr(name, data)
+        self.names.add(name)
+
+    def checkpoint(self):
+        self._zip.close()
+        with zipfile.ZipFile(self.path) as zf:
+            offset = zf.start_dir
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            tail = f.read()
+        write_atomic(self.checkpoint_path, _OFFSET.pack(offset) + tail)
+        self._zip = zipfile.ZipFile(self.path, "a", zipfile.ZIP_STORED)
+
+    def close(self, complete=True):
+        """
+        Fecha o ZIP. Se `complete`, remove o checkpoint; senão grava um novo para a próxima execução
+        """
+        if not complete:
+            self.checkpoint()
+        self._zip.close()
+        if complete:
+            try:
+                os.remove(self.checkpoint_path)
+            except OSError:
+                pass
+
+
+def _csv_row(registro, nome):
+    analysis = registro["analise"]
+    violados = [c.get("criterio", "") for c in analysis.get("criterios_eliminatorios") or [] if c.get("ocorreu")]
+    return {
+        **{campo: registro.get(campo) for campo in ("id", "call_id", "arquivo", "criado_em", "agente", "modelo",
+                                                     "risco", "pontuacao_total")},
+        "violou_eliminatorio": int(bool(violados)),
+        "criterios_violados": "; ".join(violados),
+        "relatorio": nome,
+    }
+
+
+def export_reports(store, path, ids=None, workers=4, checkpoint_every=CHECKPOINT_PADRAO, csv_path=None,
+                   progress=None, **filters):
+    """
+    Exporta os relatórios das análises `ids` (ou das que passam nos filtros de `ResultStore.find`)
+    para o ZIP `path`, gerando os PDFs em `workers` processos. Análises que já estão no ZIP (de
+    uma execução interrompida) não são geradas de novo. `progress(evento)` é chamado a cada
+    relatório com {"id", "feitos", "total", "bytes", "tempo_s"} ou {"id", ..., "erro"}.
+    No fim grava o CSV (`csv_path`, padrão: mesmo nome do ZIP com .csv). Retorna um resumo
+    """
+    if ids is None:
+        ids = sorted(row["id"] for row in store.find(limit=None, **filters))
+    csv_path = csv_path or os.path.splitext(path)[0] + ".csv"
+    archive = ReportArchive(path)
+    feitos = archive.done_ids()
+    resumo = {"total": len(ids), "retomados": len(feitos & set(ids)), "gerados": 0, "erros": 0, "bytes": 0}
+    linhas = {}
+    pendentes = set()
+    desde_checkpoint = 0
+
+    def collect(done):
+        nonlocal desde_checkpoint
+        for future in done:
+            analise_id = futures_ids.pop(future)
+            evento = {"id": analise_id, "total": len(ids)}
+            try:
+                _, pdf_bytes, tempo = future.result()
+            except Exception as e:
+                resumo["erros"] += 1
+                evento["erro"] = f"{type(e).__name__}: {e}"
+            else:
+                archive.add(report_name(analise_id), pdf_bytes)
+                linhas[analise_id]["relatorio"] = report_name(analise_id)
+                resumo["gerados"] += 1
+                resumo["bytes"] += len(pdf_bytes)
+                desde_checkpoint += 1
+                evento.update(bytes=len(pdf_bytes), tempo_s=round(tempo, 3))
+                if desde_checkpoint >= checkpoint_every:
+                    archive.checkpoint()
+                    desde_checkpoint = 0
+            evento["feitos"] = resumo["retomados"] + resumo["gerados"] + resumo["erros"]
+            if progress is not None:
+                progress(evento)
+
+    futures_ids = {}
+    inicio = time.perf_counter()
+    # Se a execução for interrompida, o ZIP fica como está e a próxima o restaura pelo último checkpoint
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        for analise_id in ids:
+            registro = store.get(analise_id)
+            if registro is None:
+                continue
+            ja_feito = analise_id in feitos
+            linhas[analise_id] = _csv_row(registro, report_name(analise_id) if ja_feito else "")
+            if ja_feito:
+                continue
+            # Poucos relatórios em andamento por vez: a memória não cresce com o tamanho da exportação
+            future = executor.submit(_render, analise_id, registro["analise"], registro["transcricao"] or "",
+                                     registro["modelo"])
+            futures_ids[future] = analise_id
+            pendentes.add(future)
+            if len(pendentes) >= 2 * workers:
+                done, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                collect(done)
+        while pendentes:
+            done, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+            collect(done)
+
+    # Relatórios com erro ficam para a próxima execução, que retoma pelo checkpoint
+    archive.close(complete=not resumo["erros"])
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(csv_path)), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CAMPOS_CSV)
+        writer.writeheader()
+        writer.writerows(linhas[analise_id] for analise_id in ids if analise_id in linhas)
+    os.replace(tmp_path, csv_path)
+
+    resumo["duracao_s"] = round(time.perf_counter() - inicio, 2)
+    resumo["zip"] = path
+    resumo["csv"] = csv_path
+    return resumo
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta os relatórios PDF de várias análises do histórico em um ZIP")
+    parser.add_argument("saida", help="Arquivo ZIP de saída (retomado se já existir)")
+    parser.add_argument("--db", default=None, help="Banco SQLite do histórico (padrão: MONITORAI_DB ou monitorai.db)")
+    parser.add_argument("--ids", type=int, nargs="+", default=None, help="Ids das análises (em vez dos filtros)")
+    parser.add_argument("--desde", default=None, help="Data inicial (AAAA-MM-DD)")
+    parser.add_argument("--ate", default=None, help="Data final, exclusiva (AAAA-MM-DD)")
+    parser.add_argument("--risco", default=None)
+    parser.add_argument("--agente", default=None)
+    parser.add_argument("--eliminatorio", action="store_true", help="Só análises com critério eliminatório violado")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Processos gerando PDFs")
+    parser.add_argument("--checkpoint", type=int, default=CHECKPOINT_PADRAO,
+                        help="Relatórios entre dois checkpoints do ZIP")
+    parser.add_argument("--csv", default=None, help="CSV de resumo (padrão: mesmo nome do ZIP com .csv)")
+    args = parser.parse_args(argv)
+
+    store = ResultStore(args.db)
+
+    def progress(evento):
+        if "erro" in evento:
+            print(f"[{evento['feitos']}/{evento['total']}] {evento['id']}: erro ({evento['erro']})", file=sys.stderr)
+        else:
+            print(f"[{evento['feitos']}/{evento['total']}] {evento['id']}: {evento['bytes'] / 1024:.0f} KB "
+                  f"({evento['tempo_s']}s)", file=sys.stderr)
+
+    try:
+        resumo = export_reports(store, args.saida, ids=args.ids, workers=args.workers,
+                                checkpoint_every=args.checkpoint, csv_path=args.csv, progress=progress,
+                                since=args.desde, until=args.ate, risk=args.risco, agent=args.agente,
+                                eliminatory=True if args.eliminatorio else None)
+    finally:
+        store.close()
+    print(f"{resumo['gerados']} relatórios gerados, {resumo['retomados']} já estavam no arquivo, "
+          f"{resumo['erros']} erros ({resumo['bytes'] / 1e6:.1f} MB em {resumo['duracao_s']}s). "
+          f"ZIP: {resumo['zip']} · CSV: {resumo['csv']}", file=sys.stderr)
+    return 1 if resumo["erros"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,613 @@
+"""
+Servidor local que imita os endpoints da OpenAI usados pelo pipeline, para testes de carga
+sem custo e sem rede:
+
+- POST /v1/audio/transcriptions: devolve uma transcrição fixa (json ou verbose_json, com
+  segmentos: uma frase por segmento, espalhadas pela duração do áudio);
+- POST /v1/chat/completions: devolve uma resposta TOON fixa, com ou sem streaming (SSE),
+  incluindo `usage` (e o bloco final de uso com `stream_options.include_usage`);
+- POST /v1/files, GET /v1/files/{id}/content, POST /v1/batches e GET /v1/batches/{id}: a API de
+  batch (ver offline.py). Cada linha do arquivo enviado é respondida como no chat, com os mesmos
+  erros e truncamentos sorteados (erros vão para o arquivo de erros); o lote passa por
+  validating -> in_progress -> finalizing -> completed em `latency["batch"]` segundos;
+- GET /stats: contadores de requisições, erros injetados e tokens de entrada (total e em cache).
+
+Latência, jitter, ritmo do streaming e a taxa de erros 429/5xx são configuráveis, assim como a
+taxa de respostas truncadas (para exercitar o reparo em repair.py, que o servidor também atende). O cache de
+prompt do provedor também é simulado: prefixos já vistos (a partir de 1024 tokens, em blocos
+de 128) voltam como `cached_tokens` no `usage`.
+
+Uso:
+    python -m monitorai.fakeserver --porta 8765 --latencia-chat 2 --erros-429 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=teste python -m monitorai.batch ...
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+TRANSCRICAO_PADRAO = (
+    "Carglass, bom dia, meu nome é Ana, com quem eu falo? Bom dia, aqui é o Roberto. "
+    "Seu Roberto, em que posso ajudar? Eu bati o para-brisa ontem, ficou uma trinca grande do lado do motorista. "
+    "Entendi, vou abrir o seu atendimento. Pode me informar o seu CPF? É 123.456.789-00. 123.456.789-00, certo? "
+    "Isso. E a placa do veículo? ABC 1D23. A de amor, B de bola, C de casa, 1, D de dado, 2, 3, correto? Correto. "
+    "Qual o endereço para o atendimento? Rua das Flores, 120, Porto Alegre. A cidade do atendimento é Porto Alegre? "
+    "Isso. Um telefone para contato? 51 99876-5432. 5432, certo. Tem um segundo telefone? 51 3333-4444. "
+    "Você permite que a nossa empresa compartilhe o seu telefone com o prestador que irá lhe atender? Pode sim. "
+    "A trinca tem mais ou menos quantos centímetros e fica na frente do motorista? Uns vinte centímetros, bem na frente. "
+    "Perfeito. Obrigada por me aguardar! O seu atendimento foi gerado, e em breve receberá dois links no whatsapp "
+    "informado, para acompanhar o pedido e realizar a vistoria. Lembrando que o seu atendimento tem uma franquia "
+    "de 350 reais que deverá ser paga no ato do atendimento. Te ajudo com algo mais? Não, só isso. "
+    "Ao final do atendimento terá uma pesquisa de satisfação, a nota 5 é a máxima, tudo bem? Tudo bem. "
+    "Agradeço o seu contato, tenha um excelente dia!"
+)
+
+RESPOSTA_TOON_PADRAO = """status_final[3]
+satisfacao, risco, desfecho
+Satisfeito, Baixo, Atendimento de troca de para-brisa aberto com vistoria agendada
+
+checklist[12]
+item, criterio, pontos, resposta, justificativa
+1, Atendeu a ligação prontamente dentro de 5 seg. e utilizou a saudação correta com as técnicas do atendimento encantador?, 10, sim, Saudação completa com identificação da empresa e da atendente
+2, Solicitou os dados do cadastro do cliente e pediu 2 telefones para contato nome cpf placa do veículo e endereço?, 6, sim, "Solicitou nome, CPF, placa, endereço e dois telefones"
+3, O Atendente Verbalizou o script LGPD?, 2, sim, Perguntou se o telefone pode ser compartilhado com o prestador
+4, Repetiu verbalmente pelo menos duas das três informações principais para confirmar que coletou corretamente os dados?, 5, sim, "Eco do CPF, soletração da placa e eco parcial do telefone"
+5, Escutou atentamente a solicitação do segurado evitando solicitações em duplicidade?, 3, sim, Não repetiu perguntas
+6, Compreendeu a solicitação do cliente em linha e demonstrou que entende sobre os serviços da empresa?, 5, sim, Identificou rapidamente o serviço de para-brisa
+7, Confirmou as informações completas sobre o dano no veículo?, 10, sim, Perguntou tamanho e posição da trinca
+8, Confirmou cidade para o atendimento?, 10, sim, Confirmou Porto Alegre
+9, A comunicação com o cliente foi eficaz sem uso de gírias linguagem inadequada ou conversas paralelas?, 5, sim, Linguagem adequada
+10, A conduta do analista foi acolhedora com sorriso na voz empatia e desejo verdadeiro em entender e solucionar a solicitação do cliente?, 4, sim, Tom cordial
+11, Realizou o script de encerramento completo informando prazo de validade franquia link de acompanhamento e vistoria?, 15, sim, "Informou links, vistoria e franquia"
+12, Orientou o cliente sobre a pesquisa de satisfação do atendimento?, 6, sim, Orientou sobre a pesquisa e a nota máxima
+
+criterios_eliminatorios[7]
+criterio, ocorreu, justificativa
+Ofereceu/garantiu algum serviço que o cliente não tinha direito?, false, Não ocorreu
+Preencheu ou selecionou o Veículo/peça incorretos?, false, Não ocorreu
+Agiu de forma rude grosseira não deixando o cliente falar e/ou se alterou na ligação?, false, Não ocorreu
+Encerrou a chamada ou transferiu o cliente sem o seu conhecimento?, false, Não ocorreu
+Falou negativamente sobre a Carglass afiliados seguradoras ou colegas de trabalho?, false, Não ocorreu
+Forneceu informações incorretas ou fez suposições infundadas sobre garantias serviços ou procedimentos?, false, Não ocorreu
+Comentou sobre serviços de terceiros ou orientou o cliente para serviços externos sem autorização?, false, Não ocorreu
+
+uso_script[2]
+status, justificativa
+completo, "Validade, franquia, links, pesquisa e despedida presentes"
+
+pontuacao_total
+81
+
+resumo_geral
+Atendimento completo e cordial. A atendente coletou todos os dados, confirmou as informações principais com eco e encerrou com o script padrão."""
+
+_RESPONSE_FORMAT_RE = re.compile(rb'name="response_format"\r\n\r\n([a-z_]+)')
+# Avisos da pré-triagem depois da rubrica (ver prompts._prescreen_notice)
+_ITENS_OMITIDOS_RE = re.compile(r"Os itens ([\d, ]+) do checklist já foram avaliados automaticamente")
+_SEM_USO_SCRIPT = "não inclua a seção uso_script"
+# Prompt de janela (ver prompts.build_window_prompt): responde só os itens pedidos
+_ROTULO_JANELA = "TRECHO DA LIGAÇÃO:"
+_FRASE_RE = re.compile(r"(?<=[.?!])\s+")
+_FILENAME_RE = re.compile(rb'filename="([^"]*)"')
+# Cache de prompt simulado: prefixo mínimo e granularidade (em tokens, como na API)
+CACHE_PROMPT_MINIMO = 1024
+CACHE_PROMPT_BLOCO = 128
+CARACTERES_POR_TOKEN = 4
+# Transcrições de um prompt agrupado (ver prompts.build_packed_prompt)
+_TRANSCRICAO_ID_RE = re.compile(r"^TRANSCRIÇÃO \[(.+)\]:$", re.MULTILINE)
+
+
+# Pedido de reparo (ver repair.repair_prompt) e cabeçalhos das seções pedidas nele
+_PEDIDO_REPARO = "A resposta anterior veio incompleta"
+_SECAO_RE = re.compile(r"^(status_final|checklist|criterios_eliminatorios|uso_script)\[\d+\]$|^(pontuacao_total|resumo_geral)$",
+                       re.MULTILINE)
+
+
+def _repair_response(text, request):
+    """
+    Responde a um pedido de reparo só com as seções (e itens do checklist) pedidas
+    """
+    blocos = {bloco.split("\n", 1)[0].split("[", 1)[0]: bloco for bloco in text.split("\n\n")}
+    partes = []
+    for match in _SECAO_RE.finditer(request):
+        secao = match.group(1) or match.group(2)
+        if secao == "checklist":
+            pedidos = set(re.findall(r"^(\d+), .*\[sim/não\]", request, re.MULTILINE))
+            linhas = [linha for linha in blocos[secao].split("\n")[2:] if linha.split(",", 1)[0] in pedidos]
+            partes.append("\n".join([f"checklist[{len(linhas)}]", blocos[secao].split("\n")[1], *linhas]))
+        elif secao in blocos:
+            partes.append(blocos[secao])
+    return "\n\n".join(partes)
+
+
+def _is_repair(messages):
+    return bool(messages) and (messages[-1].get("content") or "").startswith(_PEDIDO_REPARO)
+
+
+def _follow_prompt(text, messages):
+    """
+    Remove da resposta fixa os itens e a seção que o prompt reduzido pediu para omitir,
+    para que o tamanho da resposta acompanhe o prompt como no modelo real. Em prompts
+    agrupados, repete a resposta uma vez por transcrição, precedida de `registro[id]`;
+    em pedidos de reparo, devolve só as seções pedidas
+    """
+    prompt = " ".join(m.get("content") or "" for m in messages)
+    omitidos = _ITENS_OMITIDOS_RE.search(prompt)
+    if omitidos:
+        itens = {item.strip() for item in omitidos.group(1).split(",")}
+        linhas, removidos = [], 0
+        for line in text.split("\n"):
+            campos = [campo.strip() for campo in line.split(",")]
+            if line[:1].isdigit() and campos[0] in itens:
+                # Como o modelo real, a pontuação passa a somar só os itens avaliados
+                removidos += int(campos[2]) if campos[3] == "sim" else 0
+            else:
+                linhas.append(line)
+        text = re.sub(r"(pontuacao_total\n)(\d+)", lambda m: f"{m.group(1)}{int(m.group(2)) - removidos}",
+                      "\n".join(linhas))
+    if _SEM_USO_SCRIPT in prompt:
+        text = re.sub(r"uso_script\[2\]\n.*\n.*\n\n", "", text)
+    if _is_repair(messages):
+        return _repair_response(text, messages[-1]["content"])
+    if _ROTULO_JANELA in prompt:
+        return _repair_response(text, prompt)
+    ids = _TRANSCRICAO_ID_RE.findall(prompt)
+    if ids:
+        text = "\n\n".join(f"registro[{call_id}]\n{text}" for call_id in ids)
+    return text
+
+
+class FakeOpenAIServer:
+    """
+    Servidor HTTP em segundo plano com respostas fixas e comportamento configurável.
+
+    Latências em segundos: cada resposta espera `latency[endpoint]` mais um valor uniforme
+    em [0, `jitter`]. No chat, a resposta é enviada em pedaços de `chunk_chars` caracteres
+    a cada `chunk_interval` segundos (também somados à espera sem streaming).
+    `rate_429`/`rate_5xx` são as probabilidades de cada requisição falhar e `rate_truncated`
+    a de a resposta do chat ser cortada (linhas finais faltando).
+    Com `prompt_cache`, simula o cache de prefixo do prompt do provedor
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, transcript=TRANSCRICAO_PADRAO,
+                 responses=(RESPOSTA_TOON_PADRAO,), latency=None, jitter=0.0, chunk_chars=24,
+                 chunk_interval=0.0, rate_429=0.0, rate_5xx=0.0, retry_after=1.0, audio_seconds=180.0, seed=None,
+                 prompt_cache=True, rate_truncated=0.0, answer_delay=1.5):
+        self.host = host
+        self.port = port
+        self.transcript = transcript
+        self.responses = list(responses)
+        self.latency = {"transcricao": 0.0, "chat": 0.0, "batch": 0.0, **(latency or {})}
+        self.jitter = jitter
+        self.chunk_chars = chunk_chars
+        self.chunk_interval = chunk_interval
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.rate_truncated = rate_truncated
+        self.retry_after = retry_after
+        self.audio_seconds = audio_seconds
+        self.answer_delay = answer_delay
+        self.prompt_cache = prompt_cache
+        self.stats = {"transcricao": 0, "chat": 0, "chat_stream": 0, "erros_429": 0, "erros_5xx": 0,
+                      "truncadas": 0, "tokens_entrada": 0, "tokens_cache": 0, "arquivos": 0, "lotes": 0,
+                      "lote_linhas": 0}
+        self._prefixes = set()
+        self._files = {}
+        self._batches = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    def start(self):
+        from http.server import ThreadingHTTPServer
+
+        self._server = ThreadingHTTPServer((self.host, self.port), _make_handler(self))
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _cached_tokens(self, messages):
+        """
+        Tokens do maior prefixo do prompt já enviado antes (0 se menor que CACHE_PROMPT_MINIMO).
+        Registra os prefixos deste prompt para as próximas requisições
+        """
+        if not self.prompt_cache:
+            return 0
+        prompt = "".join(m.get("content") or "" for m in messages)
+        bloco = CACHE_PROMPT_BLOCO * CARACTERES_POR_TOKEN
+        limites = range(CACHE_PROMPT_MINIMO * CARACTERES_POR_TOKEN, len(prompt) + 1, bloco)
+        chaves = [hash(prompt[:limite]) for limite in limites]
+        with self._lock:
+            cached = 0
+            for limite, chave in zip(limites, chaves):
+                if chave not in self._prefixes:
+                    break
+                cached = limite // CARACTERES_POR_TOKEN
+            self._prefixes.update(chaves)
+        return cached
+
+    def _random(self):
+        with self._lock:
+            return self._rng.random()
+
+    def _delay(self, endpoint):
+        return self.latency.get(endpoint, 0.0) + (self._random() * self.jitter if self.jitter else 0.0)
+
+    def _injected_error(self):
+        """
+        Retorna (status, tipo) do erro sorteado para a requisição ou None
+        """
+        sorteio = self._random()
+        if sorteio < self.rate_429:
+            self._count("erros_429")
+            return 429, "rate_limit_exceeded"
+        if sorteio < self.rate_429 + self.rate_5xx:
+            self._count("erros_5xx")
+            return (500 if sorteio < self.rate_429 + self.rate_5xx / 2 else 503), "server_error"
+        return None
+
+    def _response_text(self):
+        with self._lock:
+            return self.responses[self._rng.randrange(len(self.responses))]
+
+    def _answer(self, messages):
+        """
+        Texto e `usage` da resposta do chat às mensagens (com o truncamento sorteado)
+        """
+        text = _follow_prompt(self._response_text(), messages)
+        if self.rate_truncated and not _is_repair(messages) and self._random() < self.rate_truncated:
+            # Corta a resposta no meio do checklist, como uma geração interrompida
+            self._count("truncadas")
+            text = text[:text.index("checklist[") + len(text) // 4]
+        usage = _usage(messages, text, self._cached_tokens(messages))
+        self._count("tokens_entrada", usage["prompt_tokens"])
+        self._count("tokens_cache", usage["prompt_tokens_details"]["cached_tokens"])
+        return text, usage
+
+    def _store_file(self, filename, data, purpose):
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        entry = {"id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                 "filename": filename, "purpose": purpose, "status": "processed"}
+        with self._lock:
+            self._files[file_id] = (entry, data)
+        self._count("arquivos")
+        return entry
+
+    def _create_batch(self, request):
+        agora = int(time.time())
+        batch = {
+            "id": f"batch_{uuid.uuid4().hex[:24]}", "object": "batch", "endpoint": request.get("endpoint"),
+            "errors": None, "input_file_id": request.get("input_file_id"),
+            "completion_window": request.get("completion_window", "24h"), "status": "validating",
+            "output_file_id": None, "error_file_id": None, "created_at": agora, "in_progress_at": None,
+            "expires_at": agora + 24 * 3600, "finalizing_at": None, "completed_at": None, "failed_at": None,
+            "expired_at": None, "cancelling_at": None, "cancelled_at": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0}, "metadata": request.get("metadata"),
+        }
+        with self._lock:
+            self._batches[batch["id"]] = batch
+        self._count("lotes")
+        threading.Thread(target=self._process_batch, args=(batch,), daemon=True).start()
+        return batch
+
+    def _process_batch(self, batch):
+        """
+        Responde as linhas do arquivo do lote e grava os arquivos de resultado e de erros
+        """
+        inicio = time.monotonic()
+        with self._lock:
+            arquivo = self._files.get(batch["input_file_id"])
+        if arquivo is None:
+            with self._lock:
+                batch.update(status="failed", failed_at=int(time.time()), errors={"object": "list", "data": [
+                    {"code": "invalid_file", "message": f"Arquivo {batch['input_file_id']} não encontrado",
+                     "param": "input_file_id", "line": None}]})
+            return
+        linhas = [json.loads(linha) for linha in arquivo[1].decode("utf-8").splitlines() if linha.strip()]
+        with self._lock:
+            batch.update(status="in_progress", in_progress_at=int(time.time()))
+            batch["request_counts"]["total"] = len(linhas)
+
+        saida, erros = [], []
+        for pedido in linhas:
+            body = pedido.get("body") or {}
+            resultado = {"id": f"batch_req_{uuid.uuid4().hex[:24]}", "custom_id": pedido.get("custom_id"),
+                         "error": None}
+            erro = self._injected_error()
+            if erro:
+                status, tipo = erro
+                resultado["response"] = {"status_code": status, "request_id": uuid.uuid4().hex, "body": {
+                    "error": {"message": f"Erro simulado ({status})", "type": tipo, "param": None, "code": tipo}}}
+                erros.append(resultado)
+            else:
+                text, usage = self._answer(body.get("messages") or [])
+                resultado["response"] = {"status_code": 200, "request_id": uuid.uuid4().hex,
+                                         "body": _completion(body.get("model", "gpt-4o"), text, usage)}
+                saida.append(resultado)
+            self._count("lote_linhas")
+            with self._lock:
+                batch["request_counts"]["failed" if erro else "completed"] += 1
+
+        time.sleep(max(0.0, self.latency["batch"] - (time.monotonic() - inicio)))
+        with self._lock:
+            batch.update(status="finalizing", finalizing_at=int(time.time()))
+        ids = {}
+        for nome, linhas_saida in (("output_file_id", saida), ("error_file_id", erros)):
+            if linhas_saida:
+                conteudo = "".join(json.dumps(linha, ensure_ascii=False) + "\n" for linha in linhas_saida)
+                ids[nome] = self._store_file(f"{batch['id']}_{nome[:-8]}.jsonl", conteudo.encode("utf-8"),
+                                             "batch_output")["id"]
+        with self._lock:
+            batch.update(status="completed", completed_at=int(time.time()), **ids)
+
+
+def _segments(transcript, audio_seconds, answer_delay):
+    """
+    Segmentos do verbose_json: uma frase por segmento, com a duração proporcional ao tamanho,
+    da primeira fala (`answer_delay`) até o fim do áudio
+    """
+    frases = [frase for frase in _FRASE_RE.split(transcript) if frase]
+    escala = (audio_seconds - answer_delay) / max(1, sum(len(frase) for frase in frases))
+    segmentos, inicio = [], answer_delay
+    for index, frase in enumerate(frases):
+        fim = inicio + len(frase) * escala
+        segmentos.append({"id": index, "seek": 0, "start": round(inicio, 2), "end": round(fim, 2), "text": " " + frase})
+        inicio = fim
+    return segmentos
+
+
+def _multipart_file(body, content_type):
+    """
+    (nome, conteúdo) do campo `file` de um corpo multipart/form-data
+    """
+    boundary = content_type.split("boundary=", 1)[1].strip('"').encode("ascii")
+    for part in body.split(b"--" + boundary):
+        cabecalho, _, conteudo = part.partition(b"\r\n\r\n")
+        if b'name="file"' in cabecalho:
+            nome = _FILENAME_RE.search(cabecalho)
+            return (nome.group(1).decode("utf-8") if nome else "arquivo"), conteudo.removesuffix(b"\r\n")
+    return None, None
+
+
+def _completion(model, text, usage):
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}", "object": "chat.completion", "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": usage,
+    }
+
+
+def _usage(messages, completion, cached_tokens=0):
+    prompt_chars = sum(len(m.get("content") or "") for m in messages)
+    prompt_tokens = max(1, prompt_chars // CARACTERES_POR_TOKEN)
+    completion_tokens = max(1, len(completion) // CARACTERES_POR_TOKEN)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens},
+    }
+
+
+def _make_handler(server):
+    from http.server import BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_error(self, status, tipo):
+            headers = {"Retry-After": str(server.retry_after)} if status == 429 else None
+            self._send_json(status, {"error": {"message": f"Erro simulado ({status})", "type": tipo,
+                                               "param": None, "code": tipo}}, headers)
+
+        def _read_body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length) if length else b""
+
+        def _not_found(self):
+            self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0].rstrip("/")
+            partes = path.split("/")
+            if path == "/stats":
+                with server._lock:
+                    self._send_json(200, dict(server.stats))
+            elif path.startswith("/v1/files/") and path.endswith("/content"):
+                with server._lock:
+                    arquivo = server._files.get(partes[-2])
+                if arquivo is None:
+                    self._not_found()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(arquivo[1])))
+                self.end_headers()
+                self.wfile.write(arquivo[1])
+            elif path.startswith("/v1/batches/"):
+                with server._lock:
+                    batch = server._batches.get(partes[-1])
+                    batch = json.loads(json.dumps(batch)) if batch is not None else None
+                if batch is None:
+                    self._not_found()
+                else:
+                    self._send_json(200, batch)
+            else:
+                self._not_found()
+
+        def do_POST(self):
+            body = self._read_body()
+            path = self.path.split("?", 1)[0].rstrip("/")
+            if path.endswith("/audio/transcriptions"):
+                self._transcription(body)
+            elif path.endswith("/chat/completions"):
+                self._chat(json.loads(body or b"{}"))
+            elif path.endswith("/v1/files"):
+                nome, conteudo = _multipart_file(body, self.headers.get("Content-Type", ""))
+                if conteudo is None:
+                    self._send_json(400, {"error": {"message": "Campo file ausente", "type": "invalid_request_error"}})
+                    return
+                proposito = re.search(rb'name="purpose"\r\n\r\n([a-z_-]+)', body)
+                self._send_json(200, server._store_file(nome, conteudo,
+                                                        proposito.group(1).decode() if proposito else "batch"))
+            elif path.endswith("/v1/batches"):
+                self._send_json(200, server._create_batch(json.loads(body or b"{}")))
+            else:
+                self._not_found()
+
+        def _transcription(self, body):
+            server._count("transcricao")
+            time.sleep(server._delay("transcricao"))
+            erro = server._injected_error()
+            if erro:
+                self._send_error(*erro)
+                return
+            formato = _RESPONSE_FORMAT_RE.search(body)
+            payload = {"text": server.transcript}
+            if formato and formato.group(1) == b"verbose_json":
+                payload.update({"task": "transcribe", "language": "portuguese",
+                                "duration": server.audio_seconds,
+                                "segments": _segments(server.transcript, server.audio_seconds, server.answer_delay)})
+            self._send_json(200, payload)
+
+        def _chat(self, request):
+            stream = bool(request.get("stream"))
+            server._count("chat_stream" if stream else "chat")
+            time.sleep(server._delay("chat"))
+            erro = server._injected_error()
+            if erro:
+                self._send_error(*erro)
+                return
+
+            model = request.get("model", "gpt-4o")
+            text, usage = server._answer(request.get("messages") or [])
+            pieces = [text[i:i + server.chunk_chars] for i in range(0, len(text), server.chunk_chars)]
+
+            if not stream:
+                time.sleep(server.chunk_interval * len(pieces))
+                self._send_json(200, _completion(model, text, usage))
+                return
+
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+            created = int(time.time())
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def send_event(payload):
+                data = f"data: {payload}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def chunk(delta, finish_reason=None):
+                return json.dumps({
+                    "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }, ensure_ascii=False)
+
+            include_usage = (request.get("stream_options") or {}).get("include_usage")
+            try:
+                send_event(chunk({"role": "assistant", "content": ""}))
+                for piece in pieces:
+                    if server.chunk_interval:
+                        time.sleep(server.chunk_interval)
+                    send_event(chunk({"content": piece}))
+                send_event(chunk({}, "stop"))
+                if include_usage:
+                    send_event(json.dumps({
+                        "id": completion_id, "object": "chat.completion.chunk", "created": created,
+                        "model": model, "choices": [], "usage": usage,
+                    }))
+                send_event("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m monitorai.fakeserver",
+        description="Servidor local que imita a API da OpenAI (transcrição, chat e batch) para testes de carga."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--latencia-transcricao", type=float, default=1.0, help="Espera da transcrição (s)")
+    parser.add_argument("--latencia-chat", type=float, default=1.0, help="Espera até o primeiro token do chat (s)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Acréscimo aleatório máximo em cada espera (s)")
+    parser.add_argument("--intervalo-trechos", type=float, default=0.01,
+                        help="Intervalo entre os pedaços da resposta do chat (s)")
+    parser.add_argument("--erros-429", type=float, default=0.0, help="Probabilidade de responder 429")
+    parser.add_argument("--erros-5xx", type=float, default=0.0, help="Probabilidade de responder 500/503")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Valor do cabeçalho Retry-After nos 429")
+    parser.add_argument("--sem-cache-prompt", action="store_true", help="Não simula o cache de prefixo do prompt")
+    parser.add_argument("--truncadas", type=float, default=0.0, help="Probabilidade de cortar a resposta do chat")
+    parser.add_argument("--duracao-audio", type=float, default=180.0, help="Duração informada para todo áudio (s)")
+    parser.add_argument("--primeira-fala", type=float, default=1.5,
+                        help="Instante da primeira fala nos segmentos da transcrição (s)")
+    parser.add_argument("--latencia-batch", type=float, default=10.0,
+                        help="Tempo até um lote da API de batch ficar pronto (s)")
+    args = parser.parse_args(argv)
+
+    server = FakeOpenAIServer(
+        host=args.host, port=args.porta,
+        latency={"transcricao": args.latencia_transcricao, "chat": args.latencia_chat,
+                 "batch": args.latencia_batch},
+        jitter=args.jitter, chunk_interval=args.intervalo_trechos,
+        rate_429=args.erros_429, rate_5xx=args.erros_5xx, retry_after=args.retry_after,
+        prompt_cache=not args.sem_cache_prompt, rate_truncated=args.truncadas,
+        audio_seconds=args.duracao_audio, answer_delay=args.primeira_fala,
+    ).start()
+    print(f"Servidor simulado em {server.base_url} (Ctrl+C para encerrar)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Fila local de análises para a interface: cada análise vira um job executado em um pool
+limitado de processos, em vez de ocupar a thread da sessão do Streamlit durante o Whisper
+e o GPT.
+
+- a concorrência é controlada em um só lugar (`workers` processos por instância);
+- a fila tem profundidade máxima e limite de jobs pendentes por usuário (`QueueFull`);
+- os jobs pendentes são despachados em rodízio entre os usuários, então quem enviou várias
+  ligações não passa na frente de quem enviou uma; `status` informa a posição na fila.
+
+A interface envia o job e consulta `status(job_id)` periodicamente até o resultado ficar pronto.
+Enquanto o job roda, o processo do pool manda cada seção da análise, assim que o streaming a
+conclui, para uma fila do job (`multiprocessing.Manager().Queue()`); cada consulta esvazia essa
+fila em `status(...)["parcial"]`, e a página mostra as seções já prontas.
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .toon import EVENTO_REINICIO
+
+WORKERS_PADRAO = int(os.environ.get("MONITORAI_WORKERS", "2"))
+FILA_MAXIMA_PADRAO = int(os.environ.get("MONITORAI_FILA_MAXIMA", "20"))
+FILA_POR_USUARIO_PADRAO = int(os.environ.get("MONITORAI_FILA_POR_USUARIO", "3"))
+
+# Jobs concluídos ficam disponíveis para consulta por este tempo (s)
+RETENCAO_S = 3600
+
+NA_FILA = "na_fila"
+EXECUTANDO = "executando"
+CONCLUIDO = "concluido"
+ERRO = "erro"
+
+
+class QueueFull(RuntimeError):
+    """
+    A fila (ou a cota de jobs pendentes do usuário) está cheia
+    """
+
+
+class Job:
+    """
+    Uma análise enviada à fila: pedido, dono, situação e resultado
+    """
+
+    def __init__(self, user, request, meta=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.user = user
+        self.request = request
+        self.meta = meta or {}
+        self.status = NA_FILA
+        self.criado = time.time()
+        self.iniciado = None
+        self.concluido = None
+        self.result = None
+        self.error = None
+        # Eventos (secao, valor) da análise em andamento, recebidos do processo do pool
+        self.events = None
+        self.partial = []
+
+
+_worker_caches = None
+_worker_clients = {}
+
+
+def run_job(request, events=None):
+    """
+    Executado no processo do pool: transcrição e análise (com pré-triagem e reparo); o PDF é
+    gerado depois, em segundo plano (ver `report.write_report`). `request` tem audio_path, model,
+    api_key, base_url, preprocess, call_id e, opcionalmente, tempo_upload, cascata (lista de
+    modelos, ver cascade.py) e janelas (ver windows.py). Retorna transcrição e segmentos,
+    resposta TOON, análise, o modelo que a produziu e o `AnalysisTrace`. Com `events` (fila do
+    job), a análise é feita em streaming e cada evento (secao, valor) vai para a fila (com
+    janelas, só quando elas não são usadas; senão as seções vão juntas no fim)
+    """
+    global _worker_caches
+    from .cache import AnalysisCache, TranscriptCache
+    from .metrics import AnalysisTrace
+    from .pipeline import make_client, run_analysis, transcribe_audio
+
+    if _worker_caches is None:
+        # Caches em disco compartilhados com os outros processos; criados uma vez por processo
+        _worker_caches = TranscriptCache(), AnalysisCache()
+    transcript_cache, analysis_cache = _worker_caches
+
+    # Um cliente (e seu pool de conexões HTTP) por processo, reaproveitado entre os jobs
+    client_key = (request.get("api_key"), request.get("base_url"))
+    if client_key not in _worker_clients:
+        _worker_clients[client_key] = make_client(*client_key)
+    client = _worker_clients[client_key]
+    trace = AnalysisTrace(request.get("call_id"))
+    if request.get("tempo_upload"):
+        trace.add_time("upload", request["tempo_upload"])
+    transcript_text, segments = transcribe_audio(client, request["audio_path"], cache=transcript_cache, trace=trace,
+                                                 preprocess=request.get("preprocess", False), with_segments=True)
+    on_event = (lambda *event: events.put(event)) if events is not None else None
+    if request.get("janelas"):
+        from .windows import run_windowed_analysis
+
+        model = request["model"]
+        result, analysis = run_windowed_analysis(client, transcript_text, segments, model, cache=analysis_cache,
+                                                 trace=trace, on_event=on_event)
+    elif request.get("cascata"):
+        from .cascade import Cascade
+
+        result, analysis, model = Cascade(request["cascata"]).run(client, transcript_text, cache=analysis_cache,
+                                                                  trace=trace, on_event=on_event)
+    else:
+        model = request["model"]
+        result, analysis = run_analysis(client, transcript_text, model, cache=analysis_cache, trace=trace,
+                                        on_event=on_event)
+    return {"transcricao": transcript_text, "segmentos": segments, "resposta_toon": result, "analise": analysis, "modelo": model,
+            "trace": trace}
+
+
+def completion_hook(store, reports):
+    """
+    `on_done` da fila usado pela interface: registra tempos, tokens e custo do job concluído,
+    guarda a análise no histórico `store` (mesmo que a sessão já tenha sido fechada) e envia o
+    PDF ao executor `reports` (ver `report.write_report`). O resultado fica disponível na hora;
+    o PDF chega depois em `job.meta["pdf"]`, e falhas em `job.meta["erro_historico"]`/`["erro_pdf"]`
+    """
+    from .metrics import REGISTRY, record_trace
+    from .report import write_report
+
+    def report_done(job, future):
+        try:
+            info = future.result()
+        except Exception as e:
+            job.meta["erro_pdf"] = f"{type(e).__name__}: {e}"
+            return
+        REGISTRY.observe_report(info["tempo_s"], info["bytes"])
+        job.meta["pdf"] = info
+
+    def on_done(job):
+        if job.error is not None:
+            return
+        output = job.result
+        trace = output["trace"]
+        trace.extras["fila_s"] = round(job.iniciado - job.criado, 3)
+        record_trace(trace)
+        output["metricas"] = trace.to_dict()
+        try:
+            job.meta["analise_id"] = store.save(
+                output["analise"], output["transcricao"], output["resposta_toon"], call_id=job.meta["arquivo"],
+                arquivo=job.meta["arquivo"], model=output["modelo"], metrics=output["metricas"],
+                agent=job.meta.get("agente"))
+        except Exception as store_error:
+            job.meta["erro_historico"] = str(store_error)
+        chave = job.meta.get("analise_id") or f"job-{job.id}"
+        try:
+            future = reports.submit(write_report, chave, output["analise"], output["transcricao"], output["modelo"])
+        except Exception as e:
+            job.meta["erro_pdf"] = f"{type(e).__name__}: {e}"
+            return
+        future.add_done_callback(lambda f: report_done(job, f))
+
+    return on_done
+
+
+def _next_user(turn, active):
+    """
+    Próximo usuário a ter um job despachado: o com menos jobs em execução e, no empate,
+    o que está há mais tempo na vez
+    """
+    return min(turn, key=lambda user: active[user])
+
+
+class JobQueue:
+    """
+    Fila com despacho em rodízio por usuário sobre um pool de `workers` processos.
+
+    O pool nunca recebe mais jobs do que tem processos: os pendentes ficam aqui, e a cada
+    vaga o usuário da vez com menos jobs em execução tem seu job mais antigo enviado. `on_done(job)` é chamado
+    (em uma thread do pool) quando um job termina, com sucesso ou erro (`job.error`).
+    Com `stream_events`, `target(request, fila)` recebe a fila de eventos do job (ver `run_job`)
+    """
+
+    def __init__(self, workers=WORKERS_PADRAO, max_depth=FILA_MAXIMA_PADRAO, max_per_user=FILA_POR_USUARIO_PADRAO,
+                 on_done=None, executor=None, target=run_job, stream_events=True):
+        self.workers = workers
+        self.max_depth = max_depth
+        self.max_per_user = max_per_user
+        self.on_done = on_done
+        self.target = target
+        # "spawn": o processo do Streamlit tem várias threads, e fork com threads não é seguro
+        self._executor = executor or ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        self._lock = threading.RLock()
+        self._jobs = {}
+        self._pending = {}
+        self._turn = deque()
+        self._active = Counter()
+        self._running = 0
+        self.stream_events = stream_events
+        # Processo que guarda as filas de eventos dos jobs, iniciado no primeiro job
+        self._manager = None
+
+    def submit(self, user, request, meta=None):
+        """
+        Enfileira um pedido para `user`. Retorna o id do job; levanta `QueueFull` se a fila
+        ou a cota do usuário estiver cheia
+        """
+        with self._lock:
+            self._purge()
+            na_fila = sum(len(jobs) for jobs in self._pending.values())
+            if na_fila >= self.max_depth:
+                raise QueueFull(f"A fila de análises está cheia ({na_fila} aguardando). Tente novamente em instantes.")
+            if len(self._pending.get(user, ())) >= self.max_per_user:
+                raise QueueFull(f"Você já tem {self.max_per_user} análises aguardando na fila.")
+            job = Job(user, request, meta)
+            self._jobs[job.id] = job
+            if user not in self._pending:
+                self._pending[user] = deque()
+                self._turn.append(user)
+            self._pending[user].append(job)
+        self._dispatch()
+        return job.id
+
+    def _dispatch(self):
+        with self._lock:
+            while self._running < self.workers and self._turn:
+                user = _next_user(self._turn, self._active)
+                self._turn.remove(user)
+                job = self._pending[user].popleft()
+                if self._pending[user]:
+                    self._turn.append(user)
+                else:
+                    del self._pending[user]
+                job.status = EXECUTANDO
+                job.iniciado = time.time()
+                self._running += 1
+                self._active[user] += 1
+                try:
+                    if self.stream_events:
+                        job.events = self._event_queue()
+                        future = self._executor.submit(self.target, job.request, job.events)
+                    else:
+                        future = self._executor.submit(self.target, job.request)
+                except Exception as e:
+                    # Pool quebrado (ex.: processo morto pelo sistema): o job falha, a fila segue
+                    job.error = f"{type(e).__name__}: {e}"
+                    job.status = ERRO
+                    job.concluido = time.time()
+                    self._running -= 1
+                    self._active[user] -= 1
+                    continue
+                future.add_done_callback(lambda f, job=job: self._finished(job, f))
+
+    def _event_queue(self):
+        if self._manager is None:
+            self._manager = multiprocessing.get_context("spawn").Manager()
+        return self._manager.Queue()
+
+    def _drain(self, job):
+        """
+        Move para `job.partial` os eventos que o processo do pool já mandou. EVENTO_REINICIO
+        descarta as seções anteriores (a cascata passou para outro modelo)
+        """
+        if job.events is None:
+            return
+        while True:
+            try:
+                event = job.events.get_nowait()
+            except queue.Empty:
+                return
+            if event[0] == EVENTO_REINICIO:
+                job.partial = []
+            else:
+                job.partial.append(event)
+
+    def _finished(self, job, future):
+        try:
+            job.result = future.result()
+            status = CONCLUIDO
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            status = ERRO
+        job.concluido = time.time()
+        # on_done roda antes de o job aparecer como concluído, então o que ele acrescentar
+        # ao resultado (ex.: métricas) já está lá quando a interface o encontrar pronto
+        if self.on_done is not None:
+            try:
+                self.on_done(job)
+            except Exception:
+                pass
+        with self._lock:
+            job.status = status
+            self._running -= 1
+            self._active[job.user] -= 1
+            # O resultado completo substitui os eventos parciais
+            job.events = None
+            job.partial = []
+        self._dispatch()
+
+    def _order(self):
+        """
+        Ordem em que os jobs pendentes serão despachados, simulando `_dispatch`
+        """
+        filas = {user: deque(self._pending[user]) for user in self._turn}
+        turn, ativos, ordem = deque(self._turn), Counter(self._active), []
+        while turn:
+            user = _next_user(turn, ativos)
+            turn.remove(user)
+            ordem.append(filas[user].popleft())
+            ativos[user] += 1
+            if filas[user]:
+                turn.append(user)
+        return ordem
+
+    def status(self, job_id):
+        """
+        Situação do job: dicionário com status, posição na fila (1 = próximo), tamanho da fila,
+        tempos e, quando pronto, `result`/`error`. None se o job não existe (ou expirou)
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            ordem = self._order() if job.status == NA_FILA else []
+            if job.status == EXECUTANDO:
+                self._drain(job)
+            return {
+                "id": job.id,
+                "status": job.status,
+                "posicao": ordem.index(job) + 1 if job in ordem else None,
+                "na_fila": sum(len(jobs) for jobs in self._pending.values()),
+                "executando": self._running,
+                "espera_s": (job.iniciado or time.time()) - job.criado,
+                "execucao_s": (job.concluido or time.time()) - job.iniciado if job.iniciado else None,
+                "meta": job.meta,
+                "parcial": list(job.partial),
+                "result": job.result,
+                "error": job.error,
+            }
+
+    def _purge(self):
+        limite = time.time() - RETENCAO_S
+        for job_id in [job.id for job in self._jobs.values() if job.concluido and job.concluido < limite]:
+            del self._jobs[job_id]
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+        if self._manager is not None:
+            self._manager.shutdown()
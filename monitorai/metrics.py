@@ -0,0 +1,268 @@
+"""
+Instrumentação do pipeline: tempo por etapa, tokens, duração do áudio e custo estimado
+de cada análise, com exportação em JSONL e no formato texto do Prometheus.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+METRICS_FILE = os.environ.get("MONITORAI_METRICS_FILE", "monitorai_metricas.jsonl")
+
+# Preços em US$ (por 1M de tokens; Whisper por minuto de áudio). Atualize conforme a tabela da OpenAI
+PRECOS = {
+    "gpt-4o": {"entrada": 2.50, "entrada_cache": 1.25, "saida": 10.00},
+    "gpt-4o-mini": {"entrada": 0.15, "entrada_cache": 0.075, "saida": 0.60},
+    "whisper-1": {"minuto": 0.006},
+}
+
+# A API de batch do provedor cobra os tokens do chat com este desconto (ver offline.py)
+DESCONTO_BATCH = 0.5
+
+# Ordem de exibição das etapas
+ETAPAS = ("upload", "preprocessamento", "whisper", "pretriagem", "chat", "janelas", "batch", "parse", "reparo", "pdf")
+
+# Limites (em segundos) dos buckets do histograma de latência por etapa
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+
+def estimate_cost(model, prompt_tokens=0, completion_tokens=0, cached_tokens=0, audio_seconds=0):
+    """
+    Custo estimado em US$ para o uso informado (0 para modelos sem preço cadastrado)
+    """
+    precos = PRECOS.get(model)
+    if not precos:
+        return 0.0
+    if "minuto" in precos:
+        return audio_seconds / 60 * precos["minuto"]
+    entrada = (prompt_tokens - cached_tokens) * precos["entrada"]
+    entrada += cached_tokens * precos.get("entrada_cache", precos["entrada"])
+    return (entrada + completion_tokens * precos["saida"]) / 1_000_000
+
+
+def estimate_cache_savings(model, cached_tokens):
+    """
+    Quanto (US$) os tokens de entrada atendidos pelo cache de prompt do provedor economizaram
+    """
+    precos = PRECOS.get(model)
+    if not precos or "entrada_cache" not in precos:
+        return 0.0
+    return cached_tokens * (precos["entrada"] - precos["entrada_cache"]) / 1_000_000
+
+
+class AnalysisTrace:
+    """
+    Registro de uma análise: tempo de cada etapa, uso de tokens por modelo, duração do áudio
+    e quais etapas vieram do cache. Com `api_batch`, os tokens do chat saem com DESCONTO_BATCH
+    """
+
+    def __init__(self, call_id=None):
+        self.call_id = call_id
+        self.inicio = datetime.now()
+        self.etapas = {}
+        self.uso = {}
+        self.audio_segundos = None
+        self.modelo_whisper = None
+        self.cache = {}
+        self.extras = {}
+        self.api_batch = False
+
+    @contextmanager
+    def stage(self, name):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - inicio)
+
+    def add_time(self, name, seconds):
+        self.etapas[name] = self.etapas.get(name, 0.0) + seconds
+
+    def record_usage(self, model, usage):
+        """
+        Acumula o `usage` de uma resposta do chat (objeto da OpenAI ou dicionário)
+        """
+        if usage is None:
+            return
+        if not isinstance(usage, dict):
+            usage = usage.model_dump() if hasattr(usage, "model_dump") else vars(usage)
+        uso = self.uso.setdefault(model, {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0})
+        uso["prompt_tokens"] += usage.get("prompt_tokens") or 0
+        uso["completion_tokens"] += usage.get("completion_tokens") or 0
+        details = usage.get("prompt_tokens_details") or {}
+        uso["cached_tokens"] += details.get("cached_tokens") or 0
+
+    def record_audio(self, model, seconds):
+        self.modelo_whisper = model
+        self.audio_segundos = seconds
+
+    def _chat_factor(self):
+        return 1 - DESCONTO_BATCH if self.api_batch else 1.0
+
+    def cost(self):
+        total = 0.0
+        for model, uso in self.uso.items():
+            total += estimate_cost(model, uso["prompt_tokens"], uso["completion_tokens"], uso["cached_tokens"])
+        total *= self._chat_factor()
+        if self.audio_segundos and self.modelo_whisper and not self.cache.get("transcricao"):
+            total += estimate_cost(self.modelo_whisper, audio_seconds=self.audio_segundos)
+        return total
+
+    def cache_savings(self):
+        return sum(estimate_cache_savings(model, uso["cached_tokens"]) for model, uso in self.uso.items()) \
+            * self._chat_factor()
+
+    def to_dict(self):
+        return {
+            "id": self.call_id,
+            "inicio": self.inicio.isoformat(timespec="seconds"),
+            "etapas_s": {name: round(seconds, 4) for name, seconds in self.etapas.items()},
+            "total_s": round(sum(self.etapas.values()), 4),
+            "uso": self.uso,
+            "audio_s": self.audio_segundos,
+            "cache": self.cache,
+            "custo_usd": round(self.cost(), 6),
+            "economia_cache_usd": round(self.cache_savings(), 6),
+            **self.extras,
+        }
+
+
+class MetricsRegistry:
+    """
+    Agregados de todas as análises do processo (thread-safe), exportáveis para o Prometheus
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.analises = 0
+        self.custo_usd = 0.0
+        self.economia_cache_usd = 0.0
+        self.audio_segundos = 0.0
+        self.tokens = {}
+        self.cache_hits = {}
+        self.latencias = {}
+        self.relatorios = 0
+        self.relatorio_bytes = 0
+
+    def observe(self, trace):
+        with self._lock:
+            self.analises += 1
+            self.custo_usd += trace.cost()
+            self.economia_cache_usd += trace.cache_savings()
+            self.audio_segundos += trace.audio_segundos or 0
+            for model, uso in trace.uso.items():
+                for tipo, quantidade in uso.items():
+                    self.tokens[(model, tipo)] = self.tokens.get((model, tipo), 0) + quantidade
+            for etapa, acertou in trace.cache.items():
+                if acertou:
+                    self.cache_hits[etapa] = self.cache_hits.get(etapa, 0) + 1
+            for etapa, seconds in trace.etapas.items():
+                self._observe_latency(etapa, seconds)
+
+    def observe_report(self, seconds, size):
+        """
+        Relatório PDF gerado fora da análise (em segundo plano): latência na etapa "pdf" e tamanho
+        """
+        with self._lock:
+            self.relatorios += 1
+            self.relatorio_bytes += size
+            self._observe_latency("pdf", seconds)
+
+    def _observe_latency(self, etapa, seconds):
+        # Chamado com o lock adquirido
+        hist = self.latencias.setdefault(etapa, {"buckets": [0] * len(BUCKETS), "soma": 0.0, "total": 0})
+        hist["soma"] += seconds
+        hist["total"] += 1
+        for i, limite in enumerate(BUCKETS):
+            if seconds <= limite:
+                hist["buckets"][i] += 1
+
+    def render_prometheus(self):
+        with self._lock:
+            linhas = [
+                "# HELP monitorai_analises_total Análises concluídas",
+                "# TYPE monitorai_analises_total counter",
+                f"monitorai_analises_total {self.analises}",
+                "# HELP monitorai_custo_usd_total Custo estimado acumulado (US$)",
+                "# TYPE monitorai_custo_usd_total counter",
+                f"monitorai_custo_usd_total {self.custo_usd:.6f}",
+                "# HELP monitorai_economia_cache_usd_total Economia acumulada com o cache de prompt do provedor (US$)",
+                "# TYPE monitorai_economia_cache_usd_total counter",
+                f"monitorai_economia_cache_usd_total {self.economia_cache_usd:.6f}",
+                "# HELP monitorai_audio_segundos_total Segundos de áudio transcritos",
+                "# TYPE monitorai_audio_segundos_total counter",
+                f"monitorai_audio_segundos_total {self.audio_segundos:.3f}",
+                "# HELP monitorai_relatorios_total Relatórios PDF gerados em segundo plano",
+                "# TYPE monitorai_relatorios_total counter",
+                f"monitorai_relatorios_total {self.relatorios}",
+                "# HELP monitorai_relatorio_bytes_total Tamanho acumulado dos relatórios PDF gerados",
+                "# TYPE monitorai_relatorio_bytes_total counter",
+                f"monitorai_relatorio_bytes_total {self.relatorio_bytes}",
+                "# HELP monitorai_tokens_total Tokens consumidos por modelo e tipo",
+                "# TYPE monitorai_tokens_total counter",
+            ]
+            for (model, tipo), quantidade in sorted(self.tokens.items()):
+                linhas.append(f'monitorai_tokens_total{{modelo="{model}",tipo="{tipo}"}} {quantidade}')
+            linhas += [
+                "# HELP monitorai_cache_hits_total Etapas atendidas pelo cache",
+                "# TYPE monitorai_cache_hits_total counter",
+            ]
+            for etapa, hits in sorted(self.cache_hits.items()):
+                linhas.append(f'monitorai_cache_hits_total{{etapa="{etapa}"}} {hits}')
+            linhas += [
+                "# HELP monitorai_etapa_segundos Latência de cada etapa do pipeline",
+                "# TYPE monitorai_etapa_segundos histogram",
+            ]
+            for etapa, hist in sorted(self.latencias.items()):
+                for limite, quantidade in zip(BUCKETS, hist["buckets"]):
+                    linhas.append(f'monitorai_etapa_segundos_bucket{{etapa="{etapa}",le="{limite}"}} {quantidade}')
+                linhas.append(f'monitorai_etapa_segundos_bucket{{etapa="{etapa}",le="+Inf"}} {hist["total"]}')
+                linhas.append(f'monitorai_etapa_segundos_sum{{etapa="{etapa}"}} {hist["soma"]:.4f}')
+                linhas.append(f'monitorai_etapa_segundos_count{{etapa="{etapa}"}} {hist["total"]}')
+            return "\n".join(linhas) + "\n"
+
+
+# Registro padrão do processo
+REGISTRY = MetricsRegistry()
+_jsonl_lock = threading.Lock()
+
+
+def record_trace(trace, registry=REGISTRY, path=METRICS_FILE):
+    """
+    Agrega o registro no `registry` e acrescenta uma linha no arquivo JSONL (se `path` informado)
+    """
+    registry.observe(trace)
+    if path:
+        linha = json.dumps(trace.to_dict(), ensure_ascii=False) + "\n"
+        with _jsonl_lock:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(linha)
+
+
+def serve_prometheus(port, registry=REGISTRY, host="0.0.0.0"):
+    """
+    Sobe um servidor HTTP em segundo plano com as métricas em /metrics. Retorna o servidor
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
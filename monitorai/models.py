@@ -0,0 +1,358 @@
+"""
+Modelo tipado do resultado da análise, com `__slots__`, e serialização em TOON, JSON e binário.
+
+`Analysis.from_dict` valida e converte o dicionário do parser (ou de qualquer outra origem) nos
+tipos certos — item, pontos e pontuação inteiros, `ocorreu` booleano, textos sem espaços nas
+pontas — e descarta campos desconhecidos. `to_dict` devolve o mesmo formato de
+`parse_toon_response`, então o resto do código pode continuar com dicionários. O parser não
+passa pelo modelo, mas converte item, pontos, pontuação e `ocorreu` com as mesmas funções
+(`as_int`, `as_bool`); só na resposta do modelo item ou pontos vazios são linha rejeitada, e
+`from_toon` lê o vazio como None.
+
+O formato binário guarda os inteiros em um bloco `struct` e todos os textos em um único bloco
+UTF-8 separado por \\x1f: gravar e ler são algumas chamadas em C, sem laço por campo.
+"""
+
+import json
+import struct
+
+SECOES = ("status_final", "checklist", "criterios_eliminatorios", "uso_script", "pontuacao_total", "resumo_geral")
+
+# Valores de `ocorreu` e de `resposta` considerados verdadeiros
+VERDADEIROS = ("true", "sim", "yes", "1")
+
+_MAGIC = b"MA"
+_VERSAO_BINARIA = 1
+_CABECALHO = struct.Struct("<2sBBHH")
+_TAMANHO = struct.Struct("<I")
+# Separador de textos e marcador de texto ausente no bloco binário (retirados dos textos na validação)
+_SEP = "\x1f"
+_NULO = "\x1e"
+_INT_NULO = -32768
+_TOTAL_NULO = -(2 ** 31)
+
+
+def as_int(value):
+    """
+    Inteiro ou None (também para texto vazio, como `to_toon` grava o None); levanta ValueError
+    para texto não numérico
+    """
+    if value is None or isinstance(value, int) and not isinstance(value, bool):
+        return value
+    text = str(value).strip()
+    return int(text) if text else None
+
+
+def as_bool(value):
+    """
+    Booleano ou None ("true"/"sim"/"yes"/"1" são verdadeiros; texto vazio é None)
+    """
+    if value is None or isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    return text in VERDADEIROS if text else None
+
+
+def as_text(value):
+    """
+    Texto sem espaços nas pontas e sem os separadores do formato binário, ou None
+    """
+    if value is None:
+        return None
+    text = str(value).strip()
+    if _SEP in text or _NULO in text:
+        text = text.replace(_SEP, " ").replace(_NULO, " ")
+    return text
+
+
+def _toon_value(value):
+    # Valores com vírgula ou aspas vão entre aspas, com a aspa interna duplicada
+    text = "" if value is None else str(value).lower() if isinstance(value, bool) else str(value)
+    if "," in text or '"' in text:
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+class StatusFinal:
+    __slots__ = ("satisfacao", "risco", "desfecho")
+
+    def __init__(self, satisfacao=None, risco=None, desfecho=None):
+        self.satisfacao = satisfacao
+        self.risco = risco
+        self.desfecho = desfecho
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(as_text(data.get("satisfacao")), as_text(data.get("risco")), as_text(data.get("desfecho")))
+
+    def to_dict(self):
+        return {campo: getattr(self, campo) for campo in self.__slots__ if getattr(self, campo) is not None}
+
+
+class UsoScript:
+    __slots__ = ("status", "justificativa")
+
+    def __init__(self, status=None, justificativa=None):
+        self.status = status
+        self.justificativa = justificativa
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(as_text(data.get("status")), as_text(data.get("justificativa")))
+
+    def to_dict(self):
+        return {campo: getattr(self, campo) for campo in self.__slots__ if getattr(self, campo) is not None}
+
+
+class ChecklistItem:
+    __slots__ = ("item", "criterio", "pontos", "resposta", "justificativa")
+
+    def __init__(self, item=None, criterio=None, pontos=None, resposta=None, justificativa=None):
+        self.item = item
+        self.criterio = criterio
+        self.pontos = pontos
+        self.resposta = resposta
+        self.justificativa = justificativa
+
+    @property
+    def passou(self):
+        return as_bool(self.resposta) is True
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(as_int(data.get("item")), as_text(data.get("criterio")), as_int(data.get("pontos")),
+                   as_text(data.get("resposta")), as_text(data.get("justificativa")))
+
+    def to_dict(self):
+        return {campo: getattr(self, campo) for campo in self.__slots__ if getattr(self, campo) is not None}
+
+
+class CriterioEliminatorio:
+    __slots__ = ("criterio", "ocorreu", "justificativa")
+
+    def __init__(self, criterio=None, ocorreu=None, justificativa=None):
+        self.criterio = criterio
+        self.ocorreu = ocorreu
+        self.justificativa = justificativa
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(as_text(data.get("criterio")), as_bool(data.get("ocorreu")), as_text(data.get("justificativa")))
+
+    def to_dict(self):
+        return {campo: getattr(self, campo) for campo in self.__slots__ if getattr(self, campo) is not None}
+
+
+class Analysis:
+    """
+    Análise de uma ligação. Seções ausentes na resposta ficam None (e não aparecem em `to_dict`)
+    """
+
+    __slots__ = SECOES
+
+    def __init__(self, status_final=None, checklist=None, criterios_eliminatorios=None, uso_script=None,
+                 pontuacao_total=None, resumo_geral=None):
+        self.status_final = status_final
+        self.checklist = checklist
+        self.criterios_eliminatorios = criterios_eliminatorios
+        self.uso_script = uso_script
+        self.pontuacao_total = pontuacao_total
+        self.resumo_geral = resumo_geral
+
+    @property
+    def violou_eliminatorio(self):
+        return any(c.ocorreu for c in self.criterios_eliminatorios or ())
+
+    def __eq__(self, other):
+        return isinstance(other, Analysis) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"Analysis(pontuacao_total={self.pontuacao_total!r}, checklist={len(self.checklist or ())} itens)"
+
+    # Dicionário (formato de parse_toon_response)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Valida e converte um dicionário de análise. Aceita também uma `Analysis` (devolvida como está)
+        """
+        if isinstance(data, cls):
+            return data
+        data = data or {}
+        status = data.get("status_final")
+        script = data.get("uso_script")
+        checklist = data.get("checklist")
+        criterios = data.get("criterios_eliminatorios")
+        return cls(
+            StatusFinal.from_dict(status) if status is not None else None,
+            [ChecklistItem.from_dict(item) for item in checklist] if checklist is not None else None,
+            [CriterioEliminatorio.from_dict(c) for c in criterios] if criterios is not None else None,
+            UsoScript.from_dict(script) if script is not None else None,
+            as_int(data.get("pontuacao_total")),
+            as_text(data.get("resumo_geral")),
+        )
+
+    def to_dict(self):
+        data = {}
+        if self.status_final is not None:
+            data["status_final"] = self.status_final.to_dict()
+        if self.checklist is not None:
+            data["checklist"] = [item.to_dict() for item in self.checklist]
+        if self.criterios_eliminatorios is not None:
+            data["criterios_eliminatorios"] = [c.to_dict() for c in self.criterios_eliminatorios]
+        if self.uso_script is not None:
+            data["uso_script"] = self.uso_script.to_dict()
+        if self.pontuacao_total is not None:
+            data["pontuacao_total"] = self.pontuacao_total
+        if self.resumo_geral is not None:
+            data["resumo_geral"] = self.resumo_geral
+        return data
+
+    # TOON
+
+    @classmethod
+    def from_toon(cls, text):
+        from .toon import parse_toon_response
+
+        return cls.from_dict(parse_toon_response(text, empty_as_none=True))
+
+    def to_toon(self):
+        """
+        Texto TOON no formato pedido pelo prompt (lido de volta por `from_toon`). Campos None saem
+        vazios: inteiros e booleanos voltam como None, textos como ""
+        """
+        blocos = []
+        if self.status_final is not None:
+            blocos.append(self._toon_simple("status_final", self.status_final))
+        if self.checklist is not None:
+            blocos.append(self._toon_rows("checklist", ChecklistItem.__slots__, self.checklist))
+        if self.criterios_eliminatorios is not None:
+            blocos.append(self._toon_rows("criterios_eliminatorios", CriterioEliminatorio.__slots__,
+                                          self.criterios_eliminatorios))
+        if self.uso_script is not None:
+            blocos.append(self._toon_simple("uso_script", self.uso_script))
+        if self.pontuacao_total is not None:
+            blocos.append(f"pontuacao_total\n{self.pontuacao_total}")
+        if self.resumo_geral is not None:
+            blocos.append(f"resumo_geral\n{self.resumo_geral}")
+        return "\n\n".join(blocos)
+
+    @staticmethod
+    def _toon_simple(section, value):
+        campos = value.__slots__
+        return "\n".join([f"{section}[{len(campos)}]", ", ".join(campos),
+                          ", ".join(_toon_value(getattr(value, campo)) for campo in campos)])
+
+    @staticmethod
+    def _toon_rows(section, campos, rows):
+        return "\n".join([f"{section}[{len(rows)}]", ", ".join(campos),
+                          *(", ".join(_toon_value(getattr(row, campo)) for campo in campos) for row in rows)])
+
+    # JSON
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+    # Binário
+
+    def to_bytes(self):
+        """
+        Cabeçalho (seções presentes e tamanhos das listas), bloco de inteiros e bloco de textos
+        """
+        checklist = self.checklist or ()
+        criterios = self.criterios_eliminatorios or ()
+        flags = sum(1 << i for i, secao in enumerate(SECOES) if getattr(self, secao) is not None)
+        status = self.status_final or StatusFinal()
+        script = self.uso_script or UsoScript()
+
+        inteiros = []
+        for item in checklist:
+            inteiros.append(_INT_NULO if item.item is None else item.item)
+            inteiros.append(_INT_NULO if item.pontos is None else item.pontos)
+        inteiros.extend(-1 if c.ocorreu is None else int(c.ocorreu) for c in criterios)
+        inteiros.append(_TOTAL_NULO if self.pontuacao_total is None else self.pontuacao_total)
+
+        textos = [status.satisfacao, status.risco, status.desfecho, script.status, script.justificativa]
+        for item in checklist:
+            textos += (item.criterio, item.resposta, item.justificativa)
+        for c in criterios:
+            textos += (c.criterio, c.justificativa)
+        textos.append(self.resumo_geral)
+
+        return b"".join([
+            _CABECALHO.pack(_MAGIC, _VERSAO_BINARIA, flags, len(checklist), len(criterios)),
+            struct.pack(_formato_inteiros(len(checklist), len(criterios)), *inteiros),
+            _SEP.join(_NULO if t is None else t for t in textos).encode("utf-8"),
+        ])
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, versao, flags, n_itens, n_criterios = _CABECALHO.unpack_from(data)
+        if magic != _MAGIC or versao != _VERSAO_BINARIA:
+            raise ValueError("Formato binário de análise desconhecido")
+        formato = _formato_inteiros(n_itens, n_criterios)
+        inteiros = struct.unpack_from(formato, data, _CABECALHO.size)
+        textos = [None if t == _NULO else t
+                  for t in bytes(data[_CABECALHO.size + struct.calcsize(formato):]).decode("utf-8").split(_SEP)]
+
+        presentes = {secao for i, secao in enumerate(SECOES) if flags & (1 << i)}
+        analysis = cls()
+        if "status_final" in presentes:
+            analysis.status_final = StatusFinal(*textos[0:3])
+        if "uso_script" in presentes:
+            analysis.uso_script = UsoScript(*textos[3:5])
+        if "checklist" in presentes:
+            analysis.checklist = [
+                ChecklistItem(None if inteiros[2 * i] == _INT_NULO else inteiros[2 * i],
+                              textos[5 + 3 * i],
+                              None if inteiros[2 * i + 1] == _INT_NULO else inteiros[2 * i + 1],
+                              textos[6 + 3 * i], textos[7 + 3 * i])
+                for i in range(n_itens)
+            ]
+        if "criterios_eliminatorios" in presentes:
+            base_int, base_txt = 2 * n_itens, 5 + 3 * n_itens
+            analysis.criterios_eliminatorios = [
+                CriterioEliminatorio(textos[base_txt + 2 * i],
+                                     None if inteiros[base_int + i] < 0 else bool(inteiros[base_int + i]),
+                                     textos[base_txt + 2 * i + 1])
+                for i in range(n_criterios)
+            ]
+        if "pontuacao_total" in presentes:
+            analysis.pontuacao_total = inteiros[-1]
+        if "resumo_geral" in presentes:
+            analysis.resumo_geral = textos[-1]
+        return analysis
+
+
+def _formato_inteiros(n_itens, n_criterios):
+    # item e pontos (int16) por item do checklist, ocorreu (int8) por critério e a pontuação (int32)
+    return f"<{2 * n_itens}h{n_criterios}bi"
+
+
+def dump_many(analyses):
+    """
+    Serializa várias análises em um só bloco binário (cada uma prefixada pelo tamanho)
+    """
+    partes = []
+    for analysis in analyses:
+        data = Analysis.from_dict(analysis).to_bytes()
+        partes.append(_TAMANHO.pack(len(data)))
+        partes.append(data)
+    return b"".join(partes)
+
+
+def load_many(data):
+    """
+    Lê um bloco gerado por `dump_many`, gerando as análises em ordem
+    """
+    view = memoryview(data)
+    posicao = 0
+    while posicao < len(view):
+        (tamanho,) = _TAMANHO.unpack_from(view, posicao)
+        posicao += _TAMANHO.size
+        yield Analysis.from_bytes(view[posicao:posicao + tamanho])
+        posicao += tamanho
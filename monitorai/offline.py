@@ -0,0 +1,355 @@
+"""
+Modo offline: as análises vão para a API de batch do provedor em vez do chat síncrono. A
+resposta demora (até a janela de conclusão, 24h), mas os tokens custam menos (ver
+metrics.DESCONTO_BATCH) e não disputam os limites de RPM/TPM das análises interativas.
+
+Etapas de `run_batch_offline`:
+1. as gravações são transcritas em paralelo (o Whisper não é aceito pela API de batch) e as
+   análises já em cache saem na hora;
+2. as demais viram um arquivo JSONL de requisições ao chat (uma linha por ligação, com o prompt
+   TOON de `build_messages`), enviado como arquivo e submetido como lote;
+3. o lote é consultado a cada `poll_interval` segundos até terminar;
+4. os arquivos de resultado e de erros são lidos em streaming, linha a linha, pelo
+   `parse_toon_response`; cada análise completa gera o registro (JSONL/banco) na hora;
+5. linhas com erro ou sem resposta são reenviadas inteiras em um novo lote, e respostas
+   incompletas vão como pedido de reparo (só as partes que faltaram, ver repair.py), por até
+   `max_rounds` rodadas.
+
+O estado do trabalho (lotes em andamento e ligações pendentes, com as transcrições) fica em
+`<work_dir>/estado.json`: se o processo for interrompido enquanto espera o lote, a próxima
+execução com o mesmo diretório retoma a espera sem transcrever nem submeter de novo.
+
+Uso:
+    python -m monitorai.batch gravacoes/ --saida resultados.jsonl --offline --offline-dir lotes/
+"""
+
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .pipeline import _stage, run_prescreen, transcribe_audio
+from .prescreen import merge_prescreen, prescreen_omissions, prescreen_variant
+from .prompts import MODELO_GPT, TEMPERATURA, build_messages
+from .repair import build_repair_messages, merge_repair, missing_parts
+from .report import create_pdf
+from .toon import parse_toon_response
+from .util import CallState, write_atomic
+
+ENDPOINT_CHAT = "/v1/chat/completions"
+JANELA_CONCLUSAO = "24h"
+STATUS_FINAIS = ("completed", "failed", "expired", "cancelled")
+
+INTERVALO_CONSULTA_S = 60
+MAX_RODADAS = 3
+# Limites da API por lote (requisições e tamanho do arquivo); acima disso a rodada vira vários lotes
+MAX_REQUISICOES_POR_LOTE = 50000
+MAX_BYTES_POR_LOTE = 190 * 1024 * 1024
+
+ARQUIVO_ESTADO = "estado.json"
+
+
+class _OfflineCall(CallState):
+    """
+    Ligação à espera do lote: transcrição, pré-triagem e a última resposta (parcial) recebida
+    """
+
+    def __init__(self, call_id, audio_path, model, metadata):
+        super().__init__(call_id, audio_path, model, metadata)
+        self.trace.api_batch = True
+        self.result = None
+        self.analysis = None
+        self.erro = None
+
+    def omissions(self):
+        return prescreen_omissions(self.decisions)
+
+    def complete(self):
+        return self.analysis is not None and not missing_parts(self.analysis, *self.omissions())
+
+    def messages(self):
+        """
+        Mensagens da próxima requisição: a análise inteira ou, se já há uma resposta
+        incompleta, o pedido de reparo das partes que faltaram
+        """
+        messages = build_messages(self.transcript, self.decisions)
+        if self.result is None:
+            return messages
+        return build_repair_messages(messages, self.result, missing_parts(self.analysis, *self.omissions()))
+
+    def to_state(self):
+        return {
+            "id": self.call_id,
+            "arquivo": self.record["arquivo"],
+            "metadados": {k: v for k, v in self.record.items() if k not in ("id", "arquivo", "modelo")},
+            "transcricao": self.transcript,
+            "resposta_toon": self.result,
+            "analise": self.analysis,
+            "erro": self.erro,
+            "etapas_s": self.trace.etapas,
+            "uso": self.trace.uso,
+            "audio": [self.trace.modelo_whisper, self.trace.audio_segundos],
+            "cache": self.trace.cache,
+        }
+
+    @classmethod
+    def from_state(cls, entry, model):
+        call = cls(entry["id"], entry["arquivo"], model, entry["metadados"])
+        call.transcript = entry["transcricao"]
+        call.result, call.analysis, call.erro = entry["resposta_toon"], entry["analise"], entry["erro"]
+        call.trace.etapas = dict(entry["etapas_s"])
+        call.trace.uso = entry["uso"]
+        call.trace.record_audio(*entry["audio"])
+        call.trace.cache = entry["cache"]
+        return call
+
+
+def request_line(call, model, temperature=TEMPERATURA):
+    """
+    Linha do arquivo de requisições do lote para a ligação (`custom_id` é o id da ligação)
+    """
+    return {
+        "custom_id": call.call_id,
+        "method": "POST",
+        "url": ENDPOINT_CHAT,
+        "body": {"model": model, "messages": call.messages(), "temperature": temperature},
+    }
+
+
+def submit_batches(client, calls, model, temperature=TEMPERATURA, work_dir=None, metadata=None):
+    """
+    Grava as requisições das ligações em arquivos JSONL (respeitando os limites por lote), envia
+    cada um e cria o lote correspondente. Retorna {id do lote: ids das ligações enviadas nele}
+    """
+    lotes = {}
+    linhas, ids, tamanho = [], [], 0
+
+    def flush():
+        fd, path = tempfile.mkstemp(dir=work_dir, prefix="requisicoes_", suffix=".jsonl")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.writelines(linhas)
+            with open(path, "rb") as f:
+                arquivo = client.files.create(file=(os.path.basename(path), f), purpose="batch")
+        finally:
+            os.remove(path)
+        batch = client.batches.create(input_file_id=arquivo.id, endpoint=ENDPOINT_CHAT,
+                                      completion_window=JANELA_CONCLUSAO, metadata=metadata)
+        lotes[batch.id] = ids
+
+    for call in calls:
+        linha = (json.dumps(request_line(call, model, temperature), ensure_ascii=False) + "\n").encode("utf-8")
+        if linhas and (len(linhas) >= MAX_REQUISICOES_POR_LOTE or tamanho + len(linha) > MAX_BYTES_POR_LOTE):
+            flush()
+            linhas, ids, tamanho = [], [], 0
+        linhas.append(linha)
+        ids.append(call.call_id)
+        tamanho += len(linha)
+    if linhas:
+        flush()
+    return lotes
+
+
+def wait_batches(client, batch_ids, poll_interval=INTERVALO_CONSULTA_S, progress=None):
+    """
+    Consulta os lotes a cada `poll_interval` segundos até todos chegarem a um status final.
+    `progress(evento)` recebe {"lote", "status", "concluidas", "falhas", "total"} a cada consulta.
+    Retorna os lotes (objetos da API) na ordem de `batch_ids`
+    """
+    finais = {}
+    while True:
+        for batch_id in batch_ids:
+            if batch_id in finais:
+                continue
+            batch = client.batches.retrieve(batch_id)
+            if batch.status in STATUS_FINAIS:
+                finais[batch_id] = batch
+            if progress is not None:
+                counts = batch.request_counts
+                progress({"lote": batch_id, "status": batch.status, "concluidas": getattr(counts, "completed", 0),
+                          "falhas": getattr(counts, "failed", 0), "total": getattr(counts, "total", 0)})
+        if len(finais) == len(batch_ids):
+            return [finais[batch_id] for batch_id in batch_ids]
+        time.sleep(poll_interval)
+
+
+def iter_batch_results(client, file_id):
+    """
+    Linhas (dicionários) de um arquivo de resultados ou de erros do lote, lidas em streaming
+    """
+    with client.files.with_streaming_response.content(file_id) as response:
+        for line in response.iter_lines():
+            if line.strip():
+                yield json.loads(line)
+
+
+def _batch_error(batch):
+    erros = [e.message for e in (getattr(batch.errors, "data", None) or []) if getattr(e, "message", None)]
+    return f"lote {batch.id} {batch.status}" + (f": {'; '.join(erros)}" if erros else "")
+
+
+def apply_result(call, row, model):
+    """
+    Aplica à ligação uma linha de resultado do lote: registra o uso, parseia a resposta TOON e,
+    se era um pedido de reparo, junta as partes recebidas. Linhas com erro só guardam o motivo
+    """
+    response = row.get("response") or {}
+    body = response.get("body") or {}
+    if response.get("status_code") != 200:
+        erro = body.get("error") or row.get("error") or {}
+        call.erro = f"{response.get('status_code') or erro.get('code')}: {erro.get('message')}"
+        return
+    call.trace.record_usage(model, body.get("usage"))
+    text = body["choices"][0]["message"]["content"].strip()
+    with _stage(call.trace, "parse"):
+        if call.result is None:
+            call.result, call.analysis = text, parse_toon_response(text)
+        else:
+            parts = missing_parts(call.analysis, *call.omissions())
+            call.analysis = merge_repair(call.analysis, parse_toon_response(text), parts)
+            call.result = f"{call.result}\n\n{text}"
+    call.erro = None if call.complete() else "resposta incompleta"
+
+
+def run_batch_offline(client, recordings, work_dir, workers=4, model=MODELO_GPT, pdf_dir=None, metrics_file=None,
+                      transcript_cache=None, analysis_cache=None, chunk_seconds=None, preprocess=False,
+                      prescreen=True, poll_interval=INTERVALO_CONSULTA_S, max_rounds=MAX_RODADAS, progress=None):
+    """
+    Versão de `batch.run_batch` que analisa pela API de batch (ver o início do módulo). Gera os
+    registros à medida que os resultados são lidos. Se `work_dir` tem o estado de uma execução
+    interrompida, `recordings` é ignorado e o trabalho pendente é retomado. `progress(evento)`
+    recebe as consultas de `wait_batches` e {"rodada", "lotes", "ligacoes"} a cada submissão
+    """
+    from .batch import finish_record, record_output
+
+    os.makedirs(work_dir, exist_ok=True)
+    if pdf_dir:
+        os.makedirs(pdf_dir, exist_ok=True)
+    state_path = os.path.join(work_dir, ARQUIVO_ESTADO)
+
+    def finish(call):
+        try:
+            pdf_path = os.path.join(pdf_dir, f"{call.call_id}.pdf") if pdf_dir else None
+            if pdf_path:
+                with _stage(call.trace, "pdf"):
+                    with open(pdf_path, "wb") as pdf_file:
+                        pdf_file.write(create_pdf(call.analysis, call.transcript, model))
+            record_output(call.record, {"transcricao": call.transcript, "resposta_toon": call.result,
+                                        "analise": call.analysis, "pdf": pdf_path})
+        except Exception as e:
+            call.record.update({"status": "erro", "erro": f"{type(e).__name__}: {e}"})
+        return finish_record(call.record, call.trace, call.inicio, metrics_file)
+
+    def fail(call, error):
+        call.record.update({"status": "erro", "erro": error})
+        return finish_record(call.record, call.trace, call.inicio, metrics_file)
+
+    def transcribe(call_id, audio_path, metadata):
+        call = _OfflineCall(call_id, audio_path, model, metadata)
+        try:
+            call.transcript = transcribe_audio(client, audio_path, cache=transcript_cache, trace=call.trace,
+                                               chunk_seconds=chunk_seconds, preprocess=preprocess)
+            call.decisions = run_prescreen(call.transcript, call.trace) if prescreen else None
+            if analysis_cache is not None:
+                cached = analysis_cache.get_analysis(call.transcript, model, TEMPERATURA,
+                                                     prescreen_variant(call.decisions))
+                call.trace.cache["analise"] = cached is not None
+                if cached is not None:
+                    call.trace.api_batch = False
+                    call.result, call.analysis = cached
+        except Exception as e:
+            call.erro = f"{type(e).__name__}: {e}"
+        return call
+
+    def save_state():
+        write_atomic(state_path, json.dumps(estado, ensure_ascii=False).encode("utf-8"))
+
+    pending = {}
+    if os.path.exists(state_path):
+        with open(state_path, encoding="utf-8") as f:
+            estado = json.load(f)
+        model = estado["modelo"]
+        prescreen = estado["pretriagem"]
+        for entry in estado["ligacoes"]:
+            call = _OfflineCall.from_state(entry, model)
+            call.decisions = run_prescreen(call.transcript, call.trace) if prescreen else None
+            pending[call.call_id] = call
+        if isinstance(estado["lotes"], list):
+            # Estado gravado antes de cada lote guardar as suas ligações
+            estado["lotes"] = {batch_id: list(pending) for batch_id in estado["lotes"]}
+    else:
+        estado = {"modelo": model, "pretriagem": prescreen, "rodada": 1, "lotes": {}, "enviado_em": None}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(transcribe, call_id, path, metadata[0] if metadata else None)
+                       for call_id, path, *metadata in recordings]
+            for future in as_completed(futures):
+                call = future.result()
+                if call.erro is not None:
+                    yield fail(call, call.erro)
+                elif call.analysis is not None:
+                    yield finish(call)
+                elif call.call_id in pending:
+                    yield fail(call, "id repetido no lote (custom_id precisa ser único)")
+                else:
+                    pending[call.call_id] = call
+
+    def sync_state():
+        estado["ligacoes"] = [call.to_state() for call in pending.values()]
+        save_state()
+
+    while pending and estado["rodada"] <= max_rounds:
+        if not estado["lotes"]:
+            estado["lotes"] = submit_batches(client, pending.values(), model, TEMPERATURA, work_dir,
+                                             metadata={"origem": "monitorai", "rodada": str(estado["rodada"])})
+            estado["enviado_em"] = time.time()
+            sync_state()
+            if progress is not None:
+                progress({"rodada": estado["rodada"], "lotes": list(estado["lotes"]), "ligacoes": len(pending)})
+
+        batches = wait_batches(client, list(estado["lotes"]), poll_interval, progress)
+        espera = time.time() - estado["enviado_em"]
+        for call in pending.values():
+            call.trace.add_time("batch", espera)
+            call.trace.extras["offline"] = {"rodadas": estado["rodada"], "lote": None}
+            call.erro = "sem resposta no lote"
+
+        for batch in batches:
+            if batch.status != "completed":
+                # Só as ligações enviadas neste lote; as dos outros lotes da rodada seguem como estão
+                for call_id in estado["lotes"][batch.id]:
+                    if call_id in pending:
+                        pending[call_id].erro = _batch_error(batch)
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if not file_id:
+                    continue
+                for row in iter_batch_results(client, file_id):
+                    call = pending.get(row.get("custom_id"))
+                    if call is None:
+                        continue
+                    call.trace.extras["offline"]["lote"] = batch.id
+                    apply_result(call, row, model)
+                    if call.complete():
+                        del pending[call.call_id]
+                        call.analysis = merge_prescreen(call.analysis, call.decisions)
+                        if analysis_cache is not None:
+                            analysis_cache.set_analysis(call.transcript, model, TEMPERATURA, call.result,
+                                                        call.analysis, prescreen_variant(call.decisions))
+                        yield finish(call)
+            # Os resultados continuam disponíveis no provedor: se a leitura for interrompida, a
+            # retomada lê o lote de novo e pula as ligações que já saíram do estado
+            sync_state()
+
+        estado["rodada"] += 1
+        estado["lotes"] = {}
+        sync_state()
+
+    # Esgotadas as rodadas: respostas incompletas saem como estão (como em `run_analysis`), as demais com erro
+    for call in pending.values():
+        if call.analysis is not None:
+            call.analysis = merge_prescreen(call.analysis, call.decisions)
+            yield finish(call)
+        else:
+            yield fail(call, call.erro or "sem resposta no lote")
+    if os.path.exists(state_path):
+        os.remove(state_path)
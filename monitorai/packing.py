@@ -0,0 +1,249 @@
+"""
+Agrupamento de ligações curtas: várias transcrições avaliadas em uma única requisição ao chat.
+
+Em ligações curtas, a rubrica fixa do prompt é muito maior que a transcrição, e cada análise
+paga de novo esses tokens e o custo da requisição. No modo agrupado, as transcrições são
+juntadas em lotes limitados por um orçamento de tokens estimados por requisição, a rubrica vai
+uma vez só e a resposta traz um bloco TOON por ligação (`registro[id]`). Registros ausentes,
+que falham no parser ou incompletos são reenviados sozinhos, pelo caminho normal (com reparo).
+
+Uso:
+    python -m monitorai.batch gravacoes/ --saida resultados.jsonl --agrupar-tokens 16000
+"""
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .aio import TOKENS_RESPOSTA_ESTIMADOS, estimate_tokens
+from .pipeline import _stage, analyze_transcript, repair_analysis, run_prescreen, transcribe_audio
+from .prescreen import merge_prescreen, prescreen_omissions, prescreen_variant
+from .prompts import MODELO_GPT, TEMPERATURA, build_packed_messages
+from .repair import missing_parts
+from .report import create_pdf
+from .toon import parse_packed_response, parse_toon_response
+from .util import CallState
+
+# Orçamento padrão de tokens estimados (prompt + respostas) por requisição agrupada
+ORCAMENTO_TOKENS_PADRAO = 16000
+
+# Limite de ligações por requisição, para a resposta caber no máximo de tokens de saída do modelo
+MAX_LIGACOES_POR_LOTE = 8
+
+
+def _omitted(decisions_list):
+    """
+    Itens e `uso_script` decididos pela pré-triagem em todas as ligações do lote
+    (só esses deixam de ser pedidos no prompt compartilhado; os demais são mesclados ligação a ligação)
+    """
+    if not decisions_list or any(d is None for d in decisions_list):
+        return (), False
+    itens = set.intersection(*(set(d["checklist"]) for d in decisions_list))
+    return tuple(sorted(itens)), all(d["uso_script"] is not None for d in decisions_list)
+
+
+def packed_tokens(transcripts, decisions_list=None):
+    """
+    Tokens estimados de uma requisição agrupada com as transcrições informadas
+    """
+    messages = build_packed_messages(transcripts, *_omitted(decisions_list))
+    return estimate_tokens(messages) + TOKENS_RESPOSTA_ESTIMADOS * (len(transcripts) - 1)
+
+
+def analyze_packed(client, transcripts, model=MODELO_GPT, temperature=TEMPERATURA, decisions_list=None):
+    """
+    Avalia várias transcrições (lista de (id, texto)) em uma única requisição.
+    Retorna (analises, pendentes, usage): {id: (resposta_toon, analise)} dos registros
+    completos, os ids que precisam ser reenviados e o `usage` da resposta
+    """
+    omit_items, omit_script = _omitted(decisions_list)
+    response = client.chat.completions.create(
+        model=model,
+        messages=build_packed_messages(transcripts, omit_items, omit_script),
+        temperature=temperature
+    )
+    records = parse_packed_response(response.choices[0].message.content.strip())
+    analyses, pending = {}, []
+    for call_id, _ in transcripts:
+        record_text, analysis = records.get(call_id, (None, None))
+        if analysis is not None and not missing_parts(analysis, omit_items, omit_script):
+            analyses[call_id] = (record_text, analysis)
+        else:
+            pending.append(call_id)
+    return analyses, pending, response.usage
+
+
+def _share_usage(usage, weights):
+    """
+    Divide o `usage` de uma requisição agrupada entre as ligações: tokens de entrada na
+    proporção de `weights` e tokens de saída em partes iguais
+    """
+    if usage is None:
+        return [None] * len(weights)
+    if not isinstance(usage, dict):
+        usage = usage.model_dump() if hasattr(usage, "model_dump") else vars(usage)
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    total = sum(weights)
+    return [
+        {
+            "prompt_tokens": round((usage.get("prompt_tokens") or 0) * weight / total),
+            "completion_tokens": round((usage.get("completion_tokens") or 0) / len(weights)),
+            "prompt_tokens_details": {"cached_tokens": round(cached * weight / total)},
+        }
+        for weight in weights
+    ]
+
+
+def pack_calls(calls, token_budget=ORCAMENTO_TOKENS_PADRAO, max_calls=MAX_LIGACOES_POR_LOTE):
+    """
+    Agrupa as ligações em lotes gulosos, na ordem recebida: um lote é fechado quando a próxima
+    ligação estouraria `token_budget` ou `max_calls`. Ligações que sozinhas passam do orçamento
+    formam um lote de uma
+    """
+    lote = []
+    for call in calls:
+        candidato = lote + [call]
+        if lote and (len(candidato) > max_calls or _pack_tokens(candidato) > token_budget):
+            yield lote
+            candidato = [call]
+        lote = candidato
+    if lote:
+        yield lote
+
+
+def _pack_tokens(calls):
+    return packed_tokens([(c.call_id, c.transcript) for c in calls], [c.decisions for c in calls])
+
+
+def run_batch_packed(client, recordings, workers=4, token_budget=ORCAMENTO_TOKENS_PADRAO,
+                     max_calls=MAX_LIGACOES_POR_LOTE, model=MODELO_GPT, pdf_dir=None, metrics_file=None,
+                     transcript_cache=None, analysis_cache=None, chunk_seconds=None, preprocess=False,
+                     prescreen=True):
+    """
+    Versão de `batch.run_batch` que agrupa as análises: as gravações são transcritas em um pool
+    de `workers` threads e as transcrições que não estão no cache de análises são juntadas em
+    lotes (ver `pack_calls`) avaliados em uma requisição cada. Gera os registros na ordem em que terminam
+    """
+    from .batch import finish_record, record_output
+
+    if pdf_dir:
+        os.makedirs(pdf_dir, exist_ok=True)
+
+    def finish(call, result, analysis):
+        try:
+            pdf_path = os.path.join(pdf_dir, f"{call.call_id}.pdf") if pdf_dir else None
+            if pdf_path:
+                with _stage(call.trace, "pdf"):
+                    with open(pdf_path, "wb") as pdf_file:
+                        pdf_file.write(create_pdf(analysis, call.transcript, model))
+            record_output(call.record, {"transcricao": call.transcript, "resposta_toon": result,
+                                        "analise": analysis, "pdf": pdf_path})
+        except Exception as e:
+            call.record.update({"status": "erro", "erro": f"{type(e).__name__}: {e}"})
+        return finish_record(call.record, call.trace, call.inicio, metrics_file)
+
+    def fail(call, error):
+        call.record.update({"status": "erro", "erro": f"{type(error).__name__}: {error}"})
+        return finish_record(call.record, call.trace, call.inicio, metrics_file)
+
+    def variant(call):
+        return prescreen_variant(call.decisions)
+
+    # Cada tarefa do pool devolve (registros concluídos, ligações prontas para agrupar, ligações a reenviar)
+    def transcribe(call_id, audio_path, metadata):
+        call = CallState(call_id, audio_path, model, metadata)
+        try:
+            call.transcript = transcribe_audio(client, audio_path, cache=transcript_cache, trace=call.trace,
+                                               chunk_seconds=chunk_seconds, preprocess=preprocess)
+            call.decisions = run_prescreen(call.transcript, call.trace) if prescreen else None
+            if analysis_cache is not None:
+                cached = analysis_cache.get_analysis(call.transcript, model, TEMPERATURA, variant(call))
+                call.trace.cache["analise"] = cached is not None
+                if cached is not None:
+                    return [finish(call, *cached)], [], []
+        except Exception as e:
+            return [fail(call, e)], [], []
+        return [], [call], []
+
+    def analyze_single(call):
+        try:
+            result = analyze_transcript(client, call.transcript, model, TEMPERATURA, trace=call.trace,
+                                        prescreen=call.decisions)
+            with _stage(call.trace, "parse"):
+                analysis = parse_toon_response(result)
+            result, analysis = repair_analysis(client, call.transcript, result, analysis, model, TEMPERATURA,
+                                               call.trace, call.decisions)
+            completa = not missing_parts(analysis, *prescreen_omissions(call.decisions))
+            analysis = merge_prescreen(analysis, call.decisions)
+        except Exception as e:
+            return fail(call, e)
+        if analysis_cache is not None and completa:
+            analysis_cache.set_analysis(call.transcript, model, TEMPERATURA, result, analysis, variant(call))
+        return finish(call, result, analysis)
+
+    def analyze_pack(calls):
+        if len(calls) == 1:
+            return [analyze_single(calls[0])], [], []
+        inicio = time.perf_counter()
+        try:
+            analyses, pending, usage = analyze_packed(client, [(c.call_id, c.transcript) for c in calls], model,
+                                                      TEMPERATURA, [c.decisions for c in calls])
+        except Exception:
+            # Falha da requisição inteira: cada ligação é reenviada sozinha
+            analyses, pending, usage = {}, [c.call_id for c in calls], None
+        duracao = time.perf_counter() - inicio
+        shares = _share_usage(usage, [len(c.transcript) + 1 for c in calls])
+
+        records, retry = [], []
+        for call, share in zip(calls, shares):
+            call.trace.add_time("chat", duracao)
+            call.trace.record_usage(model, share)
+            call.trace.extras["lote"] = len(calls)
+            if call.call_id in pending:
+                retry.append(call)
+                continue
+            result, analysis = analyses[call.call_id]
+            with _stage(call.trace, "parse"):
+                analysis = merge_prescreen(analysis, call.decisions)
+            if analysis_cache is not None:
+                analysis_cache.set_analysis(call.transcript, model, TEMPERATURA, result, analysis, variant(call))
+            records.append(finish(call, result, analysis))
+        return records, [], retry
+
+    waiting = []
+    pending = set()
+
+    def submit_packs(executor, flush=False):
+        # O último lote continua aberto esperando mais transcrições, a menos que esteja cheio ou seja o fim
+        packs = list(pack_calls(waiting, token_budget, max_calls))
+        waiting.clear()
+        if packs and not flush and len(packs[-1]) < max_calls:
+            waiting.extend(packs.pop())
+        for pack in packs:
+            pending.add(executor.submit(analyze_pack, pack))
+
+    def collect(executor, done):
+        records = []
+        for future in done:
+            finished, ready, retry = future.result()
+            records.extend(finished)
+            waiting.extend(ready)
+            for call in retry:
+                # Registros que voltaram do lote são reenviados sozinhos
+                pending.add(executor.submit(analyze_pack, [call]))
+        submit_packs(executor)
+        return records
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for call_id, path, *metadata in recordings:
+            pending.add(executor.submit(transcribe, call_id, path, metadata[0] if metadata else None))
+            if len(pending) >= 2 * workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                pending.difference_update(done)
+                yield from collect(executor, done)
+        while pending or waiting:
+            if not pending:
+                submit_packs(executor, flush=True)
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            pending.difference_update(done)
+            yield from collect(executor, done)
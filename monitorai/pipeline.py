@@ -0,0 +1,366 @@
+"""
+Pipeline de análise de uma ligação: transcrição -> análise TOON -> parser -> PDF.
+
+O cliente da OpenAI só é importado em `make_client`: os workers e os testes que usam só o
+parser, os prompts ou a pré-triagem não pagam a importação do SDK.
+"""
+
+import os
+import time
+from contextlib import nullcontext
+
+from .chunking import DURACAO_TRECHO_S, LIMITE_UPLOAD_BYTES, transcribe_chunked, transcript_segments
+from .preprocess import preprocess_audio
+from .prescreen import merge_prescreen, prefilled_analysis, prescreen_omissions, prescreen_transcript, prescreen_variant
+from .prompts import MODELO_GPT, TEMPERATURA, build_messages
+from .repair import build_repair_messages, describe_parts, merge_repair, missing_parts
+from .report import create_pdf
+from .toon import ToonStreamParser, analysis_events, parse_toon_response
+
+MODELO_WHISPER = "whisper-1"
+
+# verbose_json inclui a duração do áudio (usada na estimativa de custo)
+# Segmentos com tempo (início/fim de cada fala) vêm junto com o texto; ver windows.py
+PARAMETROS_WHISPER = {"response_format": "verbose_json", "timestamp_granularities": ["segment"]}
+
+
+def _stage(trace, name):
+    return trace.stage(name) if trace is not None else nullcontext()
+
+
+def make_client(api_key=None, base_url=None):
+    """
+    Cria o cliente da OpenAI (usa OPENAI_API_KEY do ambiente se a chave não for informada).
+    `base_url` (ou OPENAI_BASE_URL) aponta para outro servidor, como o simulado em fakeserver.py
+    """
+    from openai import OpenAI
+
+    if api_key is None:
+        api_key = os.environ.get("OPENAI_API_KEY")
+    return OpenAI(api_key=api_key, base_url=base_url)
+
+
+def _whisper_request(client, audio_path, audio_bytes, model, chunk_seconds, trace):
+    """
+    Envia o áudio ao Whisper (em trechos paralelos se pedido ou se passar do limite de upload).
+    Retorna (texto, duracao_segundos, segmentos)
+    """
+    with _stage(trace, "whisper"):
+        if chunk_seconds is not None or len(audio_bytes) > LIMITE_UPLOAD_BYTES:
+            text, duration, num_chunks, segments = transcribe_chunked(
+                client, audio_path, model, chunk_seconds=chunk_seconds or DURACAO_TRECHO_S,
+                params=PARAMETROS_WHISPER
+            )
+            if trace is not None:
+                trace.extras["trechos"] = num_chunks
+            return text, duration, segments
+
+        transcript = client.audio.transcriptions.create(
+            model=model,
+            file=(os.path.basename(audio_path), audio_bytes),
+            **PARAMETROS_WHISPER
+        )
+        return transcript.text, getattr(transcript, "duration", None), transcript_segments(transcript)
+
+
+# Transcrição via Whisper (consulta o cache antes de enviar o áudio, se informado)
+def transcribe_audio(client, audio_path, model=MODELO_WHISPER, cache=None, trace=None, chunk_seconds=None,
+                     preprocess=False, with_segments=False):
+    """
+    Transcreve o áudio e retorna o texto; com `with_segments`, retorna (texto, segmentos), com os
+    segmentos no tempo da gravação original ([] para transcrições em cache de antes dos segmentos).
+
+    Com `preprocess`, o áudio é convertido para mono/16 kHz, tem os silêncios longos comprimidos
+    e é recodificado antes do envio (ver preprocess.py). Com `chunk_seconds`, ou se o arquivo
+    passar do limite de upload da API, é dividido em trechos transcritos em paralelo (ver chunking.py).
+    O cache é sempre endereçado pelo áudio original
+    """
+    with _stage(trace, "upload"):
+        with open(audio_path, "rb") as audio_file:
+            audio_bytes = audio_file.read()
+
+    params = dict(PARAMETROS_WHISPER)
+    if chunk_seconds is not None or (len(audio_bytes) > LIMITE_UPLOAD_BYTES and not preprocess):
+        params["trecho_s"] = chunk_seconds or DURACAO_TRECHO_S
+    if preprocess:
+        params["preprocessado"] = True
+
+    if cache is not None:
+        key = cache.key_for(audio_bytes, model, params)
+        cached = cache.get(key)
+        if trace is not None:
+            trace.cache["transcricao"] = cached is not None
+        if cached is not None:
+            if trace is not None:
+                trace.record_audio(model, cached.get("duracao"))
+            return (cached["text"], cached.get("segmentos") or []) if with_segments else cached["text"]
+
+    entry = {"model": model}
+    if preprocess:
+        with _stage(trace, "preprocessamento"):
+            prep = preprocess_audio(audio_path)
+        try:
+            with open(prep["caminho"], "rb") as processed_file:
+                processed_bytes = processed_file.read()
+            text, duration, segments = _whisper_request(client, prep["caminho"], processed_bytes, model,
+                                                        chunk_seconds, trace)
+        finally:
+            os.remove(prep["caminho"])
+        # Os tempos dos segmentos voltam para a gravação original (sem a compressão dos silêncios)
+        mapa = prep["mapa_tempos"]
+        for segment in segments:
+            segment["inicio"] = round(mapa.to_original(segment["inicio"] * 1000) / 1000, 2)
+            segment["fim"] = round(mapa.to_original(segment["fim"] * 1000) / 1000, 2)
+        entry["mapa_tempos"] = mapa.to_list()
+        if trace is not None:
+            trace.extras["preprocessamento"] = {
+                k: v for k, v in prep.items() if k not in ("caminho", "mapa_tempos")
+            }
+    else:
+        text, duration, segments = _whisper_request(client, audio_path, audio_bytes, model, chunk_seconds, trace)
+
+    if trace is not None:
+        trace.record_audio(model, duration)
+
+    if cache is not None:
+        entry.update({"text": text, "duracao": duration, "segmentos": segments})
+        cache.set(key, entry)
+    return (text, segments) if with_segments else text
+
+
+def run_prescreen(transcript_text, trace=None):
+    """
+    Pré-triagem local dos itens de script (ver prescreen.py); registra no `trace` o que foi decidido
+    """
+    with _stage(trace, "pretriagem"):
+        decisions = prescreen_transcript(transcript_text)
+    if trace is not None:
+        trace.extras["pretriagem"] = {"itens": sorted(decisions["checklist"]),
+                                      "uso_script": decisions["uso_script"] is not None}
+    return decisions
+
+
+# Análise da transcrição no formato TOON (retorna a resposta bruta)
+def analyze_transcript(client, transcript_text, model=MODELO_GPT, temperature=TEMPERATURA, trace=None,
+                       prescreen=None):
+    with _stage(trace, "chat"):
+        response = client.chat.completions.create(
+            model=model,
+            messages=build_messages(transcript_text, prescreen),
+            temperature=temperature
+        )
+    if trace is not None:
+        trace.record_usage(model, response.usage)
+    return response.choices[0].message.content.strip()
+
+
+def stream_transcript_analysis(client, transcript_text, model=MODELO_GPT, temperature=TEMPERATURA, trace=None,
+                               prescreen=None):
+    """
+    Faz a análise com streaming e gera os trechos de texto da resposta TOON conforme chegam
+    (use com `ToonStreamParser` para obter as seções assim que cada uma termina).
+    Com `trace`, registra o tempo até o primeiro token, o tempo total e o uso de tokens.
+    Com `prescreen`, os itens já decididos não são pedidos ao modelo (ver `prompts.build_prompt`;
+    junte-os com `merge_prescreen`)
+    """
+    return _stream_chat(client, build_messages(transcript_text, prescreen), model, temperature, trace)
+
+
+def _stream_chat(client, messages, model, temperature, trace):
+    inicio = time.perf_counter()
+    stream = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    primeiro = True
+    try:
+        for chunk in stream:
+            if trace is not None and getattr(chunk, "usage", None):
+                trace.record_usage(model, chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                if primeiro and trace is not None:
+                    trace.extras["chat_primeiro_token_s"] = round(time.perf_counter() - inicio, 4)
+                primeiro = False
+                yield chunk.choices[0].delta.content
+    finally:
+        if trace is not None:
+            # Tempo de parede do streaming inteiro (inclui o processamento de cada trecho pelo consumidor)
+            trace.add_time("chat", time.perf_counter() - inicio)
+
+
+def repair_analysis(client, transcript_text, result, analysis, model=MODELO_GPT, temperature=TEMPERATURA,
+                    trace=None, prescreen=None):
+    """
+    Valida a análise parseada (antes da mesclagem da pré-triagem) e, se faltar algo, pede ao
+    modelo só essas partes continuando a mesma conversa (ver repair.py).
+    Retorna (resposta_toon, analise), com o texto do reparo acrescentado à resposta
+    """
+    parts = missing_parts(analysis, *prescreen_omissions(prescreen))
+    if not parts:
+        return result, analysis
+    messages = build_repair_messages(build_messages(transcript_text, prescreen), result, parts)
+    with _stage(trace, "reparo"):
+        response = client.chat.completions.create(model=model, messages=messages, temperature=temperature)
+    if trace is not None:
+        trace.record_usage(model, response.usage)
+    return apply_repair(result, analysis, response.choices[0].message.content.strip(), parts, trace, prescreen)
+
+
+def apply_repair(result, analysis, text, parts, trace=None, prescreen=None):
+    """
+    Mescla a resposta do reparo (`text`) na análise. Retorna (resposta_toon, analise)
+    """
+    with _stage(trace, "parse"):
+        repaired = merge_repair(analysis, parse_toon_response(text), parts)
+    if trace is not None:
+        trace.extras["reparo"] = {"pedido": describe_parts(parts),
+                                  "restante": describe_parts(missing_parts(repaired, *prescreen_omissions(prescreen)))}
+    return f"{result}\n\n{text}", repaired
+
+
+def analysis_steps(transcript_text, model=MODELO_GPT, temperature=TEMPERATURA, cache=None, trace=None,
+                   prescreen=True, repair=True):
+    """
+    Fluxo de `run_analysis` sem as chamadas ao modelo: gerador que produz cada pedido como
+    (etapa, mensagens) e recebe de volta o texto da resposta. Pré-triagem, cache, parser, reparo
+    e mesclagem ficam só aqui; `run_analysis` e `aio.AsyncAnalyzer.analyze` só fazem as
+    requisições (ver `advance_steps`). `prescreen` também aceita as decisões já calculadas.
+    Termina com (resposta_toon, analise)
+    """
+    if isinstance(prescreen, dict):
+        decisions = prescreen
+    else:
+        decisions = run_prescreen(transcript_text, trace) if prescreen else None
+    variant = prescreen_variant(decisions)
+    if cache is not None:
+        cached = cache.get_analysis(transcript_text, model, temperature, variant)
+        if trace is not None:
+            trace.cache["analise"] = cached is not None
+        if cached is not None:
+            return cached
+
+    messages = build_messages(transcript_text, decisions)
+    result = yield "chat", messages
+    with _stage(trace, "parse"):
+        analysis = parse_toon_response(result)
+    parts = missing_parts(analysis, *prescreen_omissions(decisions)) if repair else {}
+    if parts:
+        text = yield "reparo", build_repair_messages(messages, result, parts)
+        result, analysis = apply_repair(result, analysis, text, parts, trace, decisions)
+    completa = not missing_parts(analysis, *prescreen_omissions(decisions))
+    analysis = merge_prescreen(analysis, decisions)
+
+    # Análises ainda incompletas não vão para o cache (a próxima tentativa chama o modelo de novo)
+    if cache is not None and completa:
+        cache.set_analysis(transcript_text, model, temperature, result, analysis, variant)
+    return result, analysis
+
+
+def advance_steps(steps, response=None):
+    """
+    Avança `analysis_steps` com a resposta do pedido anterior (None no início).
+    Retorna (pedido, None) enquanto houver pedidos e (None, (resposta_toon, analise)) no fim
+    """
+    try:
+        return steps.send(response), None
+    except StopIteration as fim:
+        return None, fim.value
+
+
+def _streamed_response(client, messages, model, temperature, trace, decisions, on_event):
+    """
+    Resposta do chat em streaming, passando a `on_event(secao, valor)` cada seção ou linha assim
+    que o `ToonStreamParser` a conclui. A pontuação parcial já inclui os itens da pré-triagem
+    """
+    parser = ToonStreamParser()
+    partes = []
+
+    def emit(events):
+        for section, value in events:
+            if section == "pontuacao_total":
+                value = merge_prescreen(parser.result, decisions).get("pontuacao_total", value)
+            on_event(section, value)
+
+    for delta in _stream_chat(client, messages, model, temperature, trace):
+        partes.append(delta)
+        emit(parser.feed(delta))
+    emit(parser.close())
+    return "".join(partes).strip()
+
+
+def run_analysis(client, transcript_text, model=MODELO_GPT, temperature=TEMPERATURA, cache=None, trace=None,
+                 prescreen=True, repair=True, on_event=None):
+    """
+    Analisa a transcrição e parseia a resposta, consultando o cache de análises se informado.
+    Com `prescreen`, os itens de script decididos localmente não são pedidos ao modelo (ver
+    `prompts.build_prompt`) e são mesclados na análise (um dicionário de decisões é usado como está). Com `repair`, seções ou itens que faltaram na resposta são pedidos de novo
+    em uma requisição curta (ver `repair_analysis`). Retorna (resposta_toon, analise);
+    análises que continuam incompletas não são guardadas no cache.
+    Com `on_event(secao, valor)`, a análise é feita em streaming: os itens da pré-triagem são
+    passados antes da requisição e as seções da resposta assim que cada uma termina (os mesmos
+    eventos de `ToonStreamParser`)
+    """
+    if on_event is not None and prescreen is True:
+        prescreen = run_prescreen(transcript_text, trace)
+    if on_event is not None and isinstance(prescreen, dict):
+        for event in analysis_events(prefilled_analysis(prescreen)):
+            on_event(*event)
+
+    steps = analysis_steps(transcript_text, model, temperature, cache, trace, prescreen, repair)
+    pedido, saida = advance_steps(steps)
+    while pedido is not None:
+        stage, messages = pedido
+        if on_event is not None and stage == "chat":
+            text = _streamed_response(client, messages, model, temperature, trace, prescreen or None, on_event)
+        else:
+            with _stage(trace, stage):
+                response = client.chat.completions.create(model=model, messages=messages, temperature=temperature)
+            if trace is not None:
+                trace.record_usage(model, response.usage)
+            text = response.choices[0].message.content.strip()
+        pedido, saida = advance_steps(steps, text)
+    return saida
+
+
+def analyze_call(client, audio_path, model=MODELO_GPT, pdf_path=None, transcript_cache=None,
+                 analysis_cache=None, trace=None, chunk_seconds=None, preprocess=False, prescreen=True,
+                 cascade=None, windows=False):
+    """
+    Executa o pipeline completo para um arquivo de áudio e retorna um dicionário com
+    a transcrição (e seus segmentos com tempo), a resposta bruta TOON, a análise parseada,
+    o modelo que a produziu e o caminho do PDF (se gerado). Com `cascade` (ver cascade.py),
+    `model` é ignorado e a análise passa pelos níveis da cascata; com `windows`, os itens
+    ligados a um momento da ligação são avaliados só no trecho correspondente (ver windows.py)
+    """
+    transcript_text, segments = transcribe_audio(client, audio_path, cache=transcript_cache, trace=trace,
+                                                 chunk_seconds=chunk_seconds, preprocess=preprocess,
+                                                 with_segments=True)
+    if windows:
+        from .windows import run_windowed_analysis
+
+        result, analysis = run_windowed_analysis(client, transcript_text, segments, model, cache=analysis_cache,
+                                                 trace=trace, prescreen=prescreen)
+    elif cascade is not None:
+        result, analysis, model = cascade.run(client, transcript_text, cache=analysis_cache, trace=trace,
+                                              prescreen=prescreen)
+    else:
+        result, analysis = run_analysis(client, transcript_text, model, cache=analysis_cache, trace=trace,
+                                        prescreen=prescreen)
+
+    if pdf_path:
+        with _stage(trace, "pdf"):
+            pdf_bytes = create_pdf(analysis, transcript_text, model)
+            with open(pdf_path, "wb") as pdf_file:
+                pdf_file.write(pdf_bytes)
+
+    return {
+        "transcricao": transcript_text,
+        "segmentos": segments,
+        "resposta_toon": result,
+        "analise": analysis,
+        "modelo": model,
+        "pdf": pdf_path,
+    }
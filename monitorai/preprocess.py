@@ -0,0 +1,121 @@
+"""
+Pré-processamento do áudio antes do Whisper: mixagem para mono, reamostragem para a banda
+de voz, compressão de silêncios longos e recodificação compacta.
+
+Guarda um mapa de tempos (áudio processado -> original) para que instantes da transcrição
+possam ser levados de volta à gravação original, e informa bytes e segundos economizados.
+"""
+
+import bisect
+import os
+import tempfile
+
+from .chunking import MARGEM_SILENCIO_DB, load_audio
+
+TAXA_AMOSTRAGEM = 16000
+# Silêncios maiores que SILENCIO_LONGO_MS são reduzidos para SILENCIO_MANTIDO_MS
+SILENCIO_LONGO_MS = 1500
+SILENCIO_MANTIDO_MS = 500
+# Opus em ogg é aceito pelo Whisper e é bem menor que mp3 para voz
+FORMATO_SAIDA = "ogg"
+CODEC_SAIDA = "libopus"
+TAXA_SAIDA = "24k"
+
+
+class TimestampMap:
+    """
+    Mapa de tempos do áudio processado para o original: lista de trechos mantidos
+    (inicio_processado_ms, inicio_original_ms, duracao_ms), em ordem
+    """
+
+    def __init__(self, segments):
+        self.segments = [tuple(s) for s in segments]
+        self._starts = [s[0] for s in self.segments]
+
+    def to_original(self, ms):
+        """
+        Converte um instante (ms) do áudio processado para o instante correspondente no original
+        """
+        if not self.segments:
+            return ms
+        index = max(0, bisect.bisect_right(self._starts, ms) - 1)
+        inicio_processado, inicio_original, duracao = self.segments[index]
+        return inicio_original + min(ms - inicio_processado, duracao)
+
+    def to_list(self):
+        return [list(s) for s in self.segments]
+
+    @classmethod
+    def from_list(cls, segments):
+        return cls(segments)
+
+
+def compress_silences(audio, long_ms=SILENCIO_LONGO_MS, keep_ms=SILENCIO_MANTIDO_MS):
+    """
+    Reduz cada silêncio maior que `long_ms` para `keep_ms` (metade antes e metade depois).
+    Retorna (audio_processado, TimestampMap)
+    """
+    from pydub.silence import detect_silence
+
+    silencios = detect_silence(audio, min_silence_len=long_ms,
+                               silence_thresh=audio.dBFS - MARGEM_SILENCIO_DB, seek_step=10)
+    metade = keep_ms // 2
+    trechos = []
+    cursor = 0
+    for inicio, fim in silencios:
+        trechos.append((cursor, inicio + metade))
+        cursor = fim - metade
+    trechos.append((cursor, len(audio)))
+
+    # Junta os bytes uma vez só: somar AudioSegments no laço copia o áudio acumulado a cada trecho
+    partes = []
+    segments = []
+    posicao = 0
+    for inicio, fim in trechos:
+        if fim <= inicio:
+            continue
+        segments.append((posicao, inicio, fim - inicio))
+        partes.append(audio[inicio:fim].raw_data)
+        posicao += fim - inicio
+    return audio._spawn(b"".join(partes)), TimestampMap(segments)
+
+
+def preprocess_audio(audio_path, output_path=None, compress_silence=True):
+    """
+    Gera a versão compacta do áudio e retorna um dicionário com o caminho do arquivo gerado,
+    o mapa de tempos e as estatísticas de economia (bytes e segundos)
+    """
+    audio = load_audio(audio_path)
+    segundos_originais = len(audio) / 1000
+
+    audio = audio.set_channels(1).set_frame_rate(TAXA_AMOSTRAGEM)
+    if compress_silence:
+        audio, mapa = compress_silences(audio)
+    else:
+        mapa = TimestampMap([(0, 0, len(audio))])
+
+    temporario = output_path is None
+    if temporario:
+        fd, output_path = tempfile.mkstemp(suffix=f".{FORMATO_SAIDA}")
+        os.close(fd)
+    try:
+        audio.export(output_path, format=FORMATO_SAIDA, codec=CODEC_SAIDA, bitrate=TAXA_SAIDA)
+    except Exception:
+        # Quem chamou nunca recebe o caminho do temporário, então ele seria esquecido no disco
+        if temporario and os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+
+    bytes_originais = os.path.getsize(audio_path)
+    bytes_processados = os.path.getsize(output_path)
+    segundos_processados = len(audio) / 1000
+    return {
+        "caminho": output_path,
+        "mapa_tempos": mapa,
+        "bytes_originais": bytes_originais,
+        "bytes_processados": bytes_processados,
+        "bytes_economizados": bytes_originais - bytes_processados,
+        "segundos_originais": round(segundos_originais, 3),
+        "segundos_processados": round(segundos_processados, 3),
+        "segundos_economizados": round(segundos_originais - segundos_processados, 3),
+    }
@@ -0,0 +1,276 @@
+"""
+Pré-triagem determinística da transcrição: decide localmente, sem o LLM, os itens de
+conformidade com script fixo (LGPD, encerramento, pesquisa de satisfação e `uso_script`).
+
+As frases conhecidas dos scripts são procuradas na transcrição com um casamento aproximado
+de vários padrões de uma vez (sementes de bigramas de palavras + similaridade de caracteres
+na janela candidata), tolerante a erros de reconhecimento de fala. Só as decisões de alta
+confiança são usadas: o prompt avisa o modelo para não responder esses itens (menos tokens de
+saída), as instruções da rubrica só deles saem do prompt (menos tokens de entrada, sem mudar o
+prefixo em cache; ver prompts.PromptTemplate) e as decisões são mescladas de volta na análise.
+"""
+
+import difflib
+import re
+import unicodedata
+from collections import defaultdict
+
+from .toon import checklist_order
+
+# Similaridade mínima (0-1) para considerar uma frase do script presente
+LIMIAR_PRESENTE = 0.8
+# Abaixo disso a frase é considerada ausente
+LIMIAR_AUSENTE = 0.45
+# Janelas candidatas avaliadas por frase (as mais votadas pelas sementes)
+CANDIDATOS_POR_FRASE = 3
+# Similaridade a partir da qual a busca por uma frase para
+SIMILARIDADE_SUFICIENTE = 0.95
+
+VERSAO_PRETRIAGEM = "1"
+
+# "um"/"uma" ficam de fora: quase sempre são artigos
+_NUMEROS = {"dois": "2", "duas": "2", "tres": "3", "quatro": "4", "cinco": "5", "seis": "6", "sete": "7",
+            "oito": "8", "nove": "9", "dez": "10"}
+_NAO_PALAVRA_RE = re.compile(r"[^a-z0-9]+")
+
+# Variações aceitas do script LGPD (item 3), como descritas no prompt
+FRASES_LGPD = (
+    "você permite que a nossa empresa compartilhe o seu telefone com o prestador que irá lhe atender",
+    "podemos compartilhar seu telefone com o prestador que irá realizar o serviço",
+    "seu telefone pode ser informado ao prestador que irá realizar o serviço",
+    "o prestador pode ter acesso ao seu número para realizar o agendamento do serviço",
+    "podemos compartilhar seu telefone com o prestador que irá te atender",
+    "você autoriza o compartilhamento do telefone informado com o prestador que irá te atender",
+    "você autoriza a enviar notificações no telefone whatsapp",
+)
+
+# Trechos do script de encerramento (o valor da franquia varia, então a frase é dividida nele)
+TRECHOS_ENCERRAMENTO = {
+    "links": "o seu atendimento foi gerado e em breve receberá dois links no whatsapp informado "
+             "para acompanhar o pedido e realizar a vistoria",
+    "franquia": "lembrando que o seu atendimento tem uma franquia",
+    "pagamento": "que deverá ser paga no ato do atendimento",
+    "algo_mais": "te ajudo com algo mais",
+    "pesquisa": "ao final do atendimento terá uma pesquisa de satisfação a nota 5 é a máxima tudo bem",
+    "despedida": "agradeço o seu contato tenha um excelente dia",
+}
+
+# Palavras (radicais) cuja ausência total indica que o script nem foi tentado
+PALAVRAS_LGPD = ("compartilh", "prestador", "notifica")
+PALAVRAS_ENCERRAMENTO = ("link", "vistoria", "franquia")
+PALAVRAS_PESQUISA = ("pesquisa",)
+
+
+def normalize_words(text):
+    """
+    Minúsculas, sem acentos e pontuação, números por extenso (de dois a dez) como dígitos
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [_NUMEROS.get(w, w) for w in _NAO_PALAVRA_RE.split(text) if w]
+
+
+class PhraseMatcher:
+    """
+    Casamento aproximado de vários padrões em uma passada pelo texto.
+
+    Cada bigrama de palavras dos padrões aponta para (padrão, posição no padrão). Ao percorrer
+    a transcrição, cada bigrama encontrado vota no início provável de um padrão; só as janelas
+    mais votadas de cada padrão são comparadas caractere a caractere, o que tolera palavras
+    trocadas, omitidas ou mal transcritas
+    """
+
+    def __init__(self, patterns):
+        self.patterns = {name: normalize_words(text) for name, text in patterns.items()}
+        self._index = defaultdict(list)
+        for name, words in self.patterns.items():
+            for offset, bigram in enumerate(zip(words, words[1:])):
+                self._index[bigram].append((name, offset))
+
+    def match(self, words):
+        """
+        Para cada padrão, retorna (similaridade, inicio, fim) da melhor janela em `words`
+        (lista já normalizada); padrões sem nenhuma semente ficam com similaridade 0
+        """
+        votes = defaultdict(lambda: defaultdict(int))
+        index = self._index
+        for i, bigram in enumerate(zip(words, words[1:])):
+            for name, offset in index.get(bigram, ()):
+                votes[name][i - offset] += 1
+
+        best = {name: [0.0, None, None] for name in self.patterns}
+        for name, starts in votes.items():
+            pattern = self.patterns[name]
+            # O padrão fica como segunda sequência: o SequenceMatcher indexa só ela, uma vez
+            matcher = difflib.SequenceMatcher(None, "", " ".join(pattern), autojunk=False)
+            candidatos = sorted(starts.items(), key=lambda kv: -kv[1])[:CANDIDATOS_POR_FRASE]
+            for start, _ in candidatos:
+                # Janela exata primeiro; a folga de uma palavra nas bordas (inserções e omissões)
+                # só é testada se a janela exata já não estiver longe do padrão
+                score = self._score(matcher, words, start, start + len(pattern), best[name])
+                if score is None or score < LIMIAR_AUSENTE:
+                    continue
+                for inicio in (start - 1, start, start + 1):
+                    for fim in (inicio + len(pattern) - 1, inicio + len(pattern), inicio + len(pattern) + 1):
+                        self._score(matcher, words, inicio, fim, best[name])
+                if best[name][0] >= SIMILARIDADE_SUFICIENTE:
+                    break
+        return {name: tuple(m) for name, m in best.items()}
+
+    @staticmethod
+    def _score(matcher, words, inicio, fim, best):
+        """
+        Similaridade da janela words[inicio:fim]; atualiza `best` (lista [score, inicio, fim])
+        se for a melhor até agora. None se a janela é vazia ou não pode superar a melhor
+        """
+        inicio, fim = max(0, inicio), min(len(words), fim)
+        if fim <= inicio:
+            return None
+        matcher.set_seq1(" ".join(words[inicio:fim]))
+        # Limites superiores baratos antes do cálculo completo
+        if matcher.real_quick_ratio() <= best[0] or matcher.quick_ratio() <= best[0]:
+            return None
+        score = matcher.ratio()
+        if score > best[0]:
+            best[:] = [score, inicio, fim]
+        return score
+
+
+_MATCHER = None
+
+
+def _matcher():
+    global _MATCHER
+    if _MATCHER is None:
+        patterns = {f"lgpd_{i}": frase for i, frase in enumerate(FRASES_LGPD)}
+        patterns.update({f"encerramento_{nome}": frase for nome, frase in TRECHOS_ENCERRAMENTO.items()})
+        _MATCHER = PhraseMatcher(patterns)
+    return _MATCHER
+
+
+def _has_any(joined, stems):
+    return any(stem in joined for stem in stems)
+
+
+def prescreen_transcript(transcript_text):
+    """
+    Retorna as decisões de alta confiança:
+    {"checklist": {item: {"resposta", "justificativa", "confianca"}}, "uso_script": dict ou None}
+    Itens não decididos ficam de fora e continuam com o LLM
+    """
+    words = normalize_words(transcript_text)
+    joined = " ".join(words)
+    matches = _matcher().match(words)
+    checklist = {}
+
+    # Item 3: script LGPD
+    variante, lgpd = max(enumerate(matches[f"lgpd_{i}"] for i in range(len(FRASES_LGPD))), key=lambda m: m[1][0])
+    if lgpd[0] >= LIMIAR_PRESENTE:
+        checklist[3] = {"resposta": "sim", "confianca": round(lgpd[0], 3),
+                        "justificativa": f"Pré-triagem: script LGPD verbalizado (variante \"{FRASES_LGPD[variante]}\", "
+                                         f"similaridade {lgpd[0]:.0%})"}
+    elif not _has_any(joined, PALAVRAS_LGPD):
+        checklist[3] = {"resposta": "não", "confianca": 1.0,
+                        "justificativa": "Pré-triagem: nenhuma menção ao compartilhamento do telefone com o prestador"}
+
+    encerramento = {nome: matches[f"encerramento_{nome}"] for nome in TRECHOS_ENCERRAMENTO}
+    presentes = {nome for nome, m in encerramento.items() if m[0] >= LIMIAR_PRESENTE}
+    ausentes = {nome for nome, m in encerramento.items() if m[0] < LIMIAR_AUSENTE}
+
+    # Item 11: encerramento com links de acompanhamento, vistoria e franquia
+    essenciais = {"links", "franquia", "pagamento"}
+    if essenciais <= presentes:
+        confianca = min(encerramento[nome][0] for nome in essenciais)
+        checklist[11] = {"resposta": "sim", "confianca": round(confianca, 3),
+                         "justificativa": "Pré-triagem: informou os links de acompanhamento, a vistoria e a franquia"}
+    elif essenciais <= ausentes and not _has_any(joined, PALAVRAS_ENCERRAMENTO):
+        checklist[11] = {"resposta": "não", "confianca": 1.0,
+                         "justificativa": "Pré-triagem: não mencionou links, vistoria nem franquia"}
+
+    # Item 12: pesquisa de satisfação
+    if "pesquisa" in presentes:
+        checklist[12] = {"resposta": "sim", "confianca": round(encerramento["pesquisa"][0], 3),
+                         "justificativa": "Pré-triagem: orientou sobre a pesquisa de satisfação e a nota máxima"}
+    elif "pesquisa" in ausentes and not _has_any(joined, PALAVRAS_PESQUISA):
+        checklist[12] = {"resposta": "não", "confianca": 1.0,
+                         "justificativa": "Pré-triagem: não mencionou a pesquisa de satisfação"}
+
+    # uso_script: completo só com todos os trechos; "não utilizado" só sem nenhum vestígio
+    uso_script = None
+    if presentes == set(TRECHOS_ENCERRAMENTO):
+        uso_script = {"status": "completo",
+                      "justificativa": "Pré-triagem: todos os trechos do script de encerramento foram encontrados"}
+    elif ausentes == set(TRECHOS_ENCERRAMENTO) and not _has_any(joined, PALAVRAS_ENCERRAMENTO + PALAVRAS_PESQUISA):
+        uso_script = {"status": "não utilizado",
+                      "justificativa": "Pré-triagem: nenhum trecho do script de encerramento foi encontrado"}
+
+    return {"checklist": checklist, "uso_script": uso_script}
+
+
+def prescreen_variant(decisions):
+    """
+    Identifica a variante do prompt usada para estas decisões (None se nada foi decidido),
+    para compor a chave do cache de análises
+    """
+    if not decisions or (not decisions["checklist"] and decisions["uso_script"] is None):
+        return None
+    itens = ",".join(str(item) for item in sorted(decisions["checklist"]))
+    return f"pretriagem:{VERSAO_PRETRIAGEM}:{itens}:{int(decisions['uso_script'] is not None)}"
+
+
+def prescreen_omissions(decisions):
+    """
+    (itens do checklist, uso_script?) que o prompt deixa de pedir ao modelo com estas decisões
+    """
+    if not decisions:
+        return (), False
+    return tuple(sorted(decisions["checklist"])), decisions["uso_script"] is not None
+
+
+def prefilled_analysis(decisions):
+    """
+    Análise parcial só com o que a pré-triagem decidiu (itens no formato do checklist TOON)
+    """
+    from .prompts import checklist_items
+
+    analysis = {}
+    if decisions and decisions["checklist"]:
+        criterios = {item: (criterio, pontos) for item, criterio, pontos in checklist_items()}
+        analysis["checklist"] = [
+            {"item": item, "criterio": criterios[item][0], "pontos": criterios[item][1],
+             "resposta": decision["resposta"], "justificativa": decision["justificativa"]}
+            for item, decision in sorted(decisions["checklist"].items())
+        ]
+    if decisions and decisions["uso_script"] is not None:
+        analysis["uso_script"] = dict(decisions["uso_script"])
+    return analysis
+
+
+def merge_prescreen(analysis, decisions):
+    """
+    Junta as decisões da pré-triagem à análise do LLM (feita com o prompt reduzido):
+    insere os itens na ordem do checklist, define `uso_script` e soma os pontos dos itens
+    pré-preenchidos à pontuação total (que continua 0 se houve critério eliminatório)
+    """
+    prefilled = prefilled_analysis(decisions)
+    if not prefilled:
+        return analysis
+
+    merged = dict(analysis)
+    if "checklist" in prefilled:
+        decididos = {item["item"] for item in prefilled["checklist"]}
+        restantes, repetidos = [], []
+        for item in analysis.get("checklist", []):
+            (repetidos if item.get("item") in decididos else restantes).append(item)
+        merged["checklist"] = sorted(restantes + prefilled["checklist"], key=checklist_order)
+        eliminado = any(c.get("ocorreu") for c in analysis.get("criterios_eliminatorios", []))
+        if "pontuacao_total" in analysis and not (eliminado and analysis["pontuacao_total"] == 0):
+            # Se o modelo avaliou mesmo assim algum item decidido, a nota dele é substituída pela local
+            pontos_repetidos = sum(item.get("pontos") or 0 for item in repetidos
+                                   if str(item.get("resposta", "")).lower() == "sim")
+            merged["pontuacao_total"] = analysis["pontuacao_total"] - pontos_repetidos + sum(
+                item["pontos"] for item in prefilled["checklist"] if item["resposta"] == "sim"
+            )
+    if "uso_script" in prefilled:
+        merged["uso_script"] = prefilled["uso_script"]
+    return merged
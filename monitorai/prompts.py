@@ -0,0 +1,486 @@
+"""
+Prompt de avaliação (formato TOON) usado na análise das ligações.
+"""
+
+import hashlib
+import re
+
+from .prescreen import prescreen_omissions
+
+# Modelo fixo: GPT-4o
+MODELO_GPT = "gpt-4o"
+TEMPERATURA = 0.3
+
+# Versão do template do prompt em uso (ver TEMPLATES). Trocar de versão invalida as análises em cache
+PROMPT_VERSION = "campeao-17-10-25-blocos"
+
+SYSTEM_PROMPT = "Você é um analista especializado em atendimento. Responda APENAS no formato TOON solicitado (valores separados por vírgula), sem texto adicional e sem marcadores de código."
+
+
+class PromptTemplate:
+    """
+    Versão registrada do prompt de avaliação: abertura, rubrica fixa e posição da transcrição.
+
+    Com `transcript_last`, todo o texto fixo (instruções de sistema, abertura e rubrica) vem antes
+    da transcrição e forma um prefixo idêntico byte a byte entre as chamadas, que o provedor
+    reaproveita no cache de prompt (tokens de entrada em cache custam menos). A rubrica nunca
+    é formatada com os dados da ligação. O que a pré-triagem decidiu vai em um aviso depois dela,
+    logo antes da transcrição (ver `_prescreen_notice`). Nos templates com `blocks`, as instruções
+    só de itens que a pré-triagem pode decidir ficam no fim da rubrica, depois do núcleo fixo, e
+    saem do prompt quando todos os itens de que tratam foram decididos: o prompt fica menor e o
+    núcleo continua sendo o mesmo prefixo em todas as variantes
+    """
+
+    def __init__(self, version, opening, packed_opening, rubric, transcript_last=True, closing="", blocks=(),
+                 rubric_end=""):
+        self.version = version
+        self.opening = opening
+        self.packed_opening = packed_opening
+        self.rubric = rubric
+        self.transcript_last = transcript_last
+        self.closing = closing
+        # (itens do checklist e/ou "uso_script" de que o bloco trata, texto do bloco)
+        self.blocks = blocks
+        self.rubric_end = rubric_end
+
+    def render(self, transcript_blocks, omit_items=(), omit_script=False, packed=False):
+        """
+        Monta o prompt com o bloco de transcrição(ões) já formatado (ver `_transcript_block`)
+        """
+        rubric = self.rubric
+        if packed:
+            rubric = rubric.replace(_CABECALHO_FORMATO, _CABECALHO_FORMATO + _INSTRUCAO_AGRUPADA, 1)
+        if self.blocks:
+            decididos = set(omit_items) | ({"uso_script"} if omit_script else set())
+            rubric += "".join(texto for chaves, texto in self.blocks if not chaves <= decididos) + self.rubric_end
+        aviso = _prescreen_notice(set(omit_items), omit_script)
+        opening = self.packed_opening if packed else self.opening
+        if self.transcript_last:
+            return opening + rubric + "\n" + aviso + transcript_blocks + self.closing
+        return opening + transcript_blocks + rubric + ("\n\n" + aviso if aviso else "")
+
+
+# Prompt atualizado com formato TOON e prompt campeão
+def build_prompt(transcript_text, omit_items=(), omit_script=False, version=None):
+    """
+    Monta o prompt de avaliação com o template `version` (padrão: PROMPT_VERSION).
+    `omit_items` (números do checklist) e `omit_script` são os itens e a seção `uso_script` já
+    decididos pela pré-triagem (ver prescreen.py): o aviso depois da rubrica pede ao modelo para
+    não respondê-los, e as instruções só deles saem da rubrica (nos templates com blocos)
+    """
+    return get_template(version).render(_transcript_block(transcript_text), omit_items, omit_script)
+
+
+def _transcript_block(transcript_text, call_id=None):
+    rotulo = "TRANSCRIÇÃO:" if call_id is None else f"TRANSCRIÇÃO [{call_id}]:"
+    return f'{rotulo}\n"""{transcript_text}"""\n\n'
+
+
+# Rubrica do prompt campeão: formato TOON, lógica de pontuação e instruções de avaliação
+RUBRICA_CAMPEAO = """Retorne APENAS no formato TOON (valores separados por vírgula), sem texto adicional antes ou depois:
+
+status_final[3]
+satisfacao, risco, desfecho
+[valores aqui]
+
+checklist[12]
+item, criterio, pontos, resposta, justificativa
+1, Atendeu a ligação prontamente dentro de 5 seg. e utilizou a saudação correta com as técnicas do atendimento encantador?, 10, [sim/não], [justificativa]
+2, Solicitou os dados do cadastro do cliente e pediu 2 telefones para contato nome cpf placa do veículo e endereço?, 6, [sim/não], [justificativa]
+3, O Atendente Verbalizou o script LGPD?, 2, [sim/não], [justificativa]
+4, Repetiu verbalmente pelo menos duas das três informações principais para confirmar que coletou corretamente os dados?, 5, [sim/não], [justificativa]
+5, Escutou atentamente a solicitação do segurado evitando solicitações em duplicidade?, 3, [sim/não], [justificativa]
+6, Compreendeu a solicitação do cliente em linha e demonstrou que entende sobre os serviços da empresa?, 5, [sim/não], [justificativa]
+7, Confirmou as informações completas sobre o dano no veículo?, 10, [sim/não], [justificativa]
+8, Confirmou cidade para o atendimento?, 10, [sim/não], [justificativa]
+9, A comunicação com o cliente foi eficaz sem uso de gírias linguagem inadequada ou conversas paralelas?, 5, [sim/não], [justificativa]
+10, A conduta do analista foi acolhedora com sorriso na voz empatia e desejo verdadeiro em entender e solucionar a solicitação do cliente?, 4, [sim/não], [justificativa]
+11, Realizou o script de encerramento completo informando prazo de validade franquia link de acompanhamento e vistoria?, 15, [sim/não], [justificativa]
+12, Orientou o cliente sobre a pesquisa de satisfação do atendimento?, 6, [sim/não], [justificativa]
+
+criterios_eliminatorios[7]
+criterio, ocorreu, justificativa
+Ofereceu/garantiu algum serviço que o cliente não tinha direito?, [true/false], [justificativa]
+Preencheu ou selecionou o Veículo/peça incorretos?, [true/false], [justificativa]
+Agiu de forma rude grosseira não deixando o cliente falar e/ou se alterou na ligação?, [true/false], [justificativa]
+Encerrou a chamada ou transferiu o cliente sem o seu conhecimento?, [true/false], [justificativa]
+Falou negativamente sobre a Carglass afiliados seguradoras ou colegas de trabalho?, [true/false], [justificativa]
+Forneceu informações incorretas ou fez suposições infundadas sobre garantias serviços ou procedimentos?, [true/false], [justificativa]
+Comentou sobre serviços de terceiros ou orientou o cliente para serviços externos sem autorização?, [true/false], [justificativa]
+
+uso_script[2]
+status, justificativa
+[completo/parcial/não utilizado], [justificativa]
+
+pontuacao_total
+[número]
+
+resumo_geral
+[texto do resumo]
+
+Scoring logic (mandatory):
+*Only add points for items marked as "sim".
+*If the answer is "não", assign 0 points.
+*Never display 81 points by default.
+*Final score = sum of all "sim" items only.
+
+INSTRUÇÕES ADICIONAIS DE AVALIAÇÃO:
+1. TÉCNICA DO ECO (Checklist 4.) - AVALIAÇÃO RIGOROSA E ESPECÍFICA:
+
+MARQUE COMO "SIM" SE QUALQUER UMA DAS CONDIÇÕES ABAIXO FOR ATENDIDA:
+
+### CONDIÇÃO A - SOLETRAÇÃO FONÉTICA (APROVAÇÃO AUTOMÁTICA):
+- O atendente fez soletração fonética de QUALQUER informação principal (placa, telefone ou CPF)
+- Exemplos válidos: "R de rato, W de Washington, F de faca", "rato, sapo, xícara", "A de avião, B de bola"
+- IMPORTANTE: Uma única soletração fonética é suficiente para marcar "SIM"
+
+### CONDIÇÃO B - ECO MÚLTIPLO:
+- O atendente repetiu (completa ou parcialmente) PELO MENOS 2 informações principais:
+  * Placa do veículo
+  * Telefone principal 
+  * CPF
+  * Telefone secundário (quando fornecido)
+
+### CONDIÇÃO C - ECO PARCIAL (APROVAÇÃO FLEXÍVEL):
+- O atendente repetiu parte significativa de uma informação principal
+- Exemplos válidos: 
+  * Cliente: "0800-703-0203" → Atendente: "0203" ✓ (últimos dígitos)
+  * Cliente: "679-997-812" → Atendente: "812" ✓ (parte final)
+  * Cliente: "54-3381-5775" → Atendente: "5775" ✓ (últimos dígitos)
+- IMPORTANTE: Eco parcial de dígitos finais é válido mesmo sem confirmação explícita
+
+### CONDIÇÃO D - ECO INTERROGATIVO CONFIRMADO:
+- O atendente repetiu informação com tom interrogativo E o cliente confirmou
+- Exemplos válidos:
+  * "54-3381-5775?" → Cliente: "Isso"
+  * "É 79150-005?" → Cliente: "Sim"
+
+### FORMAS VÁLIDAS DE ECO (EXEMPLOS ESPECÍFICOS):
+1. **Repetição completa**: "54-3381-5775"
+2. **Repetição parcial**: "0203" (últimos dígitos)
+3. **Soletração fonética**: "R de rato, W de Washington, F de faca"
+4. **Confirmação repetindo**: "É 679-997-812, correto?"
+5. **Eco interrogativo**: "54-99113-0199?"
+
+### NÃO É ECO VÁLIDO:
+- Apenas "ok", "certo", "entendi", "perfeito" sem repetir informação
+- Repetição sem confirmação do cliente quando necessária
+- Eco de informações não principais (nome, endereço sem número)
+
+### INSTRUÇÕES ESPECÍFICAS PARA AVALIAÇÃO:
+1. **PRIORIDADE MÁXIMA**: Se houver soletração fonética, marque "SIM" imediatamente
+2. **ECO PARCIAL É VÁLIDO**: Repetição de 3+ dígitos finais de telefone/CPF é suficiente
+3. **CONTE TELEFONES SEPARADAMENTE**: Telefone principal e secundário são informações distintas
+4. **CONTEXTO IMPORTA**: Eco imediatamente após cliente fornecer informação é mais válido
+
+### CASOS ESPECÍFICOS VERDADEIROS:
+- "R de rato, W de Washington, F de faca, 9, B de bola, 45" → Cliente: "Isso" ✓
+- "54-3381-5775?" → Cliente: "Isso" ✓
+- "0203" (após cliente: "0800-703-0203") ✓ VÁLIDO SEM CONFIRMAÇÃO
+- "É rato, sapo, xícara, seis..." → Cliente: "Isso" ✓
+
+REGRA ESPECIAL PARA ECO PARCIAL: Se o atendente repetir os últimos 3 ou mais dígitos de um telefone ou CPF imediatamente após o cliente fornecê-lo, considere como eco válido, mesmo sem confirmação explícita do cliente.
+
+### NA JUSTIFICATIVA, ESPECIFIQUE:
+- Qual(is) informação(ões) tiveram eco
+- Tipo de eco utilizado (completo, parcial, soletração, interrogativo)
+- Se houve confirmação do cliente
+- Transcrição exata do eco identificado
+
+IMPORTANTE: Esta avaliação deve ser RIGOROSA mas JUSTA. Se houver dúvida entre SIM e NÃO, considere o contexto de confirmação do cliente para decidir.
+
+2. Script LGPD (Checklist 3.): O atendente deve mencionar explicitamente que o telefone será compartilhado com o prestador de serviço, com ênfase em privacidade ou consentimento. As seguintes variações são válidas e devem ser aceitas como equivalentes:
+    2.1 Você permite que a nossa empresa compartilhe o seu telefone com o prestador que irá lhe atender?
+    2.2 Podemos compartilhar seu telefone com o prestador que irá realizar o serviço?
+    2.3 Seu telefone pode ser informado ao prestador que irá realizar o serviço?
+    2.4 O prestador pode ter acesso ao seu número para realizar o agendamento do serviço?
+    2.5 Podemos compartilhar seu telefone com o prestador que irá te atender?
+    2.6 Você autoriza o compartilhamento do telefone informado com o prestador que irá te atender?
+    2.7 Pode considerar como "SIM" caso tenha uma menção informando o seguinte cenário "Você autoriza a enviar notificações no telefone WhatsApp", ou algo similar.
+
+3. Confirmação de histórico: Verifique se há menção explícita ao histórico de utilização do serviço pelo cliente. A simples localização do cliente no sistema NÃO constitui confirmação de histórico.
+
+4. Pontuação: Cada item não realizado deve impactar estritamente a pontuação final. Os pontos máximos de cada item estão indicados entre parênteses - se marcado como "não", zero pontos devem ser atribuídos.
+
+5. Critérios eliminatórios: Avalie com alto rigor - qualquer ocorrência, mesmo que sutil, deve ser marcada.
+
+6. Script de encerramento: Compare literalmente com o modelo fornecido - só marque como "completo" se TODOS os elementos estiverem presentes (validade, franquia, link, pesquisa de satisfação e despedida).
+
+7. SOLICITAÇÃO DE DADOS DO CADASTRO (Checklist 2) - AVALIAÇÃO RIGOROSA E ESPECÍFICA:
+
+MARQUE COMO "SIM" APENAS SE O ATENDENTE SOLICITOU EXPLICITAMENTE TODOS OS 6 DADOS OBRIGATÓRIOS:
+
+### DADOS OBRIGATÓRIOS (6 elementos):
+1. **NOME** do cliente
+2. **CPF** do cliente
+3. **PLACA** do veículo
+4. **ENDEREÇO** do cliente
+5. **TELEFONE PRINCIPAL** (1º telefone)
+6. **TELEFONE SECUNDÁRIO** (2º telefone)
+
+### CRITÉRIO DE "SOLICITAÇÃO" VÁLIDA:
+- O atendente deve PERGUNTAR/PEDIR explicitamente cada dado
+- Exemplos válidos de solicitação:
+  * "Qual é o seu nome completo?"
+  * "Pode me informar o seu CPF?"
+  * "Qual a placa do veículo?"
+  * "Qual é o seu endereço?"
+  * "Me passa um telefone para contato?"
+  * "Tem um segundo telefone?"
+
+### NÃO É SOLICITAÇÃO VÁLIDA:
+- Cliente se identificar espontaneamente ("Meu nome é João")
+- Atendente apenas confirmar dados já fornecidos
+- Dados já visíveis no sistema sem confirmação
+- Perguntar "mais algum número?" sem especificar que precisa de 2º telefone
+
+### EXCEÇÃO PARA BRADESCO/SURA/ALD:
+- **CPF e ENDEREÇO** podem ser dispensados APENAS se o atendente CONFIRMAR explicitamente que já estão no sistema
+- Exemplos válidos de dispensa:
+  * "Vejo aqui que já temos seu CPF no sistema"
+  * "Seu endereço já consta aqui no cadastro"
+  * "Localizei seus dados completos no sistema"
+- IMPORTANTE: Simples omissão sem justificativa = FALSO
+
+### TELEFONE SECUNDÁRIO - REGRA ESPECIAL:
+- Deve ser solicitado OBRIGATORIAMENTE para todas as seguradoras
+- "Cliente não tem" ou "só tenho esse" NÃO dispensa a solicitação
+- O atendente deve perguntar explicitamente por um segundo número
+- Exemplo correto: "Quer deixar uma segunda opção de telefone?"
+
+### INSTRUÇÕES ESPECÍFICAS PARA AVALIAÇÃO:
+1. **CONTE CADA DADO INDIVIDUALMENTE**: Verifique se cada um dos 6 dados foi solicitado
+2. **SOLICITAÇÃO ≠ CONFIRMAÇÃO**: Repetir dados já fornecidos não é solicitar
+3. **SEJA RIGOROSO**: A ausência de qualquer dado resulta em "NÃO"
+4. **IDENTIFIQUE A SEGURADORA**: Aplique exceção apenas para Bradesco/Sura/ALD
+5. **JUSTIFIQUE ESPECIFICAMENTE**: Liste quais dados faltaram
+
+### CASOS ESPECÍFICOS DOS ÁUDIOS ANALISADOS:
+- Id89: FALSO (faltaram nome, CPF, endereço - cliente se identificou espontaneamente)
+- Id91: FALSO (faltou 2º telefone - perguntou "mais algum número" mas não insistiu)
+- Id100: FALSO (faltaram CPF, endereço, 2º telefone - Bradesco sem confirmação no sistema)
+
+### REGRA FINAL:
+TODOS os 6 dados devem ser explicitamente solicitados. Para Bradesco/Sura/ALD, CPF e endereço podem ser dispensados apenas se o atendente confirmar que já estão no sistema. A ausência de qualquer dado obrigatório resulta em "NÃO" e 0 pontos.
+
+Critérios Eliminatórios (cada um resulta em 0 pontos se ocorrer):
+- Ofereceu/garantiu algum serviço que o cliente não tinha direito? 
+  Exemplos: Prometer serviços fora da cobertura, dar garantias não previstas no contrato.
+- Preencheu ou selecionou o Veículo/peça incorretos?
+  Exemplos: Registrar modelo diferente do informado, selecionar peça diferente da solicitada.
+- Agiu de forma rude, grosseira, não deixando o cliente falar e/ou se alterou na ligação?
+  Exemplos: Interrupções constantes, tom agressivo, impedir cliente de explicar situação.
+- Encerrou a chamada ou transferiu o cliente sem o seu conhecimento?
+  Exemplos: Desligar abruptamente, transferir sem explicar ou obter consentimento.
+- Falou negativamente sobre a Carglass, afiliados, seguradoras ou colegas de trabalho?
+  Exemplos: Criticar atendimento prévio, fazer comentários pejorativos sobre a empresa.
+- Forneceu informações incorretas ou fez suposições infundadas sobre garantias, serviços ou procedimentos?
+  Exemplos: "Como a lataria já passou para nós, então provavelmente a sua garantia é motor e câmbio" sem ter certeza disso, sugerir que o cliente pode perder a garantia do veículo.
+- Comentou sobre serviços de terceiros ou orientou o cliente para serviços externos sem autorização?
+  Exemplos: Sugerir que o cliente verifique procedimentos com a concessionária primeiro, fazer comparações com outros serviços, discutir políticas de garantia de outras empresas sem necessidade.
+
+ATENÇÃO: Avalie com rigor frases como "Não teria problema em mexer na lataria e o senhor perder a garantia?" ou "provavelmente a sua garantia é motor e câmbio" - estas constituem informações incorretas ou suposições sem confirmação que podem confundir o cliente e são consideradas violações de critérios eliminatórios.
+
+O script correto para a pergunta 12 é:
+"*obrigada por me aguardar! O seu atendimento foi gerado, e em breve receberá dois links no whatsapp informado, para acompanhar o pedido e realizar a vistoria.*
+*Lembrando que o seu atendimento tem uma franquia de XXX que deverá ser paga no ato do atendimento. (****acessórios/RRSM ****- tem uma franquia que será confirmada após a vistoria).*
+*Te ajudo com algo mais?*
+*Ao final do atendimento terá uma pesquisa de Satisfação, a nota 5 é a máxima, tudo bem?*
+*Agradeço o seu contato, tenha um excelente dia!"*
+
+Avalie se o script acima foi utilizado completamente ou não foi utilizado.
+
+IMPORTANTE: Retorne APENAS no formato TOON especificado acima, sem nenhum texto adicional, sem decoradores de código, e sem explicações adicionais.
+"""
+
+_ABERTURA = "\nVocê é um especialista em atendimento ao cliente. "
+
+
+def _cut(text, start, end):
+    """
+    Remove de `text` o bloco que começa em `start` e termina logo antes de `end`
+    """
+    i = text.find(start)
+    j = text.find(end, i)
+    return text if i < 0 or j < 0 else text[:i] + text[j:]
+
+
+def _excerpt(text, start, end):
+    i = text.find(start)
+    return text[i:text.find(end, i)].strip() if i >= 0 else ""
+
+
+# Instruções da rubrica que só valem para itens que a pré-triagem (ou uma janela) pode decidir:
+# (itens de que tratam, início, fim). O último bloco vai até a instrução final da rubrica
+_BLOCOS_DECIDIVEIS = (
+    (frozenset({3}), "2. Script LGPD (Checklist 3.)", "3. Confirmação de histórico"),
+    (frozenset({11, "uso_script"}), "6. Script de encerramento:", "7. SOLICITAÇÃO DE DADOS"),
+    (frozenset({11, 12, "uso_script"}), "O script correto para a pergunta 12 é:", "IMPORTANTE: Retorne APENAS"),
+)
+_FIM_RUBRICA = "IMPORTANTE: Retorne APENAS"
+
+# Rubrica campeã sem esses blocos e sem a instrução final: é o prefixo comum a todas as variantes
+_NUCLEO_CAMPEAO = RUBRICA_CAMPEAO
+for _, _inicio, _fim in _BLOCOS_DECIDIVEIS:
+    _NUCLEO_CAMPEAO = _cut(_NUCLEO_CAMPEAO, _inicio, _fim)
+_NUCLEO_CAMPEAO = _NUCLEO_CAMPEAO[:_NUCLEO_CAMPEAO.find(_FIM_RUBRICA)]
+
+# Templates registrados, por versão. Análises em cache e no histórico guardam a versão usada;
+# para mudar o texto, registre uma versão nova em vez de editar uma existente
+TEMPLATES = {template.version: template for template in (
+    # Layout original, com a transcrição no topo (mantido para reproduzir análises antigas)
+    PromptTemplate(
+        "campeao-17-10-25",
+        opening=_ABERTURA + "Avalie a transcrição a seguir:\n\n",
+        packed_opening=_ABERTURA + "Avalie separadamente cada uma das transcrições a seguir, identificadas por [id]:\n\n",
+        rubric=RUBRICA_CAMPEAO,
+        transcript_last=False,
+    ),
+    # Mesma rubrica com a transcrição no fim: o texto fixo vira um prefixo estável para o cache de prompt
+    PromptTemplate(
+        "campeao-17-10-25-prefixo",
+        opening=_ABERTURA + "Avalie a transcrição que está no final desta mensagem.\n\n",
+        packed_opening=_ABERTURA + "Avalie separadamente cada uma das transcrições que estão no final desta "
+                                   "mensagem, identificadas por [id].\n\n",
+        rubric=RUBRICA_CAMPEAO,
+        closing="Retorne agora APENAS a avaliação no formato TOON especificado acima.\n",
+    ),
+    # Mesmo texto, com as instruções dos itens que a pré-triagem decide no fim da rubrica: elas
+    # saem do prompt quando os itens foram decididos, sem mudar o prefixo em cache
+    PromptTemplate(
+        "campeao-17-10-25-blocos",
+        opening=_ABERTURA + "Avalie a transcrição que está no final desta mensagem.\n\n",
+        packed_opening=_ABERTURA + "Avalie separadamente cada uma das transcrições que estão no final desta "
+                                   "mensagem, identificadas por [id].\n\n",
+        rubric=_NUCLEO_CAMPEAO,
+        closing="Retorne agora APENAS a avaliação no formato TOON especificado acima.\n",
+        blocks=tuple((chaves, _excerpt(RUBRICA_CAMPEAO, inicio, fim) + "\n\n")
+                     for chaves, inicio, fim in _BLOCOS_DECIDIVEIS),
+        rubric_end=RUBRICA_CAMPEAO[RUBRICA_CAMPEAO.find(_FIM_RUBRICA):],
+    ),
+)}
+
+
+def get_template(version=None):
+    """
+    Template registrado para `version` (padrão: PROMPT_VERSION)
+    """
+    return TEMPLATES[version or PROMPT_VERSION]
+
+
+_CABECALHO_FORMATO = "Retorne APENAS no formato TOON (valores separados por vírgula), sem texto adicional antes ou depois:\n"
+_INSTRUCAO_AGRUPADA = ("Para CADA transcrição, na mesma ordem, escreva uma linha registro[id] com o id da transcrição, "
+                       "seguida do bloco TOON completo abaixo avaliado só com aquela transcrição.\n")
+_CHECKLIST_LINE_RE = re.compile(r"^(\d+), (.+), (\d+), \[sim/não\], \[justificativa\]$", re.MULTILINE)
+
+
+def checklist_items():
+    """
+    Itens do checklist como (item, criterio, pontos), extraídos do próprio prompt
+    """
+    return [(int(item), criterio, int(pontos))
+            for item, criterio, pontos in _CHECKLIST_LINE_RE.findall(RUBRICA_CAMPEAO)]
+
+
+def _prescreen_notice(omit_items, omit_script):
+    """
+    Aviso com o que a pré-triagem já decidiu (vazio se nada). Vai depois da rubrica, que fica
+    idêntica em todas as variantes e continua no prefixo em cache do provedor
+    """
+    avisos = []
+    if omit_items:
+        itens = ", ".join(str(item) for item in sorted(omit_items))
+        restantes = len(checklist_items()) - len(omit_items)
+        avisos.append(f"Os itens {itens} do checklist já foram avaliados automaticamente: não os inclua na "
+                      f"resposta (a seção checklist terá {restantes} itens) e calcule a pontuacao_total somando "
+                      f"apenas os itens que você avaliar.")
+    if omit_script:
+        avisos.append("O uso do script de encerramento já foi avaliado automaticamente: não inclua a seção uso_script.")
+    return "".join(f"{aviso}\n" for aviso in avisos) + ("\n" if avisos else "")
+
+
+def build_messages(transcript_text, prescreen=None, version=None):
+    """
+    Monta as mensagens do chat para a análise de uma transcrição. Com `prescreen`
+    (decisões de `prescreen.prescreen_transcript`), o modelo é avisado para não responder os
+    itens já decididos, e as instruções só deles saem da rubrica (ver `build_prompt`)
+    """
+    omit_items, omit_script = prescreen_omissions(prescreen)
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": build_prompt(transcript_text, omit_items, omit_script, version)}
+    ]
+
+
+def build_packed_prompt(transcripts, omit_items=(), omit_script=False, version=None):
+    """
+    Prompt com várias transcrições, identificadas por id, e a rubrica uma única vez.
+    A resposta traz um bloco TOON por transcrição, cada um precedido por `registro[id]`
+    (ver toon.parse_packed_response)
+    """
+    blocos = "".join(_transcript_block(text, call_id) for call_id, text in transcripts)
+    return get_template(version).render(blocos, omit_items, omit_script, packed=True)
+
+
+def build_packed_messages(transcripts, omit_items=(), omit_script=False, version=None):
+    """
+    Mensagens do chat para avaliar várias transcrições (lista de (id, texto)) em uma requisição
+    """
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": build_packed_prompt(transcripts, omit_items, omit_script, version)}
+    ]
+
+
+# Trechos das instruções da rubrica que valem para cada item avaliado em uma janela (ver windows.py)
+_INSTRUCOES_JANELA = {
+    3: (("2. Script LGPD (Checklist 3.)", "3. Confirmação de histórico"),),
+    11: (("6. Script de encerramento:", "7. SOLICITAÇÃO DE DADOS"),
+         ("O script correto para a pergunta 12 é:", "IMPORTANTE: Retorne APENAS")),
+    12: (("O script correto para a pergunta 12 é:", "IMPORTANTE: Retorne APENAS"),),
+}
+_INSTRUCOES_USO_SCRIPT = _INSTRUCOES_JANELA[11]
+ROTULO_JANELA = "TRECHO DA LIGAÇÃO"
+
+
+def build_window_prompt(window_text, items, include_script=False, description="", notes=()):
+    """
+    Prompt que avalia só os itens `items` do checklist (e `uso_script`, se `include_script`)
+    com um trecho da ligação (`window_text`, cada fala com o instante [mm:ss]). Leva apenas
+    as linhas do formato TOON e as instruções da rubrica desses itens; `notes` são fatos já
+    apurados localmente (ex.: o tempo até a primeira fala, para o item 1)
+    """
+    linhas = [re.search(rf"^{item}, .+, \d+, \[sim/não\], \[justificativa\]$", RUBRICA_CAMPEAO, re.MULTILINE).group(0)
+              for item in items]
+    blocos = [f"checklist[{len(linhas)}]\nitem, criterio, pontos, resposta, justificativa\n" + "\n".join(linhas)
+              ] if linhas else []
+    trechos = [trecho for item in items for trecho in _INSTRUCOES_JANELA.get(item, ())]
+    if include_script:
+        blocos.append(_excerpt(RUBRICA_CAMPEAO, "uso_script[2]", "pontuacao_total"))
+        trechos.extend(_INSTRUCOES_USO_SCRIPT)
+    instrucoes = [_excerpt(RUBRICA_CAMPEAO, start, end) for start, end in dict.fromkeys(trechos)]
+    return (
+        _ABERTURA + f"Avalie apenas os itens abaixo, usando o trecho da ligação que está no final desta mensagem "
+                    f"({description}). Cada fala começa com o instante [mm:ss] em que foi dita.\n\n"
+        + _CABECALHO_FORMATO + "\n\n".join(blocos) + "\n\n"
+        + "".join(f"{instrucao}\n\n" for instrucao in instrucoes if instrucao)
+        + "".join(f"{nota}\n" for nota in notes) + "\n"
+        + f'{ROTULO_JANELA}:\n"""{window_text}"""\n\n'
+        + "Retorne agora APENAS a avaliação no formato TOON especificado acima.\n"
+    )
+
+
+def build_window_messages(window_text, items, include_script=False, description="", notes=()):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": build_window_prompt(window_text, items, include_script, description, notes)}
+    ]
+
+
+def rubric_fingerprint(version=None):
+    """
+    Hash do texto fixo do prompt (rubrica + instruções de sistema). Muda automaticamente
+    quando qualquer parte estática do prompt é editada, mesmo sem trocar PROMPT_VERSION
+    """
+    static_text = SYSTEM_PROMPT + build_prompt("", version=version)
+    return hashlib.sha256(static_text.encode("utf-8")).hexdigest()[:16]
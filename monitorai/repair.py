@@ -0,0 +1,146 @@
+"""
+Validação da análise parseada e pedido de reparo só das partes que faltaram.
+
+Quando a resposta TOON vem truncada ou com linhas fora do formato, em vez de refazer a
+análise inteira, `missing_parts` aponta as seções e os itens do checklist ausentes ou
+malformados e `build_repair_messages` continua a mesma conversa (prompt original + resposta
+do modelo) pedindo apenas essas partes, no mesmo formato. `merge_repair` junta o reparo à análise.
+"""
+
+from .prompts import RUBRICA_CAMPEAO, _CABECALHO_FORMATO, checklist_items
+from .toon import checklist_order
+
+SECOES = ("status_final", "checklist", "criterios_eliminatorios", "uso_script", "pontuacao_total", "resumo_geral")
+
+CAMPOS_STATUS = ("satisfacao", "risco", "desfecho")
+RESPOSTAS_VALIDAS = ("sim", "não", "nao")
+
+
+def _skeletons():
+    """
+    Esqueleto TOON de cada seção, como aparece no prompt: {secao: texto}
+    """
+    inicio = RUBRICA_CAMPEAO.index(_CABECALHO_FORMATO) + len(_CABECALHO_FORMATO)
+    formato = RUBRICA_CAMPEAO[inicio:RUBRICA_CAMPEAO.index("Scoring logic")]
+    return {bloco.split("\n", 1)[0].split("[", 1)[0]: bloco
+            for bloco in (b.strip() for b in formato.split("\n\n")) if bloco}
+
+
+ESQUELETOS = _skeletons()
+TOTAL_CRITERIOS = len(ESQUELETOS["criterios_eliminatorios"].split("\n")) - 2
+
+
+def missing_parts(analysis, omit_items=(), omit_script=False):
+    """
+    Partes ausentes ou malformadas da análise: {secao: True}, e para o checklist
+    {"checklist": [itens]}. Itens e `uso_script` omitidos do prompt (pré-triagem) não contam.
+    Dicionário vazio = análise completa
+    """
+    analysis = analysis or {}
+    parts = {}
+
+    status = analysis.get("status_final") or {}
+    if not all(status.get(campo) for campo in CAMPOS_STATUS):
+        parts["status_final"] = True
+
+    respostas = {item.get("item"): str(item.get("resposta", "")).strip().lower()
+                 for item in analysis.get("checklist", [])}
+    itens = [item for item, _, _ in checklist_items()
+             if item not in omit_items and respostas.get(item) not in RESPOSTAS_VALIDAS]
+    if itens:
+        parts["checklist"] = itens
+
+    criterios = analysis.get("criterios_eliminatorios", [])
+    if len(criterios) < TOTAL_CRITERIOS or not all("ocorreu" in c for c in criterios):
+        parts["criterios_eliminatorios"] = True
+
+    if not omit_script and not (analysis.get("uso_script") or {}).get("status"):
+        parts["uso_script"] = True
+
+    # Com itens do checklist faltando, a pontuação do modelo não é confiável: pede de novo
+    if not isinstance(analysis.get("pontuacao_total"), int) or itens:
+        parts["pontuacao_total"] = True
+
+    if not analysis.get("resumo_geral"):
+        parts["resumo_geral"] = True
+    return parts
+
+
+def describe_parts(parts):
+    """
+    Descrição curta das partes, para mensagens e métricas (ex.: "checklist (itens 4, 7), resumo_geral")
+    """
+    descricao = []
+    for secao in SECOES:
+        if secao == "checklist" and secao in parts:
+            descricao.append(f"checklist (itens {', '.join(str(item) for item in parts[secao])})")
+        elif secao in parts:
+            descricao.append(secao)
+    return ", ".join(descricao)
+
+
+def repair_prompt(parts):
+    """
+    Pedido das partes que faltaram, com o esqueleto TOON de cada uma
+    """
+    blocos = []
+    for secao in SECOES:
+        if secao not in parts:
+            continue
+        if secao == "checklist":
+            linhas = {item: f"{item}, {criterio}, {pontos}, [sim/não], [justificativa]"
+                      for item, criterio, pontos in checklist_items()}
+            pedidos = [linhas[item] for item in parts["checklist"]]
+            blocos.append("\n".join([f"checklist[{len(pedidos)}]", "item, criterio, pontos, resposta, justificativa",
+                                     *pedidos]))
+        else:
+            blocos.append(ESQUELETOS[secao])
+    aviso = ("A resposta anterior veio incompleta ou com linhas fora do formato. Retorne APENAS as seções "
+             "abaixo, no mesmo formato TOON, mantendo a avaliação que você já fez e sem repetir as demais seções.")
+    if "pontuacao_total" in parts:
+        aviso += " A pontuacao_total deve somar todos os itens do checklist marcados como \"sim\"."
+    return aviso + "\n\n" + "\n\n".join(blocos)
+
+
+def build_repair_messages(messages, result, parts):
+    """
+    Continua a conversa da análise: mensagens originais, resposta do modelo e o pedido de reparo
+    """
+    return [
+        *messages,
+        {"role": "assistant", "content": result},
+        {"role": "user", "content": repair_prompt(parts)},
+    ]
+
+
+def merge_repair(analysis, repaired, parts):
+    """
+    Junta à análise as partes pedidas que vieram no reparo (itens do checklist por número)
+    """
+    merged = dict(analysis or {})
+    for secao in SECOES:
+        if secao not in parts or secao not in repaired:
+            continue
+        if secao == "checklist":
+            pedidos = set(parts["checklist"])
+            novos = {item["item"]: item for item in repaired["checklist"] if item.get("item") in pedidos}
+            mantidos = [item for item in merged.get("checklist", []) if item.get("item") not in novos]
+            merged["checklist"] = sorted(mantidos + list(novos.values()), key=checklist_order)
+        else:
+            merged[secao] = repaired[secao]
+    return merged
+
+
+def repaired_sections(analysis, parts):
+    """
+    Só as partes reparadas da análise (para exibir os eventos correspondentes)
+    """
+    sections = {}
+    for secao in SECOES:
+        if secao not in parts or secao not in analysis:
+            continue
+        if secao == "checklist":
+            sections[secao] = [item for item in analysis[secao] if item.get("item") in parts["checklist"]]
+        else:
+            sections[secao] = analysis[secao]
+    return sections
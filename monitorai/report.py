@@ -0,0 +1,171 @@
+"""
+Geração do relatório em PDF da análise de atendimento.
+
+`write_report` grava o relatório de uma análise do histórico em disco (um arquivo por id), para
+ser gerado em segundo plano e servido como download em vez de embutido na página.
+O fpdf só é importado ao gerar um relatório.
+"""
+
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from .cache import DEFAULT_CACHE_DIR
+
+DEFAULT_REPORT_DIR = os.path.join(DEFAULT_CACHE_DIR, "relatorios")
+
+# Função para criar PDF
+def create_pdf(analysis, transcript_text, model_name):
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.add_page()
+    
+    # Configurações de fonte
+    pdf.set_font("Arial", "B", 16)
+    
+    # Cabeçalho
+    pdf.set_fill_color(193, 0, 0)
+    pdf.set_text_color(255, 255, 255)
+    pdf.cell(0, 10, "MonitorAI - Relatório de Atendimento", 1, 1, "C", True)
+    pdf.ln(5)
+    
+    # Informações gerais
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 10, f"Data da análise: {datetime.now().strftime('%d/%m/%Y %H:%M')}", 0, 1)
+    pdf.cell(0, 10, f"Modelo utilizado: {model_name}", 0, 1)
+    pdf.ln(5)
+    
+    # Status Final
+    pdf.set_font("Arial", "B", 14)
+    pdf.cell(0, 10, "Status Final", 0, 1)
+    pdf.set_font("Arial", "", 12)
+    final = analysis.get("status_final", {})
+    pdf.cell(0, 10, f"Cliente: {final.get('satisfacao', 'N/A')}", 0, 1)
+    pdf.cell(0, 10, f"Desfecho: {final.get('desfecho', 'N/A')}", 0, 1)
+    pdf.cell(0, 10, f"Risco: {final.get('risco', 'N/A')}", 0, 1)
+    pdf.ln(5)
+    
+    # Script de Encerramento
+    pdf.set_font("Arial", "B", 14)
+    pdf.cell(0, 10, "Script de Encerramento", 0, 1)
+    pdf.set_font("Arial", "", 12)
+    script_info = analysis.get("uso_script", {})
+    pdf.cell(0, 10, f"Status: {script_info.get('status', 'N/A')}", 0, 1)
+    pdf.multi_cell(0, 10, f"Justificativa: {script_info.get('justificativa', 'N/A')}")
+    pdf.ln(5)
+    
+    # Pontuação Total
+    pdf.set_font("Arial", "B", 14)
+    pdf.cell(0, 10, "Pontuação Total", 0, 1)
+    pdf.set_font("Arial", "B", 12)
+    total = analysis.get("pontuacao_total", "N/A")
+    pdf.cell(0, 10, f"{total} pontos de 81", 0, 1)
+    pdf.ln(5)
+    
+    # Resumo Geral
+    pdf.set_font("Arial", "B", 14)
+    pdf.cell(0, 10, "Resumo Geral", 0, 1)
+    pdf.set_font("Arial", "", 12)
+    pdf.multi_cell(0, 10, analysis.get("resumo_geral", "N/A"))
+    pdf.ln(5)
+    
+    # Checklist (nova página)
+    pdf.add_page()
+    pdf.set_font("Arial", "B", 14)
+    pdf.cell(0, 10, "Checklist Técnico", 0, 1)
+    pdf.ln(5)
+    
+    # Itens do checklist
+    checklist = analysis.get("checklist", [])
+    for item in checklist:
+        item_num = item.get('item', '')
+        criterio = item.get('criterio', '')
+        pontos = item.get('pontos', 0)
+        resposta = str(item.get('resposta', ''))
+        justificativa = item.get('justificativa', '')
+        
+        pdf.set_font("Arial", "B", 12)
+        pdf.multi_cell(0, 10, f"{item_num}. {criterio} ({pontos} pts)")
+        pdf.set_font("Arial", "", 12)
+        pdf.cell(0, 10, f"Resposta: {resposta}", 0, 1)
+        pdf.multi_cell(0, 10, f"Justificativa: {justificativa}")
+        pdf.ln(5)
+    
+    # Transcrição na última página
+    pdf.add_page()
+    pdf.set_font("Arial", "B", 14)
+    pdf.cell(0, 10, "Transcrição da Ligação", 0, 1)
+    pdf.set_font("Arial", "", 10)
+    _write_wrapped(pdf, transcript_text, 10)
+    
+    return pdf.output(dest="S").encode("latin1")
+
+
+def _write_wrapped(pdf, text, h):
+    """
+    Mesmo resultado de `multi_cell(0, h, text)` para textos longos (inclusive o texto justificado:
+    espaçamento entre palavras `Tw` em cada linha, menos na última de cada parágrafo), mais rápido:
+    quebra as linhas por palavra somando a tabela de larguras da fonte atual (em C, via map) em vez
+    de caractere a caractere. Parágrafos com palavras maiores que a linha ou caracteres fora da
+    tabela vão para o `multi_cell`
+    """
+    larguras = pdf.current_font["cw"]
+    # Largura útil da linha em unidades da fonte (1/1000 do tamanho)
+    largura_maxima = (pdf.w - pdf.r_margin - pdf.l_margin - 2 * pdf.c_margin) * 1000 / pdf.font_size
+    espaco = larguras[" "]
+    # O multi_cell descarta os \r antes de quebrar as linhas
+    for paragrafo in text.replace("\r", "").split("\n"):
+        try:
+            tamanhos = [sum(map(larguras.__getitem__, palavra)) for palavra in paragrafo.split(" ")]
+        except KeyError:
+            tamanhos = None
+        if tamanhos is None or max(tamanhos) > largura_maxima:
+            pdf.multi_cell(0, h, paragrafo)
+            continue
+        palavras = paragrafo.split(" ")
+        inicio, largura = 0, tamanhos[0]
+        for i in range(1, len(palavras)):
+            if largura + espaco + tamanhos[i] > largura_maxima:
+                _justified_line(pdf, h, " ".join(palavras[inicio:i]), largura_maxima - largura, i - inicio - 1)
+                inicio, largura = i, tamanhos[i]
+            else:
+                largura += espaco + tamanhos[i]
+        # Última linha do parágrafo: alinhada à esquerda
+        if pdf.ws > 0:
+            pdf.ws = 0
+            pdf._out("0 Tw")
+        pdf.cell(0, h, " ".join(palavras[inicio:]), 0, 1)
+
+
+def _justified_line(pdf, h, line, folga, espacos):
+    """
+    Linha justificada como no `multi_cell`: distribui a `folga` (unidades da fonte) entre os
+    `espacos` via o operador `Tw` e guarda em `pdf.ws`
+    """
+    pdf.ws = folga / 1000 * pdf.font_size / espacos if espacos > 0 else 0
+    pdf._out("%.3f Tw" % (pdf.ws * pdf.k))
+    pdf.cell(0, h, line, 0, 1)
+
+
+def report_path(analise_id, directory=None):
+    return os.path.join(directory or DEFAULT_REPORT_DIR, f"{analise_id}.pdf")
+
+
+def write_report(analise_id, analysis, transcript_text, model_name, directory=None):
+    """
+    Gera o PDF da análise e grava em `report_path(analise_id)` (escrita atômica). Feito para rodar
+    em um processo em segundo plano. Retorna {"caminho", "bytes", "tempo_s"}
+    """
+    inicio = time.perf_counter()
+    pdf_bytes = create_pdf(analysis, transcript_text, model_name)
+    tempo = time.perf_counter() - inicio
+    path = report_path(analise_id, directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(pdf_bytes)
+    os.replace(tmp_path, path)
+    return {"caminho": path, "bytes": len(pdf_bytes), "tempo_s": round(tempo, 4)}
@@ -0,0 +1,268 @@
+"""
+Armazenamento persistente das análises em SQLite, com índices para consultas rápidas
+por data, pontuação, risco e violação de critérios eliminatórios.
+
+Cada análise vira uma linha em `analises` (campos de `status_final`, `uso_script`,
+pontuação, tempos, custo e a resposta bruta TOON), uma linha por item em `checklist`
+e uma por critério em `eliminatorios`. As transcrições ficam em `transcricoes`,
+uma vez por hash.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from .cache import hash_bytes
+from .models import Analysis, StatusFinal, UsoScript
+
+DEFAULT_DB_PATH = os.environ.get("MONITORAI_DB", "monitorai.db")
+
+# Cada posição é uma migração; PRAGMA user_version guarda quantas já foram aplicadas
+MIGRACOES = [
+    """
+    CREATE TABLE analises (
+        id INTEGER PRIMARY KEY,
+        call_id TEXT,
+        arquivo TEXT,
+        criado_em TEXT NOT NULL,
+        transcricao_hash TEXT NOT NULL,
+        modelo TEXT,
+        prompt_version TEXT,
+        satisfacao TEXT,
+        risco TEXT,
+        desfecho TEXT,
+        script_status TEXT,
+        script_justificativa TEXT,
+        pontuacao_total INTEGER,
+        violou_eliminatorio INTEGER NOT NULL DEFAULT 0,
+        resumo_geral TEXT,
+        tempos TEXT,
+        custo_usd REAL,
+        resposta_toon TEXT
+    );
+    CREATE TABLE checklist (
+        analise_id INTEGER NOT NULL REFERENCES analises(id) ON DELETE CASCADE,
+        item INTEGER,
+        criterio TEXT,
+        pontos INTEGER,
+        resposta TEXT,
+        justificativa TEXT
+    );
+    CREATE TABLE eliminatorios (
+        analise_id INTEGER NOT NULL REFERENCES analises(id) ON DELETE CASCADE,
+        criterio TEXT,
+        ocorreu INTEGER NOT NULL,
+        justificativa TEXT
+    );
+    CREATE TABLE transcricoes (
+        hash TEXT PRIMARY KEY,
+        texto TEXT NOT NULL
+    );
+    CREATE INDEX idx_analises_data ON analises (criado_em);
+    CREATE INDEX idx_analises_pontuacao ON analises (pontuacao_total);
+    CREATE INDEX idx_analises_risco ON analises (risco, criado_em);
+    CREATE INDEX idx_analises_violacao ON analises (criado_em) WHERE violou_eliminatorio = 1;
+    CREATE INDEX idx_analises_transcricao ON analises (transcricao_hash);
+    CREATE INDEX idx_checklist_analise ON checklist (analise_id);
+    CREATE INDEX idx_checklist_item ON checklist (item, resposta);
+    CREATE INDEX idx_eliminatorios_analise ON eliminatorios (analise_id);
+    CREATE INDEX idx_eliminatorios_criterio ON eliminatorios (criterio) WHERE ocorreu = 1;
+    """,
+    """
+    ALTER TABLE analises ADD COLUMN agente TEXT;
+    CREATE INDEX idx_analises_agente ON analises (agente, criado_em);
+    """,
+]
+
+_COLUNAS_RESUMO = ("id", "call_id", "arquivo", "criado_em", "agente", "modelo", "satisfacao", "risco",
+                   "desfecho", "script_status", "pontuacao_total", "violou_eliminatorio", "custo_usd")
+
+
+def _as_datetime_text(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ", timespec="seconds")
+    return str(value)
+
+
+class ResultStore:
+    """
+    Banco SQLite de análises. Uma conexão compartilhada (protegida por lock) serve as
+    threads do mesmo processo; o modo WAL permite leituras simultâneas à escrita de outro processo
+    """
+
+    def __init__(self, path=None):
+        self.path = path or DEFAULT_DB_PATH
+        if self.path != ":memory:" and os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self._migrate()
+
+    def _migrate(self):
+        with self._lock:
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            for i, script in enumerate(MIGRACOES[version:], start=version + 1):
+                self.conn.executescript(f"BEGIN; {script}; PRAGMA user_version = {i}; COMMIT;")
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def save(self, analysis, transcript_text, resposta_toon=None, call_id=None, arquivo=None, model=None,
+             metrics=None, prompt_version=None, agent=None):
+        """
+        Grava uma análise parseada (dicionário ou `models.Analysis`, validada por `Analysis.from_dict`).
+        `metrics` é o `AnalysisTrace.to_dict()` da análise (data, tempos e custo). Retorna o id da análise
+        """
+        from .prompts import PROMPT_VERSION
+
+        metrics = metrics or {}
+        analysis = Analysis.from_dict(analysis)
+        final = analysis.status_final or StatusFinal()
+        script = analysis.uso_script or UsoScript()
+        eliminatorios = analysis.criterios_eliminatorios or []
+        transcricao_hash = hash_bytes(transcript_text.encode("utf-8"))
+        criado_em = _as_datetime_text(metrics.get("inicio")) or _as_datetime_text(datetime.now())
+
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO transcricoes (hash, texto) VALUES (?, ?)",
+                              (transcricao_hash, transcript_text))
+            cursor = self.conn.execute(
+                """
+                INSERT INTO analises (call_id, arquivo, criado_em, agente, transcricao_hash, modelo, prompt_version,
+                                      satisfacao, risco, desfecho, script_status, script_justificativa,
+                                      pontuacao_total, violou_eliminatorio, resumo_geral, tempos, custo_usd,
+                                      resposta_toon)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (call_id, arquivo, criado_em.replace("T", " "), agent, transcricao_hash, model,
+                 prompt_version or PROMPT_VERSION, final.satisfacao, final.risco, final.desfecho,
+                 script.status, script.justificativa, analysis.pontuacao_total, int(analysis.violou_eliminatorio),
+                 analysis.resumo_geral,
+                 json.dumps(metrics.get("etapas_s"), ensure_ascii=False) if metrics.get("etapas_s") else None,
+                 metrics.get("custo_usd"), resposta_toon)
+            )
+            analise_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO checklist (analise_id, item, criterio, pontos, resposta, justificativa) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(analise_id, item.item, item.criterio, item.pontos, item.resposta, item.justificativa)
+                 for item in analysis.checklist or []]
+            )
+            self.conn.executemany(
+                "INSERT INTO eliminatorios (analise_id, criterio, ocorreu, justificativa) VALUES (?, ?, ?, ?)",
+                [(analise_id, c.criterio, int(bool(c.ocorreu)), c.justificativa) for c in eliminatorios]
+            )
+        return analise_id
+
+    def save_record(self, record):
+        """
+        Grava um registro do modo batch (ver `batch.record_output`). Retorna o id ou None se houve erro
+        """
+        if record.get("status") != "ok":
+            return None
+        return self.save(record["analise"], record["transcricao"], record.get("resposta_toon"),
+                         call_id=record.get("id"), arquivo=record.get("arquivo"), model=record.get("modelo"),
+                         metrics=record.get("metricas"), agent=record.get("agente"))
+
+    def find(self, since=None, until=None, risk=None, min_score=None, max_score=None, eliminatory=None,
+             model=None, agent=None, limit=100, offset=0):
+        """
+        Lista resumos de análises (mais recentes primeiro) filtrando por intervalo de datas,
+        agente, risco, faixa de pontuação e violação de critério eliminatório
+        """
+        where, params = self._filters(since, until, risk, min_score, max_score, eliminatory, model, agent)
+        sql = f"SELECT {', '.join(_COLUNAS_RESUMO)} FROM analises"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY criado_em DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        with self._lock:
+            return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def count(self, since=None, until=None, risk=None, min_score=None, max_score=None, eliminatory=None,
+              model=None, agent=None):
+        where, params = self._filters(since, until, risk, min_score, max_score, eliminatory, model, agent)
+        sql = "SELECT COUNT(*) FROM analises"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with self._lock:
+            return self.conn.execute(sql, params).fetchone()[0]
+
+    @staticmethod
+    def _filters(since, until, risk, min_score, max_score, eliminatory, model, agent):
+        where, params = [], []
+        if since is not None:
+            where.append("criado_em >= ?")
+            params.append(_as_datetime_text(since))
+        if until is not None:
+            where.append("criado_em < ?")
+            params.append(_as_datetime_text(until))
+        if risk is not None:
+            where.append("risco = ?")
+            params.append(risk)
+        if min_score is not None:
+            where.append("pontuacao_total >= ?")
+            params.append(min_score)
+        if max_score is not None:
+            where.append("pontuacao_total <= ?")
+            params.append(max_score)
+        if eliminatory is not None:
+            # Literal (e não parâmetro) para que o SQLite possa usar o índice parcial
+            where.append("violou_eliminatorio = 1" if eliminatory else "violou_eliminatorio = 0")
+        if model is not None:
+            where.append("modelo = ?")
+            params.append(model)
+        if agent is not None:
+            where.append("agente = ?")
+            params.append(agent)
+        return where, params
+
+    def get(self, analise_id):
+        """
+        Reconstrói a análise completa (mesmo formato de `parse_toon_response`) com a transcrição,
+        a resposta bruta e os metadados. Retorna None se o id não existir
+        """
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM analises WHERE id = ?", (analise_id,)).fetchone()
+            if row is None:
+                return None
+            checklist = self.conn.execute(
+                "SELECT item, criterio, pontos, resposta, justificativa FROM checklist "
+                "WHERE analise_id = ? ORDER BY rowid", (analise_id,)).fetchall()
+            eliminatorios = self.conn.execute(
+                "SELECT criterio, ocorreu, justificativa FROM eliminatorios WHERE analise_id = ? ORDER BY rowid",
+                (analise_id,)).fetchall()
+            texto = self.conn.execute("SELECT texto FROM transcricoes WHERE hash = ?",
+                                      (row["transcricao_hash"],)).fetchone()
+
+        analysis = {
+            "status_final": {"satisfacao": row["satisfacao"], "risco": row["risco"], "desfecho": row["desfecho"]},
+            "checklist": [dict(item) for item in checklist],
+            "criterios_eliminatorios": [{**dict(c), "ocorreu": bool(c["ocorreu"])} for c in eliminatorios],
+            "uso_script": {"status": row["script_status"], "justificativa": row["script_justificativa"]},
+            "pontuacao_total": row["pontuacao_total"],
+            "resumo_geral": row["resumo_geral"],
+        }
+        return {
+            **{key: row[key] for key in _COLUNAS_RESUMO},
+            "prompt_version": row["prompt_version"],
+            "tempos": json.loads(row["tempos"]) if row["tempos"] else None,
+            "resposta_toon": row["resposta_toon"],
+            "transcricao": texto["texto"] if texto else None,
+            "analise": analysis,
+        }
+
+    def delete(self, analise_id):
+        with self._lock, self.conn:
+            return self.conn.execute("DELETE FROM analises WHERE id = ?", (analise_id,)).rowcount > 0
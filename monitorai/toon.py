@@ -0,0 +1,301 @@
+"""
+Parser do formato TOON retornado pela análise do GPT.
+
+O parser percorre o texto uma única vez, linha a linha, com uma máquina de estados
+(`ToonStreamParser`); `parse_toon_response` é só o caso em que o texto inteiro chega de uma vez.
+"""
+
+import re
+
+from .models import as_bool, as_int
+
+# Trechos sem aspas/vírgulas/barras são consumidos de uma vez pelo regex (em C), e o laço
+# em Python só trata os separadores
+_TOKEN_RE = re.compile(r'[^",\\]+|\\"|"|,|\\')
+
+# Cabeçalhos de seção: "nome[N]" para seções tabulares e "nome" para valor/texto livre
+_SECTION_RE = re.compile(
+    r'(status_final|uso_script|checklist|criterios_eliminatorios)\[|(pontuacao_total|resumo_geral)'
+)
+
+# Seções com uma única linha de valores e seções com várias linhas (uma por item)
+SECOES_SIMPLES = ("status_final", "uso_script")
+SECOES_LISTA = ("checklist", "criterios_eliminatorios")
+
+# Evento (EVENTO_REINICIO, motivo) que descarta as seções recebidas até ali: a análise recomeça
+# (ex.: a cascata escalonou para o próximo modelo)
+EVENTO_REINICIO = "reinicio"
+
+
+def parse_toon_line(line):
+    """
+    Parseia uma linha TOON respeitando vírgulas dentro de strings.
+
+    Aspas delimitam valores e são removidas; dentro de um valor entre aspas, `""` ou `\\"`
+    representam uma aspa literal.
+    """
+    # Caminho rápido: sem aspas, split nativo
+    if '"' not in line:
+        values = line.split(',')
+        # Vírgula final não gera valor vazio
+        if not values[-1]:
+            values.pop()
+        return [v.strip() for v in values]
+
+    values = []
+    current = []
+    in_quotes = False
+    tokens = _TOKEN_RE.findall(line)
+    n = len(tokens)
+    i = 0
+    while i < n:
+        token = tokens[i]
+        if token == '"':
+            if in_quotes and i + 1 < n and tokens[i + 1] == '"':
+                current.append('"')
+                i += 2
+                continue
+            in_quotes = not in_quotes
+        elif token == ',':
+            if in_quotes:
+                current.append(token)
+            else:
+                values.append(''.join(current).strip())
+                current = []
+        elif token == '\\"':
+            current.append('"')
+        else:
+            current.append(token)
+        i += 1
+
+    # Adicionar último valor
+    if current:
+        values.append(''.join(current).strip())
+
+    return values
+
+
+def _strict_int(value):
+    # Item ou pontos vazios na resposta do modelo são linha fora do formato (vão para `rejected`)
+    if not value:
+        raise ValueError("campo numérico vazio")
+    return as_int(value)
+
+
+def _convert_row(section, item_dict, empty_as_none=False):
+    # Converter tipos apropriados (mesmas regras de models.Analysis.from_dict)
+    to_int = as_int if empty_as_none else _strict_int
+    if section == 'checklist':
+        if 'item' in item_dict:
+            item_dict['item'] = to_int(item_dict['item'])
+        if 'pontos' in item_dict:
+            item_dict['pontos'] = to_int(item_dict['pontos'])
+    elif section == 'criterios_eliminatorios':
+        if 'ocorreu' in item_dict:
+            ocorreu = as_bool(item_dict['ocorreu'])
+            item_dict['ocorreu'] = ocorreu if empty_as_none else bool(ocorreu)
+    return item_dict
+
+
+def checklist_order(item):
+    """
+    Chave de ordenação das linhas do checklist pelo número do item; linhas sem número
+    (item None) vão para o fim
+    """
+    numero = item.get('item')
+    return (numero is None, numero or 0)
+
+
+class ToonStreamParser:
+    """
+    Parser incremental de TOON: recebe os trechos (deltas) da resposta em streaming e
+    devolve eventos (secao, valor) assim que cada seção ou linha de lista é concluída.
+
+    Eventos emitidos:
+        ('status_final', dict) / ('uso_script', dict)
+        ('checklist', item) / ('criterios_eliminatorios', item)  - uma linha por vez
+        ('pontuacao_total', int)
+        ('resumo_geral', str) - no fim do texto (ou ao começar outra seção)
+
+    Ao final, `result` tem o mesmo dicionário que `parse_toon_response` retornaria.
+    Linhas fora do formato (número errado de campos, item ou pontuação não numéricos) não
+    interrompem o parser: ficam em `rejected` como (secao, linha) e a seção segue sem elas
+    (ver repair.missing_parts). Item ou pontos vazios também são rejeitados, a não ser com
+    `empty_as_none`, usado só para ler de volta o TOON gravado por `Analysis.to_toon` (que grava
+    o None vazio)
+    """
+
+    def __init__(self, empty_as_none=False):
+        self.empty_as_none = empty_as_none
+        self.result = {}
+        self._buffer = ""
+        self._state = None
+        self._section = None
+        self._fields = None
+        self._resumo = []
+        self.rejected = []
+
+    def feed(self, delta):
+        """
+        Consome um trecho de texto e retorna a lista de eventos concluídos
+        """
+        events = []
+        if '\n' not in delta:
+            self._buffer += delta
+            return events
+        lines = (self._buffer + delta).split('\n')
+        self._buffer = lines.pop()
+        process_line = self._process_line
+        for line in lines:
+            process_line(line, events)
+        return events
+
+    def close(self):
+        """
+        Processa o que restou no buffer e finaliza a seção aberta. Retorna os últimos eventos
+        """
+        events = []
+        if self._buffer:
+            line, self._buffer = self._buffer, ""
+            self._process_line(line, events)
+        if self._state == 'resumo':
+            while self._resumo and not self._resumo[-1]:
+                self._resumo.pop()
+            self._finish_resumo(events)
+        self._state = None
+        return events
+
+    def _finish_resumo(self, events):
+        self.result['resumo_geral'] = ' '.join(self._resumo)
+        self._resumo = []
+        events.append(('resumo_geral', self.result['resumo_geral']))
+
+    def _process_line(self, raw_line, events):
+        line = raw_line.strip()
+        state = self._state
+
+        if state == 'rows':
+            if line and line[-1] != '[':
+                values = parse_toon_line(raw_line)
+                try:
+                    if len(values) != len(self._fields):
+                        raise ValueError(f"{len(values)} campos em vez de {len(self._fields)}")
+                    item_dict = _convert_row(self._section, dict(zip(self._fields, values)), self.empty_as_none)
+                except ValueError:
+                    self.rejected.append((self._section, line))
+                    return
+                self.result[self._section].append(item_dict)
+                events.append((self._section, item_dict))
+                return
+            self._state = None
+
+        elif state == 'resumo':
+            if not line.endswith('[') and not line.startswith('pontuacao_total'):
+                self._resumo.append(line)
+                return
+            self._finish_resumo(events)
+            self._state = None
+
+        elif state == 'fields':
+            self._fields = [f.strip() for f in raw_line.split(',')]
+            self._state = 'rows' if self._section in SECOES_LISTA else 'values'
+            return
+
+        elif state == 'values':
+            values = parse_toon_line(raw_line)
+            self.result[self._section] = dict(zip(self._fields, values))
+            events.append((self._section, self.result[self._section]))
+            self._state = None
+            return
+
+        elif state == 'score':
+            self._state = None
+            try:
+                pontuacao = as_int(line)
+            except ValueError:
+                pontuacao = None
+            if pontuacao is None:
+                self.rejected.append(('pontuacao_total', line))
+                return
+            self.result['pontuacao_total'] = pontuacao
+            events.append(('pontuacao_total', pontuacao))
+            return
+
+        # Ignorar linhas vazias
+        if not line:
+            return
+
+        # Detectar seções
+        match = _SECTION_RE.match(line)
+        if match is None:
+            return
+        tabular, livre = match.groups()
+        if tabular:
+            self._section = tabular
+            self._state = 'fields'
+            if tabular in SECOES_LISTA:
+                self.result[tabular] = []
+        elif livre == 'pontuacao_total':
+            self._state = 'score'
+        else:
+            self._state = 'resumo'
+            self._resumo = []
+
+
+# Função para parsear resposta em formato TOON
+def parse_toon_response(text, empty_as_none=False):
+    """
+    Converte resposta em formato TOON para estrutura de dicionário Python
+    """
+    parser = ToonStreamParser(empty_as_none)
+    parser.feed(text.strip())
+    parser.close()
+    return parser.result
+
+
+_RECORD_RE = re.compile(r'^registro\[(.+)\][ \t]*$', re.MULTILINE)
+
+
+def split_records(text):
+    """
+    Divide uma resposta com vários registros (`registro[id]` seguido do bloco TOON de cada
+    ligação) em uma lista de (id, texto_do_registro)
+    """
+    headers = list(_RECORD_RE.finditer(text))
+    return [
+        (header.group(1).strip(), text[header.end():headers[i + 1].start() if i + 1 < len(headers) else None].strip())
+        for i, header in enumerate(headers)
+    ]
+
+
+def parse_packed_response(text):
+    """
+    Converte uma resposta com vários registros em {id: (texto_do_registro, analise)}.
+    Registros que falham no parser ficam com `analise` None (para serem reenviados)
+    """
+    records = {}
+    for call_id, record_text in split_records(text):
+        try:
+            analysis = parse_toon_response(record_text)
+        except (ValueError, TypeError):
+            analysis = None
+        records[call_id] = (record_text, analysis)
+    return records
+
+
+def analysis_events(analysis):
+    """
+    Gera, a partir de uma análise já parseada, os mesmos eventos do ToonStreamParser
+    (útil para renderizar uma análise em cache pelo mesmo caminho da resposta em streaming)
+    """
+    for section in ("status_final", "checklist", "criterios_eliminatorios", "uso_script"):
+        if section not in analysis:
+            continue
+        if section in SECOES_LISTA:
+            for item in analysis[section]:
+                yield section, item
+        else:
+            yield section, analysis[section]
+    for section in ("pontuacao_total", "resumo_geral"):
+        if section in analysis:
+            yield section, analysis[section]
@@ -0,0 +1,38 @@
+"""
+Peças pequenas compartilhadas pelos modos em lote (agrupado, offline e exportação): o estado de
+uma ligação entre a transcrição e a análise e a gravação atômica de arquivos.
+"""
+
+import os
+import tempfile
+import time
+
+from .metrics import AnalysisTrace
+
+
+class CallState:
+    """
+    Estado de uma ligação entre a transcrição e a análise
+    """
+
+    def __init__(self, call_id, audio_path, model, metadata):
+        self.inicio = time.perf_counter()
+        self.record = {"id": call_id, "arquivo": audio_path, "modelo": model, **(metadata or {})}
+        self.trace = AnalysisTrace(call_id)
+        self.transcript = None
+        self.decisions = None
+
+    @property
+    def call_id(self):
+        return self.record["id"]
+
+
+def write_atomic(path, data):
+    """
+    Grava `data` (bytes) em `path` por um arquivo temporário no mesmo diretório e `os.replace`:
+    quem lê o arquivo vê o conteúdo antigo ou o novo inteiro, nunca uma gravação pela metade
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
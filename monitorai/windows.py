@@ -0,0 +1,241 @@
+"""
+Análise por janelas de tempo: com os segmentos da transcrição (início e fim de cada fala), os
+grupos da rubrica que dependem de um momento da ligação recebem só o trecho correspondente,
+em vez da transcrição inteira:
+
+- abertura (item 1, saudação, e item 3, LGPD): os primeiros JANELA_ABERTURA_S segundos, mais as
+  falas que mencionam o compartilhamento do telefone (e as vizinhas);
+- encerramento (itens 11 e 12 e `uso_script`): os últimos JANELA_ENCERRAMENTO_S segundos.
+
+A parte de tempo do item 1 ("atendeu dentro de 5 seg.") vem dos segmentos, cujo início é
+aproximado: se a primeira fala começa bem depois de LIMITE_ATENDIMENTO_S (mais MARGEM_TEMPO_S),
+o item é "não" sem consultar o modelo, com confiança CONFIANCA_ATRASO, com ou sem janelas; bem
+antes do limite, a janela de abertura avalia só a saudação. Perto do limite, ou com a primeira
+fala em 0 s (o Whisper não indica o silêncio inicial), o item 1 inteiro fica com o modelo.
+
+Os demais itens e seções vão na requisição principal, com o prompt avisando o que as janelas
+respondem, e sem as instruções da rubrica só desses itens (ver prompts.PromptTemplate). A
+transcrição dela sai sem as janelas dos grupos `exclusiva` (o encerramento só interessa aos itens
+dele); a abertura continua, porque os itens 2 e 4 também dependem dela. As requisições rodam em
+paralelo e as respostas das janelas são mescladas como as decisões da pré-triagem.
+
+Antes de enviar, cada combinação de janelas (nenhuma, uma só ou todas) é comparada pelos tokens
+de entrada estimados da requisição principal mais as janelas, e vai a menor. A combinação vazia
+é a análise normal, que também recebe o "não" do item 1 pelo tempo; sem a janela de abertura, o
+resto do item 1 fica com a requisição principal. Ligações curtas (menos de DURACAO_MINIMA_S) ou
+sem segmentos seguem pela análise normal sem a decisão de tempo.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations
+
+from .aio import TOKENS_RESPOSTA_ESTIMADOS, estimate_tokens
+from .pipeline import _stage, analyze_transcript, repair_analysis, run_analysis, run_prescreen
+from .prescreen import PALAVRAS_LGPD, merge_prescreen, normalize_words, prescreen_variant
+from .prompts import MODELO_GPT, TEMPERATURA, build_messages, build_window_messages
+from .repair import RESPOSTAS_VALIDAS, missing_parts
+from .toon import analysis_events, parse_toon_response
+
+# A saudação acontece nos primeiros segundos; o LGPD é achado pelas palavras, onde estiver
+JANELA_ABERTURA_S = 60
+# O script de encerramento completo é lido em menos de um minuto
+JANELA_ENCERRAMENTO_S = 90
+LIMITE_ATENDIMENTO_S = 5
+# O início dos segmentos do Whisper varia cerca de um segundo: perto do limite, decide o modelo
+MARGEM_TEMPO_S = 1.0
+# Confiança do "não" pelo tempo: o início vem da transcrição, não de um registro da ligação
+CONFIANCA_ATRASO = 0.8
+# Abaixo desta duração as janelas cobririam boa parte da ligação e não compensam
+DURACAO_MINIMA_S = 300
+# Falas vizinhas incluídas em volta de cada menção às palavras do grupo
+CONTEXTO_SEGMENTOS = 1
+
+VERSAO_JANELAS = "3"
+
+GRUPOS = (
+    {"nome": "abertura", "itens": (1, 3), "uso_script": False, "primeiros_s": JANELA_ABERTURA_S,
+     "palavras": PALAVRAS_LGPD, "exclusiva": False,
+     "descricao": f"primeiros {JANELA_ABERTURA_S} segundos e as falas sobre o compartilhamento do telefone"},
+    {"nome": "encerramento", "itens": (11, 12), "uso_script": True, "ultimos_s": JANELA_ENCERRAMENTO_S,
+     "palavras": (), "exclusiva": True, "descricao": f"últimos {JANELA_ENCERRAMENTO_S} segundos"},
+)
+
+
+def format_time(seconds):
+    minutos, segundos = divmod(int(seconds), 60)
+    return f"{minutos:02d}:{segundos:02d}"
+
+
+def window_text(segments):
+    """
+    Trecho da transcrição com o instante de cada fala: "[mm:ss] texto", uma por linha
+    """
+    return "\n".join(f"[{format_time(segment['inicio'])}] {segment['texto']}" for segment in segments)
+
+
+def select_window(segments, group):
+    """
+    Segmentos da janela do grupo, na ordem da ligação
+    """
+    duracao = segments[-1]["fim"]
+    if "ultimos_s" in group:
+        escolhidos = {i for i, segment in enumerate(segments) if segment["fim"] > duracao - group["ultimos_s"]}
+    else:
+        escolhidos = {i for i, segment in enumerate(segments) if segment["inicio"] < group["primeiros_s"]}
+    for i, segment in enumerate(segments):
+        texto = " ".join(normalize_words(segment["texto"]))
+        if any(palavra in texto for palavra in group["palavras"]):
+            escolhidos.update(range(max(0, i - CONTEXTO_SEGMENTOS), min(len(segments), i + CONTEXTO_SEGMENTOS + 1)))
+    return [segments[i] for i in sorted(escolhidos)]
+
+
+def _window_request(client, model, temperature, messages):
+    # Executado em uma thread; o uso de tokens é registrado depois, na thread principal
+    inicio = time.perf_counter()
+    response = client.chat.completions.create(model=model, messages=messages, temperature=temperature)
+    return response, time.perf_counter() - inicio
+
+
+def _window_decisions(text, items, include_script):
+    """
+    Respostas de uma janela no formato das decisões da pré-triagem (só as válidas)
+    """
+    parcial = parse_toon_response(text)
+    checklist = {}
+    for item in parcial.get("checklist", []):
+        resposta = str(item.get("resposta", "")).strip().lower()
+        if item.get("item") in items and resposta in RESPOSTAS_VALIDAS:
+            checklist[item["item"]] = {"resposta": "sim" if resposta == "sim" else "não", "confianca": None,
+                                       "justificativa": item.get("justificativa", "")}
+    uso_script = parcial.get("uso_script") if include_script and (parcial.get("uso_script") or {}).get("status") \
+        else None
+    return checklist, uso_script
+
+
+def _plan(transcript_text, segments, decisions, pedidos):
+    """
+    Requisição principal quando só as janelas `pedidos` são usadas: (pedidos, decisões omitidas do
+    prompt principal, transcrição dele, ids dos segmentos que saem dele, tokens de entrada estimados
+    da principal mais as janelas)
+    """
+    fora = {id(segment) for group, _, _, trecho, _ in pedidos if group["exclusiva"] for segment in trecho}
+    # O prompt principal omite o que a pré-triagem, os tempos e as janelas decidem (só as chaves contam)
+    omitidos = {
+        "checklist": {**decisions["checklist"], **{item: None for _, itens, _, _, _ in pedidos for item in itens}},
+        "uso_script": decisions["uso_script"] if not any(script for _, _, script, _, _ in pedidos) else {},
+    }
+    principal = " ".join(segment["texto"].strip() for segment in segments if id(segment) not in fora) if fora \
+        else transcript_text
+    tokens = sum(estimate_tokens(messages) - TOKENS_RESPOSTA_ESTIMADOS
+                 for messages in [build_messages(principal, omitidos), *(p[-1] for p in pedidos)])
+    return pedidos, omitidos, principal, fora, tokens
+
+
+def run_windowed_analysis(client, transcript_text, segments, model=MODELO_GPT, temperature=TEMPERATURA, cache=None,
+                          trace=None, prescreen=True, on_event=None):
+    """
+    Como `run_analysis`, mas com os grupos de GRUPOS avaliados só nas suas janelas (ver o
+    início do módulo). Retorna (resposta_toon, analise); a resposta junta a principal e as
+    das janelas. `on_event` é repassado à análise normal (streaming); com janelas, as seções
+    vão todas no fim, já mescladas
+    """
+    if not segments or segments[-1]["fim"] < DURACAO_MINIMA_S:
+        return run_analysis(client, transcript_text, model, temperature, cache=cache, trace=trace,
+                            prescreen=prescreen, on_event=on_event)
+
+    prescreened = run_prescreen(transcript_text, trace) if prescreen else {"checklist": {}, "uso_script": None}
+    variant = f"janelas:{VERSAO_JANELAS}:{prescreen_variant(prescreened) or ''}"
+    if cache is not None:
+        cached = cache.get_analysis(transcript_text, model, temperature, variant)
+        if trace is not None:
+            trace.cache["analise"] = cached is not None
+        if cached is not None:
+            return cached
+
+    decisions = {"checklist": dict(prescreened["checklist"]), "uso_script": prescreened["uso_script"]}
+    atraso = segments[0]["inicio"]
+    notas = ()
+    if 1 not in decisions["checklist"]:
+        if atraso > LIMITE_ATENDIMENTO_S + MARGEM_TEMPO_S:
+            decisions["checklist"][1] = {
+                "resposta": "não", "confianca": CONFIANCA_ATRASO,
+                "justificativa": f"Janelas: a primeira fala começa por volta de {atraso:.1f}s, depois do limite de "
+                                 f"{LIMITE_ATENDIMENTO_S}s",
+            }
+        elif 0 < atraso <= LIMITE_ATENDIMENTO_S - MARGEM_TEMPO_S:
+            notas = (f"A primeira fala da ligação começa aos {atraso:.1f}s, dentro do limite de {LIMITE_ATENDIMENTO_S}s: "
+                     f"no item 1, avalie apenas a saudação e as técnicas do atendimento encantador.",)
+
+    candidatos = []
+    for group in GRUPOS:
+        itens = [item for item in group["itens"] if item not in decisions["checklist"]]
+        script = group["uso_script"] and decisions["uso_script"] is None
+        if itens or script:
+            trecho = select_window(segments, group)
+            messages = build_window_messages(window_text(trecho), itens, script, group["descricao"],
+                                             notas if 1 in itens else ())
+            candidatos.append((group, itens, script, trecho, messages))
+
+    # Cada combinação de janelas é comparada pelos tokens de entrada estimados (requisição principal
+    # mais as janelas); a combinação vazia é a análise normal, com as decisões de tempo do item 1
+    planos = [_plan(transcript_text, segments, decisions, escolhidas)
+              for n in range(len(candidatos) + 1) for escolhidas in combinations(candidatos, n)]
+    pedidos, omitidos, principal, fora, estimado = min(planos, key=lambda plano: plano[-1])
+    tokens = {"janelas": estimado, "normal": planos[0][-1]}
+    abertura = any(group["nome"] == "abertura" and 1 in itens for group, itens, *_ in pedidos)
+    if 1 in decisions["checklist"]:
+        origem = "tempo"
+    elif abertura:
+        origem = "janela_com_tempo" if notas else "janela"
+    else:
+        origem = "modelo"
+
+    if not pedidos:
+        if trace is not None:
+            trace.extras["janelas"] = {"desativadas": True, "primeira_fala_s": atraso, "item_1": origem,
+                                       "tokens_entrada_estimados": tokens}
+        return run_analysis(client, transcript_text, model, temperature, cache=cache, trace=trace,
+                            prescreen=decisions, on_event=on_event)
+
+    with ThreadPoolExecutor(max_workers=max(1, len(pedidos))) as executor:
+        futures = [executor.submit(_window_request, client, model, temperature, messages)
+                   for *_, messages in pedidos]
+        result = analyze_transcript(client, principal, model, temperature, trace=trace, prescreen=omitidos)
+        # As janelas rodam junto com a requisição principal: a etapa só conta a espera que passar dela
+        with _stage(trace, "janelas"):
+            respostas = [future.result() for future in futures]
+
+    with _stage(trace, "parse"):
+        analysis = parse_toon_response(result)
+    result, analysis = repair_analysis(client, principal, result, analysis, model, temperature, trace, omitidos)
+
+    resumo = {}
+    textos = [result]
+    for (group, itens, script, trecho, _), (response, segundos) in zip(pedidos, respostas):
+        if trace is not None:
+            trace.record_usage(model, response.usage)
+        text = response.choices[0].message.content.strip()
+        textos.append(text)
+        checklist, uso_script = _window_decisions(text, itens, script)
+        if 1 in checklist and notas:
+            checklist[1]["justificativa"] = f"Primeira fala aos {atraso:.1f}s. {checklist[1]['justificativa']}"
+        decisions["checklist"].update(checklist)
+        if uso_script is not None:
+            decisions["uso_script"] = uso_script
+        resumo[group["nome"]] = {"itens": itens, "uso_script": script, "segmentos": len(trecho),
+                                 "tokens_entrada": getattr(response.usage, "prompt_tokens", None),
+                                 "tempo_s": round(segundos, 3)}
+    if trace is not None:
+        trace.extras["janelas"] = {"primeira_fala_s": atraso, "item_1": origem, "grupos": resumo,
+                                   "tokens_entrada_estimados": tokens, "segmentos_fora_da_principal": len(fora)}
+
+    analysis = merge_prescreen(analysis, decisions)
+    if on_event is not None:
+        for event in analysis_events(analysis):
+            on_event(*event)
+    result = "\n\n".join(textos)
+    # Janelas que não responderam algum item deixam a análise incompleta, e ela não vai para o cache
+    if cache is not None and not missing_parts(analysis):
+        cache.set_analysis(transcript_text, model, temperature, result, analysis, variant)
+    return result, analysis
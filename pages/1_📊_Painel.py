@@ -0,0 +1,112 @@
+import streamlit as st
+# Configurações da página - DEVE ser a primeira chamada Streamlit
+st.set_page_config(page_title="MonitorAI - Painel", page_icon="📊", layout="wide")
+
+from datetime import timedelta
+
+from monitorai import analytics
+from monitorai.store import ResultStore
+
+# Mesmo banco de histórico usado pela página de análise
+@st.cache_resource
+def get_store():
+    return ResultStore()
+
+# Histórico em arrays colunares, carregado uma vez e compartilhado entre sessões e filtros
+# (cache_resource não copia os DataFrames a cada rerun, ao contrário de cache_data)
+@st.cache_resource(ttl=300, show_spinner="Carregando histórico de análises...")
+def load_history():
+    return analytics.load_columns(get_store())
+
+st.markdown("""
+<style>
+h1, h2, h3 {
+    color: #C10000 !important;
+}
+</style>
+""", unsafe_allow_html=True)
+
+st.title("📊 Painel de Supervisão")
+
+if st.sidebar.button("🔄 Recarregar histórico"):
+    load_history.clear()
+
+data = load_history()
+analises = data["analises"]
+
+if analises.empty:
+    st.info("Nenhuma análise salva ainda. As análises feitas na página principal ou no modo batch (--db) aparecem aqui.")
+    st.stop()
+
+# Filtros
+primeira = analises["criado_em"].min().date()
+ultima = analises["criado_em"].max().date()
+periodo = st.sidebar.date_input("Período", value=(primeira, ultima), min_value=primeira, max_value=ultima)
+agentes = st.sidebar.multiselect("Agentes", list(analises["agente"].cat.categories))
+riscos = st.sidebar.multiselect("Risco", list(analises["risco"].cat.categories))
+faixa = st.sidebar.slider("Pontuação", 0, analytics.PONTUACAO_MAXIMA, (0, analytics.PONTUACAO_MAXIMA))
+
+inicio, fim = (periodo[0], periodo[-1]) if periodo else (primeira, ultima)
+mask = analytics.filter_mask(
+    data,
+    since=inicio,
+    until=fim + timedelta(days=1),
+    agents=agentes,
+    risks=riscos,
+    min_score=faixa[0] if faixa[0] > 0 else None,
+    max_score=faixa[1] if faixa[1] < analytics.PONTUACAO_MAXIMA else None,
+)
+
+geral = analytics.overview(data, mask)
+col1, col2, col3 = st.columns(3)
+col1.metric("Ligações", f"{geral['ligacoes']:,}".replace(",", "."))
+col2.metric("Pontuação média", "–" if geral["pontuacao_media"] is None
+            else f"{geral['pontuacao_media']:.1f} / {analytics.PONTUACAO_MAXIMA}")
+col3.metric("Com critério eliminatório", "–" if geral["taxa_eliminatorio"] is None
+            else f"{geral['taxa_eliminatorio']:.1%}")
+
+if not geral["ligacoes"]:
+    st.warning("Nenhuma ligação com os filtros selecionados.")
+    st.stop()
+
+percentual = st.column_config.NumberColumn(format="%.1f%%")
+
+def em_percentual(df, colunas):
+    return df.assign(**{c: df[c] * 100 for c in colunas})
+
+st.subheader("👤 Por agente")
+st.dataframe(
+    em_percentual(analytics.agent_summary(data, mask), ["aprovacao_itens", "taxa_eliminatorio"]),
+    hide_index=True,
+    column_config={
+        "agente": "Agente",
+        "ligacoes": "Ligações",
+        "pontuacao_media": st.column_config.NumberColumn("Pontuação média", format="%.1f"),
+        "pct_maximo": st.column_config.ProgressColumn("% do máximo", min_value=0, max_value=100, format="%.0f%%"),
+        "aprovacao_itens": st.column_config.NumberColumn("Aprovação dos itens", format="%.1f%%"),
+        "taxa_eliminatorio": st.column_config.NumberColumn("Eliminatórios", format="%.1f%%"),
+    },
+)
+
+st.subheader("✅ Aprovação por item do checklist")
+itens = analytics.item_pass_rates(data, mask)
+st.bar_chart(itens.set_index("item")["taxa_aprovacao"])
+with st.expander("Aprovação de cada item por agente"):
+    matriz = analytics.agent_item_matrix(data, mask) * 100
+    matriz.columns = [str(c) for c in matriz.columns]
+    st.dataframe(matriz, column_config={c: percentual for c in matriz.columns})
+
+st.subheader(f"📈 Distribuição das pontuações (máximo {analytics.PONTUACAO_MAXIMA})")
+st.bar_chart(analytics.score_distribution(data, mask).set_index("faixa")["ligacoes"])
+
+st.subheader("⚠️ Critérios eliminatórios")
+eliminatorios = analytics.eliminatory_frequency(data, mask)
+if eliminatorios.empty:
+    st.success("Nenhum critério eliminatório violado nas ligações filtradas.")
+else:
+    st.dataframe(
+        em_percentual(eliminatorios, ["taxa"]),
+        hide_index=True,
+        column_config={"criterio": "Critério", "ocorrencias": "Ocorrências",
+                       "taxa": st.column_config.NumberColumn("% das ligações", format="%.2f%%")},
+    )
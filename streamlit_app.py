@@ -2,230 +2,73 @@ import streamlit as st
 # Configurações da página - DEVE ser a primeira chamada Streamlit
 st.set_page_config(page_title="MonitorAI (TESTE TOON)", page_icon="🔴", layout="centered")
 
-from openai import OpenAI
-import tempfile
-import re
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from fpdf import FPDF
-import base64
 
-# Inicializa o novo cliente da OpenAI
-client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
+from monitorai.cache import AnalysisCache, UploadStore
+from monitorai.cascade import MODELO_RAPIDO, NIVEIS_PADRAO
+from monitorai.jobs import CONCLUIDO, ERRO, NA_FILA, JobQueue, QueueFull, completion_hook
+from monitorai.metrics import ETAPAS, serve_prometheus
+from monitorai.prompts import MODELO_GPT
+from monitorai.store import ResultStore
+from monitorai.toon import analysis_events
 
-# Função para parsear resposta em formato TOON
-def parse_toon_response(text):
-    """
-    Converte resposta em formato TOON para estrutura de dicionário Python
-    """
-    lines = text.strip().split('\n')
-    result = {}
-    current_section = None
-    current_data = []
-    
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-        
-        # Ignorar linhas vazias
-        if not line:
-            i += 1
-            continue
-        
-        # Detectar seções
-        if line.startswith('status_final['):
-            current_section = 'status_final'
-            # Próxima linha tem os campos
-            i += 1
-            fields = [f.strip() for f in lines[i].split(',')]
-            # Próxima linha tem os valores
-            i += 1
-            values = parse_toon_line(lines[i])
-            result['status_final'] = dict(zip(fields, values))
-            
-        elif line.startswith('checklist['):
-            current_section = 'checklist'
-            # Próxima linha tem os campos
-            i += 1
-            fields = [f.strip() for f in lines[i].split(',')]
-            # Próximas linhas têm os valores
-            i += 1
-            checklist_items = []
-            while i < len(lines) and lines[i].strip() and not lines[i].strip().endswith('['):
-                values = parse_toon_line(lines[i])
-                if len(values) == len(fields):
-                    item_dict = dict(zip(fields, values))
-                    # Converter tipos apropriados
-                    if 'item' in item_dict:
-                        item_dict['item'] = int(item_dict['item'])
-                    if 'pontos' in item_dict:
-                        item_dict['pontos'] = int(item_dict['pontos'])
-                    checklist_items.append(item_dict)
-                i += 1
-            result['checklist'] = checklist_items
-            continue
-            
-        elif line.startswith('criterios_eliminatorios['):
-            current_section = 'criterios_eliminatorios'
-            # Próxima linha tem os campos
-            i += 1
-            fields = [f.strip() for f in lines[i].split(',')]
-            # Próximas linhas têm os valores
-            i += 1
-            criterios_items = []
-            while i < len(lines) and lines[i].strip() and not lines[i].strip().endswith('['):
-                values = parse_toon_line(lines[i])
-                if len(values) == len(fields):
-                    item_dict = dict(zip(fields, values))
-                    # Converter boolean
-                    if 'ocorreu' in item_dict:
-                        item_dict['ocorreu'] = item_dict['ocorreu'].lower() in ['true', 'sim', 'yes', '1']
-                    criterios_items.append(item_dict)
-                i += 1
-            result['criterios_eliminatorios'] = criterios_items
-            continue
-            
-        elif line.startswith('uso_script['):
-            current_section = 'uso_script'
-            # Próxima linha tem os campos
-            i += 1
-            fields = [f.strip() for f in lines[i].split(',')]
-            # Próxima linha tem os valores
-            i += 1
-            values = parse_toon_line(lines[i])
-            result['uso_script'] = dict(zip(fields, values))
-            
-        elif line.startswith('pontuacao_total'):
-            i += 1
-            result['pontuacao_total'] = int(lines[i].strip())
-            
-        elif line.startswith('resumo_geral'):
-            i += 1
-            # O resumo pode ter múltiplas linhas até a próxima seção
-            resumo_lines = []
-            while i < len(lines) and not lines[i].strip().endswith('[') and not lines[i].strip().startswith('pontuacao_total'):
-                resumo_lines.append(lines[i].strip())
-                i += 1
-            result['resumo_geral'] = ' '.join(resumo_lines)
-            continue
-            
-        i += 1
-    
-    return result
-
-def parse_toon_line(line):
-    """
-    Parseia uma linha TOON respeitando vírgulas dentro de strings
-    """
-    values = []
-    current_value = ""
-    in_quotes = False
-    
-    for char in line:
-        if char == '"':
-            in_quotes = not in_quotes
-        elif char == ',' and not in_quotes:
-            values.append(current_value.strip())
-            current_value = ""
-        else:
-            current_value += char
-    
-    # Adicionar último valor
-    if current_value:
-        values.append(current_value.strip())
-    
-    return values
-
-# Função para criar PDF
-def create_pdf(analysis, transcript_text, model_name):
-    pdf = FPDF()
-    pdf.add_page()
-    
-    # Configurações de fonte
-    pdf.set_font("Arial", "B", 16)
-    
-    # Cabeçalho
-    pdf.set_fill_color(193, 0, 0)
-    pdf.set_text_color(255, 255, 255)
-    pdf.cell(0, 10, "MonitorAI - Relatório de Atendimento", 1, 1, "C", True)
-    pdf.ln(5)
-    
-    # Informações gerais
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 10, f"Data da análise: {datetime.now().strftime('%d/%m/%Y %H:%M')}", 0, 1)
-    pdf.cell(0, 10, f"Modelo utilizado: {model_name}", 0, 1)
-    pdf.ln(5)
-    
-    # Status Final
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Status Final", 0, 1)
-    pdf.set_font("Arial", "", 12)
-    final = analysis.get("status_final", {})
-    pdf.cell(0, 10, f"Cliente: {final.get('satisfacao', 'N/A')}", 0, 1)
-    pdf.cell(0, 10, f"Desfecho: {final.get('desfecho', 'N/A')}", 0, 1)
-    pdf.cell(0, 10, f"Risco: {final.get('risco', 'N/A')}", 0, 1)
-    pdf.ln(5)
-    
-    # Script de Encerramento
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Script de Encerramento", 0, 1)
-    pdf.set_font("Arial", "", 12)
-    script_info = analysis.get("uso_script", {})
-    pdf.cell(0, 10, f"Status: {script_info.get('status', 'N/A')}", 0, 1)
-    pdf.multi_cell(0, 10, f"Justificativa: {script_info.get('justificativa', 'N/A')}")
-    pdf.ln(5)
-    
-    # Pontuação Total
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Pontuação Total", 0, 1)
-    pdf.set_font("Arial", "B", 12)
-    total = analysis.get("pontuacao_total", "N/A")
-    pdf.cell(0, 10, f"{total} pontos de 81", 0, 1)
-    pdf.ln(5)
-    
-    # Resumo Geral
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Resumo Geral", 0, 1)
-    pdf.set_font("Arial", "", 12)
-    pdf.multi_cell(0, 10, analysis.get("resumo_geral", "N/A"))
-    pdf.ln(5)
-    
-    # Checklist (nova página)
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Checklist Técnico", 0, 1)
-    pdf.ln(5)
-    
-    # Itens do checklist
-    checklist = analysis.get("checklist", [])
-    for item in checklist:
-        item_num = item.get('item', '')
-        criterio = item.get('criterio', '')
-        pontos = item.get('pontos', 0)
-        resposta = str(item.get('resposta', ''))
-        justificativa = item.get('justificativa', '')
-        
-        pdf.set_font("Arial", "B", 12)
-        pdf.multi_cell(0, 10, f"{item_num}. {criterio} ({pontos} pts)")
-        pdf.set_font("Arial", "", 12)
-        pdf.cell(0, 10, f"Resposta: {resposta}", 0, 1)
-        pdf.multi_cell(0, 10, f"Justificativa: {justificativa}")
-        pdf.ln(5)
-    
-    # Transcrição na última página
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Transcrição da Ligação", 0, 1)
-    pdf.set_font("Arial", "", 10)
-    pdf.multi_cell(0, 10, transcript_text)
-    
-    return pdf.output(dest="S").encode("latin1")
-
-# Função para criar link de download do PDF
-def get_pdf_download_link(pdf_bytes, filename):
-    b64 = base64.b64encode(pdf_bytes).decode()
-    href = f'<a href="data:application/pdf;base64,{b64}" download="{filename}">Baixar Relatório em PDF</a>'
-    return href
+# Intervalo (s) entre as consultas à fila enquanto a análise não fica pronta
+INTERVALO_CONSULTA_S = 1.0
+
+# Descarta, uma vez por processo, as análises em cache feitas com outra versão da rubrica
+# (os caches em disco de transcrições e análises são usados pelos processos da fila)
+@st.cache_resource
+def purge_stale_analyses():
+    return AnalysisCache().purge_stale()
+
+purge_stale_analyses()
+
+# Banco SQLite com o histórico de análises (consultas por data, pontuação, risco...)
+@st.cache_resource
+def get_store():
+    return ResultStore()
+
+store = get_store()
+
+# Relatórios PDF gerados em segundo plano, em um processo próprio (fpdf é Python puro e
+# ocuparia a CPU do servidor), e gravados em disco pelo id da análise
+@st.cache_resource
+def get_report_worker():
+    return ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn"))
+
+# Fila de análises compartilhada por todas as sessões: um pool limitado de processos faz a
+# transcrição e a análise, e cada sessão só acompanha o seu job. Ao concluir, a análise vai
+# para o histórico e o PDF é gerado no processo de relatórios (ver jobs.completion_hook)
+@st.cache_resource
+def get_jobs(_store, _reports):
+    return JobQueue(on_done=completion_hook(_store, _reports))
+
+jobs = get_jobs(store, get_report_worker())
+
+# Áudios enviados, gravados uma vez por conteúdo; os sem uso são apagados periodicamente
+@st.cache_resource
+def get_uploads():
+    return UploadStore()
+
+uploads = get_uploads()
+uploads.cleanup()
+
+# Identifica a sessão na fila (rodízio justo entre usuários e limite de jobs por usuário)
+if "usuario" not in st.session_state:
+    st.session_state["usuario"] = uuid.uuid4().hex
+
+# Endpoint Prometheus opcional (MONITORAI_METRICS_PORT), iniciado uma única vez por processo
+@st.cache_resource
+def start_metrics_server(port):
+    return serve_prometheus(port)
+
+if os.environ.get("MONITORAI_METRICS_PORT"):
+    start_metrics_server(int(os.environ["MONITORAI_METRICS_PORT"]))
 
 # Estilo visual
 st.markdown("""
@@ -321,8 +164,113 @@ def get_script_status_class(status):
     else:
         return "script-nao-usado"
 
+# Funções de renderização de cada seção da análise
+def render_status_final(slot, final):
+    slot.markdown(f"""
+    <div class="status-box">
+    <strong>Cliente:</strong> {final.get("satisfacao", "N/A")}<br>
+    <strong>Desfecho:</strong> {final.get("desfecho", "N/A")}<br>
+    <strong>Risco:</strong> {final.get("risco", "N/A")}
+    </div>
+    """, unsafe_allow_html=True)
+
+def render_uso_script(slot, script_info):
+    script_status = script_info.get("status", "Não avaliado")
+    script_class = get_script_status_class(script_status)
+    slot.markdown(f"""
+    <div class="{script_class}">
+    <strong>Status:</strong> {script_status}<br>
+    <strong>Justificativa:</strong> {script_info.get("justificativa", "Não informado")}
+    </div>
+    """, unsafe_allow_html=True)
+
+def render_criterio_eliminatorio(container, criterio):
+    container.markdown(f"""
+    <div class="criterio-eliminatorio">
+    <strong>{criterio.get('criterio')}</strong><br>
+    {criterio.get('justificativa', '')}
+    </div>
+    """, unsafe_allow_html=True)
+
+def render_checklist_item(container, item):
+    resposta = item.get("resposta", "").lower()
+    if resposta == "sim":
+        classe = "criterio-sim"
+        icone = "✅"
+    else:
+        classe = "criterio-nao"
+        icone = "❌"
+
+    container.markdown(f"""
+    <div class="{classe}">
+    {icone} <strong>{item.get('item')}. {item.get('criterio')}</strong> ({item.get('pontos')} pts)<br>
+    <em>{item.get('justificativa')}</em>
+    </div>
+    """, unsafe_allow_html=True)
+
+def render_pontuacao(slot, total):
+    progress_class = get_progress_class(total)
+    with slot.container():
+        st.progress(min(total / 100, 1.0))
+        st.markdown(f"<h3 class='{progress_class}'>{int(total)} pontos de 81</h3>", unsafe_allow_html=True)
+
+def render_resumo(slot, resumo):
+    slot.markdown(f"<div class='result-box'>{resumo}</div>", unsafe_allow_html=True)
+
+def render_analysis(events, complete=True):
+    """
+    Exibe as seções a partir dos eventos (secao, valor) do ToonStreamParser: os parciais do job
+    em andamento ou os da análise pronta (`analysis_events`). Com `complete`, as seções que
+    não vieram na resposta aparecem com os valores padrão
+    """
+    # Espaços reservados de cada seção
+    st.subheader("📋 Status Final")
+    status_slot = st.empty()
+    st.subheader("📝 Script de Encerramento")
+    script_slot = st.empty()
+    st.subheader("⚠️ Critérios Eliminatórios")
+    criterios_box = st.container()
+    st.subheader("✅ Checklist Técnico")
+    score_slot = st.empty()
+    checklist_box = st.expander("Ver Detalhes do Checklist")
+    st.subheader("📝 Resumo Geral")
+    resumo_slot = st.empty()
+
+    recebidas = set()
+    criterios_violados = False
+    for section, value in events:
+        recebidas.add(section)
+        if section == "status_final":
+            render_status_final(status_slot, value)
+        elif section == "uso_script":
+            render_uso_script(script_slot, value)
+        elif section == "criterios_eliminatorios":
+            if value.get("ocorreu", False):
+                criterios_violados = True
+                render_criterio_eliminatorio(criterios_box, value)
+        elif section == "checklist":
+            render_checklist_item(checklist_box, value)
+        elif section == "pontuacao_total":
+            render_pontuacao(score_slot, value)
+        elif section == "resumo_geral":
+            render_resumo(resumo_slot, value)
+
+    if not complete:
+        return
+    # Seções que não vieram na resposta são exibidas com os valores padrão
+    if "status_final" not in recebidas:
+        render_status_final(status_slot, {})
+    if "uso_script" not in recebidas:
+        render_uso_script(script_slot, {})
+    if "pontuacao_total" not in recebidas:
+        render_pontuacao(score_slot, 0)
+    if "resumo_geral" not in recebidas:
+        render_resumo(resumo_slot, None)
+    if not criterios_violados:
+        criterios_box.success("Nenhum critério eliminatório foi violado.")
+
 # Modelo fixo: GPT-4o
-modelo_gpt = "gpt-4o"
+modelo_gpt = MODELO_GPT
 
 # Título
 st.title("MonitorAI - TESTE TOON 🚀")
@@ -333,356 +281,161 @@ st.write("Análise inteligente de ligações: avaliação de atendimento ao clie
 uploaded_file = st.file_uploader("Envie o áudio da ligação (.mp3)", type=["mp3"])
 
 if uploaded_file is not None:
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp:
-        tmp.write(uploaded_file.read())
-        tmp_path = tmp.name
-
     st.audio(uploaded_file, format='audio/mp3')
 
+    agente = st.text_input("Agente responsável pela ligação (opcional, usado no painel de supervisão)")
+
+    preprocessar = st.checkbox(
+        "Pré-processar o áudio antes da transcrição (mono, silêncios longos comprimidos, arquivo compacto)"
+    )
+
+    cascata = st.checkbox(
+        f"Modo cascata: análise inicial com {MODELO_RAPIDO}, {modelo_gpt} só nos casos limítrofes"
+    )
+
+    janelas = st.checkbox(
+        "Avaliar abertura e encerramento só nos trechos da ligação em que acontecem (ligações longas)",
+        help="Não se combina com o modo cascata: com as duas opções marcadas, vale esta."
+    )
+
+    # O áudio é gravado (pelo hash do conteúdo) uma vez por upload, não a cada rerun
+    upload = st.session_state.get("upload")
+    if upload is None or upload["file_id"] != uploaded_file.file_id:
+        inicio_upload = time.perf_counter()
+        digest, path = uploads.save(uploaded_file.getvalue())
+        upload = {"file_id": uploaded_file.file_id, "hash": digest, "path": path,
+                  "tempo_upload": time.perf_counter() - inicio_upload}
+        st.session_state["upload"] = upload
+
     if st.button("🔍 Analisar Atendimento"):
-        # Transcrição via Whisper
-        with st.spinner("Transcrevendo o áudio..."):
-            with open(tmp_path, "rb") as audio_file:
-                transcript = client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file
-                )
-            transcript_text = transcript.text
-
-        with st.expander("Ver transcrição completa"):
-            st.code(transcript_text, language="markdown")
-
-        # Prompt atualizado com formato TOON e prompt campeão
-        prompt = f"""
-Você é um especialista em atendimento ao cliente. Avalie a transcrição a seguir:
-
-TRANSCRIÇÃO:
-\"\"\"{transcript_text}\"\"\"
-
-Retorne APENAS no formato TOON (valores separados por vírgula), sem texto adicional antes ou depois:
-
-status_final[3]
-satisfacao, risco, desfecho
-[valores aqui]
-
-checklist[12]
-item, criterio, pontos, resposta, justificativa
-1, Atendeu a ligação prontamente dentro de 5 seg. e utilizou a saudação correta com as técnicas do atendimento encantador?, 10, [sim/não], [justificativa]
-2, Solicitou os dados do cadastro do cliente e pediu 2 telefones para contato nome cpf placa do veículo e endereço?, 6, [sim/não], [justificativa]
-3, O Atendente Verbalizou o script LGPD?, 2, [sim/não], [justificativa]
-4, Repetiu verbalmente pelo menos duas das três informações principais para confirmar que coletou corretamente os dados?, 5, [sim/não], [justificativa]
-5, Escutou atentamente a solicitação do segurado evitando solicitações em duplicidade?, 3, [sim/não], [justificativa]
-6, Compreendeu a solicitação do cliente em linha e demonstrou que entende sobre os serviços da empresa?, 5, [sim/não], [justificativa]
-7, Confirmou as informações completas sobre o dano no veículo?, 10, [sim/não], [justificativa]
-8, Confirmou cidade para o atendimento?, 10, [sim/não], [justificativa]
-9, A comunicação com o cliente foi eficaz sem uso de gírias linguagem inadequada ou conversas paralelas?, 5, [sim/não], [justificativa]
-10, A conduta do analista foi acolhedora com sorriso na voz empatia e desejo verdadeiro em entender e solucionar a solicitação do cliente?, 4, [sim/não], [justificativa]
-11, Realizou o script de encerramento completo informando prazo de validade franquia link de acompanhamento e vistoria?, 15, [sim/não], [justificativa]
-12, Orientou o cliente sobre a pesquisa de satisfação do atendimento?, 6, [sim/não], [justificativa]
-
-criterios_eliminatorios[7]
-criterio, ocorreu, justificativa
-Ofereceu/garantiu algum serviço que o cliente não tinha direito?, [true/false], [justificativa]
-Preencheu ou selecionou o Veículo/peça incorretos?, [true/false], [justificativa]
-Agiu de forma rude grosseira não deixando o cliente falar e/ou se alterou na ligação?, [true/false], [justificativa]
-Encerrou a chamada ou transferiu o cliente sem o seu conhecimento?, [true/false], [justificativa]
-Falou negativamente sobre a Carglass afiliados seguradoras ou colegas de trabalho?, [true/false], [justificativa]
-Forneceu informações incorretas ou fez suposições infundadas sobre garantias serviços ou procedimentos?, [true/false], [justificativa]
-Comentou sobre serviços de terceiros ou orientou o cliente para serviços externos sem autorização?, [true/false], [justificativa]
-
-uso_script[2]
-status, justificativa
-[completo/parcial/não utilizado], [justificativa]
-
-pontuacao_total
-[número]
-
-resumo_geral
-[texto do resumo]
-
-Scoring logic (mandatory):
-*Only add points for items marked as "sim".
-*If the answer is "não", assign 0 points.
-*Never display 81 points by default.
-*Final score = sum of all "sim" items only.
-
-INSTRUÇÕES ADICIONAIS DE AVALIAÇÃO:
-1. TÉCNICA DO ECO (Checklist 4.) - AVALIAÇÃO RIGOROSA E ESPECÍFICA:
-
-MARQUE COMO "SIM" SE QUALQUER UMA DAS CONDIÇÕES ABAIXO FOR ATENDIDA:
-
-### CONDIÇÃO A - SOLETRAÇÃO FONÉTICA (APROVAÇÃO AUTOMÁTICA):
-- O atendente fez soletração fonética de QUALQUER informação principal (placa, telefone ou CPF)
-- Exemplos válidos: "R de rato, W de Washington, F de faca", "rato, sapo, xícara", "A de avião, B de bola"
-- IMPORTANTE: Uma única soletração fonética é suficiente para marcar "SIM"
-
-### CONDIÇÃO B - ECO MÚLTIPLO:
-- O atendente repetiu (completa ou parcialmente) PELO MENOS 2 informações principais:
-  * Placa do veículo
-  * Telefone principal 
-  * CPF
-  * Telefone secundário (quando fornecido)
-
-### CONDIÇÃO C - ECO PARCIAL (APROVAÇÃO FLEXÍVEL):
-- O atendente repetiu parte significativa de uma informação principal
-- Exemplos válidos: 
-  * Cliente: "0800-703-0203" → Atendente: "0203" ✓ (últimos dígitos)
-  * Cliente: "679-997-812" → Atendente: "812" ✓ (parte final)
-  * Cliente: "54-3381-5775" → Atendente: "5775" ✓ (últimos dígitos)
-- IMPORTANTE: Eco parcial de dígitos finais é válido mesmo sem confirmação explícita
-
-### CONDIÇÃO D - ECO INTERROGATIVO CONFIRMADO:
-- O atendente repetiu informação com tom interrogativo E o cliente confirmou
-- Exemplos válidos:
-  * "54-3381-5775?" → Cliente: "Isso"
-  * "É 79150-005?" → Cliente: "Sim"
-
-### FORMAS VÁLIDAS DE ECO (EXEMPLOS ESPECÍFICOS):
-1. **Repetição completa**: "54-3381-5775"
-2. **Repetição parcial**: "0203" (últimos dígitos)
-3. **Soletração fonética**: "R de rato, W de Washington, F de faca"
-4. **Confirmação repetindo**: "É 679-997-812, correto?"
-5. **Eco interrogativo**: "54-99113-0199?"
-
-### NÃO É ECO VÁLIDO:
-- Apenas "ok", "certo", "entendi", "perfeito" sem repetir informação
-- Repetição sem confirmação do cliente quando necessária
-- Eco de informações não principais (nome, endereço sem número)
-
-### INSTRUÇÕES ESPECÍFICAS PARA AVALIAÇÃO:
-1. **PRIORIDADE MÁXIMA**: Se houver soletração fonética, marque "SIM" imediatamente
-2. **ECO PARCIAL É VÁLIDO**: Repetição de 3+ dígitos finais de telefone/CPF é suficiente
-3. **CONTE TELEFONES SEPARADAMENTE**: Telefone principal e secundário são informações distintas
-4. **CONTEXTO IMPORTA**: Eco imediatamente após cliente fornecer informação é mais válido
-
-### CASOS ESPECÍFICOS VERDADEIROS:
-- "R de rato, W de Washington, F de faca, 9, B de bola, 45" → Cliente: "Isso" ✓
-- "54-3381-5775?" → Cliente: "Isso" ✓
-- "0203" (após cliente: "0800-703-0203") ✓ VÁLIDO SEM CONFIRMAÇÃO
-- "É rato, sapo, xícara, seis..." → Cliente: "Isso" ✓
-
-REGRA ESPECIAL PARA ECO PARCIAL: Se o atendente repetir os últimos 3 ou mais dígitos de um telefone ou CPF imediatamente após o cliente fornecê-lo, considere como eco válido, mesmo sem confirmação explícita do cliente.
-
-### NA JUSTIFICATIVA, ESPECIFIQUE:
-- Qual(is) informação(ões) tiveram eco
-- Tipo de eco utilizado (completo, parcial, soletração, interrogativo)
-- Se houve confirmação do cliente
-- Transcrição exata do eco identificado
-
-IMPORTANTE: Esta avaliação deve ser RIGOROSA mas JUSTA. Se houver dúvida entre SIM e NÃO, considere o contexto de confirmação do cliente para decidir.
-
-2. Script LGPD (Checklist 3.): O atendente deve mencionar explicitamente que o telefone será compartilhado com o prestador de serviço, com ênfase em privacidade ou consentimento. As seguintes variações são válidas e devem ser aceitas como equivalentes:
-    2.1 Você permite que a nossa empresa compartilhe o seu telefone com o prestador que irá lhe atender?
-    2.2 Podemos compartilhar seu telefone com o prestador que irá realizar o serviço?
-    2.3 Seu telefone pode ser informado ao prestador que irá realizar o serviço?
-    2.4 O prestador pode ter acesso ao seu número para realizar o agendamento do serviço?
-    2.5 Podemos compartilhar seu telefone com o prestador que irá te atender?
-    2.6 Você autoriza o compartilhamento do telefone informado com o prestador que irá te atender?
-    2.7 Pode considerar como "SIM" caso tenha uma menção informando o seguinte cenário "Você autoriza a enviar notificações no telefone WhatsApp", ou algo similar.
-
-3. Confirmação de histórico: Verifique se há menção explícita ao histórico de utilização do serviço pelo cliente. A simples localização do cliente no sistema NÃO constitui confirmação de histórico.
-
-4. Pontuação: Cada item não realizado deve impactar estritamente a pontuação final. Os pontos máximos de cada item estão indicados entre parênteses - se marcado como "não", zero pontos devem ser atribuídos.
-
-5. Critérios eliminatórios: Avalie com alto rigor - qualquer ocorrência, mesmo que sutil, deve ser marcada.
-
-6. Script de encerramento: Compare literalmente com o modelo fornecido - só marque como "completo" se TODOS os elementos estiverem presentes (validade, franquia, link, pesquisa de satisfação e despedida).
-
-7. SOLICITAÇÃO DE DADOS DO CADASTRO (Checklist 2) - AVALIAÇÃO RIGOROSA E ESPECÍFICA:
-
-MARQUE COMO "SIM" APENAS SE O ATENDENTE SOLICITOU EXPLICITAMENTE TODOS OS 6 DADOS OBRIGATÓRIOS:
-
-### DADOS OBRIGATÓRIOS (6 elementos):
-1. **NOME** do cliente
-2. **CPF** do cliente
-3. **PLACA** do veículo
-4. **ENDEREÇO** do cliente
-5. **TELEFONE PRINCIPAL** (1º telefone)
-6. **TELEFONE SECUNDÁRIO** (2º telefone)
-
-### CRITÉRIO DE "SOLICITAÇÃO" VÁLIDA:
-- O atendente deve PERGUNTAR/PEDIR explicitamente cada dado
-- Exemplos válidos de solicitação:
-  * "Qual é o seu nome completo?"
-  * "Pode me informar o seu CPF?"
-  * "Qual a placa do veículo?"
-  * "Qual é o seu endereço?"
-  * "Me passa um telefone para contato?"
-  * "Tem um segundo telefone?"
-
-### NÃO É SOLICITAÇÃO VÁLIDA:
-- Cliente se identificar espontaneamente ("Meu nome é João")
-- Atendente apenas confirmar dados já fornecidos
-- Dados já visíveis no sistema sem confirmação
-- Perguntar "mais algum número?" sem especificar que precisa de 2º telefone
-
-### EXCEÇÃO PARA BRADESCO/SURA/ALD:
-- **CPF e ENDEREÇO** podem ser dispensados APENAS se o atendente CONFIRMAR explicitamente que já estão no sistema
-- Exemplos válidos de dispensa:
-  * "Vejo aqui que já temos seu CPF no sistema"
-  * "Seu endereço já consta aqui no cadastro"
-  * "Localizei seus dados completos no sistema"
-- IMPORTANTE: Simples omissão sem justificativa = FALSO
-
-### TELEFONE SECUNDÁRIO - REGRA ESPECIAL:
-- Deve ser solicitado OBRIGATORIAMENTE para todas as seguradoras
-- "Cliente não tem" ou "só tenho esse" NÃO dispensa a solicitação
-- O atendente deve perguntar explicitamente por um segundo número
-- Exemplo correto: "Quer deixar uma segunda opção de telefone?"
-
-### INSTRUÇÕES ESPECÍFICAS PARA AVALIAÇÃO:
-1. **CONTE CADA DADO INDIVIDUALMENTE**: Verifique se cada um dos 6 dados foi solicitado
-2. **SOLICITAÇÃO ≠ CONFIRMAÇÃO**: Repetir dados já fornecidos não é solicitar
-3. **SEJA RIGOROSO**: A ausência de qualquer dado resulta em "NÃO"
-4. **IDENTIFIQUE A SEGURADORA**: Aplique exceção apenas para Bradesco/Sura/ALD
-5. **JUSTIFIQUE ESPECIFICAMENTE**: Liste quais dados faltaram
-
-### CASOS ESPECÍFICOS DOS ÁUDIOS ANALISADOS:
-- Id89: FALSO (faltaram nome, CPF, endereço - cliente se identificou espontaneamente)
-- Id91: FALSO (faltou 2º telefone - perguntou "mais algum número" mas não insistiu)
-- Id100: FALSO (faltaram CPF, endereço, 2º telefone - Bradesco sem confirmação no sistema)
-
-### REGRA FINAL:
-TODOS os 6 dados devem ser explicitamente solicitados. Para Bradesco/Sura/ALD, CPF e endereço podem ser dispensados apenas se o atendente confirmar que já estão no sistema. A ausência de qualquer dado obrigatório resulta em "NÃO" e 0 pontos.
-
-Critérios Eliminatórios (cada um resulta em 0 pontos se ocorrer):
-- Ofereceu/garantiu algum serviço que o cliente não tinha direito? 
-  Exemplos: Prometer serviços fora da cobertura, dar garantias não previstas no contrato.
-- Preencheu ou selecionou o Veículo/peça incorretos?
-  Exemplos: Registrar modelo diferente do informado, selecionar peça diferente da solicitada.
-- Agiu de forma rude, grosseira, não deixando o cliente falar e/ou se alterou na ligação?
-  Exemplos: Interrupções constantes, tom agressivo, impedir cliente de explicar situação.
-- Encerrou a chamada ou transferiu o cliente sem o seu conhecimento?
-  Exemplos: Desligar abruptamente, transferir sem explicar ou obter consentimento.
-- Falou negativamente sobre a Carglass, afiliados, seguradoras ou colegas de trabalho?
-  Exemplos: Criticar atendimento prévio, fazer comentários pejorativos sobre a empresa.
-- Forneceu informações incorretas ou fez suposições infundadas sobre garantias, serviços ou procedimentos?
-  Exemplos: "Como a lataria já passou para nós, então provavelmente a sua garantia é motor e câmbio" sem ter certeza disso, sugerir que o cliente pode perder a garantia do veículo.
-- Comentou sobre serviços de terceiros ou orientou o cliente para serviços externos sem autorização?
-  Exemplos: Sugerir que o cliente verifique procedimentos com a concessionária primeiro, fazer comparações com outros serviços, discutir políticas de garantia de outras empresas sem necessidade.
-
-ATENÇÃO: Avalie com rigor frases como "Não teria problema em mexer na lataria e o senhor perder a garantia?" ou "provavelmente a sua garantia é motor e câmbio" - estas constituem informações incorretas ou suposições sem confirmação que podem confundir o cliente e são consideradas violações de critérios eliminatórios.
-
-O script correto para a pergunta 12 é:
-"*obrigada por me aguardar! O seu atendimento foi gerado, e em breve receberá dois links no whatsapp informado, para acompanhar o pedido e realizar a vistoria.*
-*Lembrando que o seu atendimento tem uma franquia de XXX que deverá ser paga no ato do atendimento. (****acessórios/RRSM ****- tem uma franquia que será confirmada após a vistoria).*
-*Te ajudo com algo mais?*
-*Ao final do atendimento terá uma pesquisa de Satisfação, a nota 5 é a máxima, tudo bem?*
-*Agradeço o seu contato, tenha um excelente dia!"*
-
-Avalie se o script acima foi utilizado completamente ou não foi utilizado.
-
-IMPORTANTE: Retorne APENAS no formato TOON especificado acima, sem nenhum texto adicional, sem decoradores de código, e sem explicações adicionais.
-"""
-
-        with st.spinner("Analisando a conversa..."):
+        chave = (upload["hash"], modelo_gpt, preprocessar, cascata, janelas)
+        anterior = st.session_state.get("analise")
+        # Um novo clique com o mesmo áudio e as mesmas opções não reenvia o job (exceto após erro)
+        if anterior is None or anterior["chave"] != chave or (anterior["job"] or {}).get("status") == ERRO:
             try:
-                response = client.chat.completions.create(
-                    model=modelo_gpt,
-                    messages=[
-                        {"role": "system", "content": "Você é um analista especializado em atendimento. Responda APENAS no formato TOON solicitado (valores separados por vírgula), sem texto adicional e sem marcadores de código."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.3
+                job_id = jobs.submit(
+                    st.session_state["usuario"],
+                    {"audio_path": upload["path"], "model": modelo_gpt, "api_key": st.secrets["OPENAI_API_KEY"],
+                     "preprocess": preprocessar, "call_id": uploaded_file.name,
+                     "tempo_upload": upload["tempo_upload"], "cascata": NIVEIS_PADRAO if cascata else None,
+                     "janelas": janelas},
+                    meta={"arquivo": uploaded_file.name, "agente": agente.strip() or None},
                 )
-                result = response.choices[0].message.content.strip()
-
-                # Mostrar resultado bruto para depuração
-                with st.expander("Debug - Resposta bruta TOON"):
-                    st.code(result, language="text")
-                
-                # Parsear resposta TOON
-                try:
-                    analysis = parse_toon_response(result)
-                except Exception as parse_error:
-                    st.error(f"Erro ao processar formato TOON: {str(parse_error)}")
-                    st.text_area("Resposta da IA:", value=result, height=300)
-                    st.stop()
-
-                # Status Final
-                st.subheader("📋 Status Final")
-                final = analysis.get("status_final", {})
-                st.markdown(f"""
-                <div class="status-box">
-                <strong>Cliente:</strong> {final.get("satisfacao", "N/A")}<br>
-                <strong>Desfecho:</strong> {final.get("desfecho", "N/A")}<br>
-                <strong>Risco:</strong> {final.get("risco", "N/A")}
-                </div>
-                """, unsafe_allow_html=True)
-
-                # Script de Encerramento
-                st.subheader("📝 Script de Encerramento")
-                script_info = analysis.get("uso_script", {})
-                script_status = script_info.get("status", "Não avaliado")
-                script_class = get_script_status_class(script_status)
-                
-                st.markdown(f"""
-                <div class="{script_class}">
-                <strong>Status:</strong> {script_status}<br>
-                <strong>Justificativa:</strong> {script_info.get("justificativa", "Não informado")}
-                </div>
-                """, unsafe_allow_html=True)
-
-                # Critérios Eliminatórios
-                st.subheader("⚠️ Critérios Eliminatórios")
-                criterios_elim = analysis.get("criterios_eliminatorios", [])
-                criterios_violados = False
-                
-                for criterio in criterios_elim:
-                    if criterio.get("ocorreu", False):
-                        criterios_violados = True
-                        st.markdown(f"""
-                        <div class="criterio-eliminatorio">
-                        <strong>{criterio.get('criterio')}</strong><br>
-                        {criterio.get('justificativa', '')}
-                        </div>
-                        """, unsafe_allow_html=True)
-                
-                if not criterios_violados:
-                    st.success("Nenhum critério eliminatório foi violado.")
-
-                # Checklist
-                st.subheader("✅ Checklist Técnico")
-                checklist = analysis.get("checklist", [])
-                total = analysis.get("pontuacao_total", 0)
-                progress_class = get_progress_class(total)
-                st.progress(min(total / 100, 1.0))
-                st.markdown(f"<h3 class='{progress_class}'>{int(total)} pontos de 81</h3>", unsafe_allow_html=True)
-
-                with st.expander("Ver Detalhes do Checklist"):
-                    for item in checklist:
-                        resposta = item.get("resposta", "").lower()
-                        if resposta == "sim":
-                            classe = "criterio-sim"
-                            icone = "✅"
-                        else:
-                            classe = "criterio-nao"
-                            icone = "❌"
-                        
-                        st.markdown(f"""
-                        <div class="{classe}">
-                        {icone} <strong>{item.get('item')}. {item.get('criterio')}</strong> ({item.get('pontos')} pts)<br>
-                        <em>{item.get('justificativa')}</em>
-                        </div>
-                        """, unsafe_allow_html=True)
-
-                # Resumo
-                st.subheader("📝 Resumo Geral")
-                st.markdown(f"<div class='result-box'>{analysis.get('resumo_geral')}</div>", unsafe_allow_html=True)
-                
-                # Gerar PDF
-                st.subheader("📄 Relatório em PDF")
-                try:
-                    pdf_bytes = create_pdf(analysis, transcript_text, modelo_gpt)
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    filename = f"MonitorAI_Relatorio_{timestamp}.pdf"
-                    st.markdown(get_pdf_download_link(pdf_bytes, filename), unsafe_allow_html=True)
-                except Exception as pdf_error:
-                    st.error(f"Erro ao gerar PDF: {str(pdf_error)}")
-
-            except Exception as e:
-                st.error(f"Erro ao processar a análise: {str(e)}")
-                try:
-                    st.text_area("Resposta da IA:", value=response.choices[0].message.content.strip(), height=300)
-                except:
-                    st.text_area("Não foi possível recuperar a resposta da IA", height=300)
+                st.session_state["analise"] = {"chave": chave, "job_id": job_id, "job": None}
+            except QueueFull as e:
+                st.error(str(e))
+
+# Acompanhamento do job desta sessão; o resultado pronto fica no session_state, então os
+# reruns seguintes (qualquer interação com a página) só o exibem de novo
+analise = st.session_state.get("analise")
+job = analise["job"] if analise else None
+if analise and job is None:
+    job = jobs.status(analise["job_id"])
+    if job is None:
+        st.warning("O resultado desta análise não está mais disponível. Envie o áudio novamente.")
+        del st.session_state["analise"]
+    elif job["status"] in (CONCLUIDO, ERRO):
+        analise["job"] = job
+
+if job is not None and job["status"] not in (CONCLUIDO, ERRO):
+    if job["status"] == NA_FILA:
+        st.info(f"⏳ Na fila: posição {job['posicao']} de {job['na_fila']} "
+                f"({job['executando']} análises em andamento). Aguarde, a página atualiza sozinha.")
+    else:
+        st.info(f"🔍 Transcrevendo e analisando o atendimento... ({job['execucao_s']:.0f}s)")
+        # Seções que o processo da fila já recebeu do streaming (e as decididas pela pré-triagem)
+        if job["parcial"]:
+            render_analysis(job["parcial"], complete=False)
+    time.sleep(INTERVALO_CONSULTA_S)
+    st.rerun()
+
+elif job is not None and job["status"] == ERRO:
+    st.error(f"Erro ao processar a análise: {job['error']}")
+
+elif job is not None:
+    output = job["result"]
+    trace = output["trace"]
+    transcript_text = output["transcricao"]
+    result = output["resposta_toon"]
+    analysis = output["analise"]
+
+    if trace.cache.get("transcricao"):
+        st.caption("⚡ Transcrição recuperada do cache.")
+    if "preprocessamento" in trace.extras:
+        prep = trace.extras["preprocessamento"]
+        st.caption(
+            f"Pré-processamento: {prep['bytes_economizados'] / 1024:.0f} KB e "
+            f"{prep['segundos_economizados']:.0f}s de áudio a menos enviados ao Whisper."
+        )
+
+    with st.expander("Ver transcrição completa"):
+        st.code(transcript_text, language="markdown")
+
+    if trace.cache.get("analise"):
+        st.caption("⚡ Análise recuperada do cache (nenhuma chamada ao GPT).")
+    if "cascata" in trace.extras:
+        niveis = trace.extras["cascata"]["niveis"]
+        if len(niveis) > 1:
+            st.caption(f"🪜 Escalonada de {niveis[0]['modelo']} para {niveis[-1]['modelo']} "
+                       f"({', '.join(niveis[0]['motivos'])}).")
+        else:
+            st.caption(f"🪜 Resultado claro na primeira análise ({niveis[0]['modelo']}), sem escalonamento.")
+    if "janelas" in trace.extras:
+        janelas = trace.extras["janelas"]
+        tempo = "Item 1 decidido pelo tempo. " if janelas["item_1"] == "tempo" else ""
+        if janelas.get("desativadas"):
+            detalhe = "Análise sem janelas: elas não reduziriam os tokens de entrada desta ligação."
+        else:
+            detalhe = "".join(f"{nome.capitalize()} avaliada em {grupo['segmentos']} falas. "
+                              for nome, grupo in janelas["grupos"].items())
+        st.caption(f"🕒 Primeira fala aos {janelas['primeira_fala_s']:.1f}s. {tempo}{detalhe}")
+    if "reparo" in trace.extras:
+        st.caption(f"🔧 A resposta veio incompleta; foram pedidos de novo só: {trace.extras['reparo']['pedido']}.")
+
+    render_analysis(analysis_events(analysis))
+
+    # Mostrar resultado bruto para depuração
+    with st.expander("Debug - Resposta bruta TOON"):
+        st.code(result, language="text")
+
+    # PDF gerado em segundo plano e servido como arquivo (não embutido na página)
+    st.subheader("📄 Relatório em PDF")
+    relatorio = job["meta"].get("pdf")
+    aguardando_pdf = False
+    if relatorio is not None and os.path.exists(relatorio["caminho"]):
+        timestamp = datetime.fromtimestamp(os.path.getmtime(relatorio["caminho"])).strftime("%Y%m%d_%H%M%S")
+        with open(relatorio["caminho"], "rb") as pdf_file:
+            st.download_button("Baixar Relatório em PDF", pdf_file, file_name=f"MonitorAI_Relatorio_{timestamp}.pdf",
+                               mime="application/pdf")
+        st.caption(f"{relatorio['bytes'] / 1024:.0f} KB, gerado em {relatorio['tempo_s']:.2f}s em segundo plano.")
+    elif relatorio is not None:
+        st.warning("O arquivo do relatório não está mais disponível.")
+    elif "erro_pdf" in job["meta"]:
+        st.error(f"Erro ao gerar o PDF: {job['meta']['erro_pdf']}")
+    else:
+        aguardando_pdf = True
+        st.caption("Gerando o relatório...")
+
+    if "erro_historico" in job["meta"]:
+        st.warning(f"Não foi possível salvar a análise no histórico: {job['meta']['erro_historico']}")
+
+    metricas = output.get("metricas") or trace.to_dict()
+    etapas = {"fila": job["espera_s"], **{etapa: trace.etapas[etapa] for etapa in ETAPAS if etapa in trace.etapas}}
+    if relatorio is not None:
+        etapas["pdf"] = relatorio["tempo_s"]
+    with st.expander("⏱️ Tempos e custo da análise"):
+        st.table({
+            "Etapa": list(etapas),
+            "Tempo (s)": [f"{segundos:.2f}" for segundos in etapas.values()],
+        })
+        uso = trace.uso.get(output["modelo"], {})
+        st.caption(
+            f"Tokens: {uso.get('prompt_tokens', 0)} de entrada ({uso.get('cached_tokens', 0)} em cache),"
+            f" {uso.get('completion_tokens', 0)} de saída"
+            f" · Áudio: {metricas['audio_s'] or 0:.0f}s"
+            f" · Custo estimado: US$ {metricas['custo_usd']:.4f}"
+        )
+
+    if aguardando_pdf:
+        time.sleep(INTERVALO_CONSULTA_S)
+        st.rerun()